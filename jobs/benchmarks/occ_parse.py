@@ -0,0 +1,76 @@
+# Benchmark of the option string normalisation: the regex + UPDATE passes the consolidate jobs used to run
+# against the single pass positional parse with the exception symbol lookup join (mzdata.occ).
+#
+#   python jobs/benchmarks/occ_parse.py
+#
+# BENCH_ROWS (default 20M) synthetic option rows are generated in memory over BENCH_SYMBOLS symbols,
+# the exception symbols (_SPX -> SPXW, ...) included.
+import os
+import sys
+import json
+import time
+
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mzdata.occ import create_exception_symbols_table, occ_normalise_sql
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000000"))
+SYMBOLS = int(os.getenv("BENCH_SYMBOLS", "500"))
+EXCEPTION_SYMBOLS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "cboe-exception-symbols.json")
+
+with open(EXCEPTION_SYMBOLS_FILE, "r") as file:
+    exception_symbols = json.load(file) + ["BRK.B"]
+
+con = duckdb.connect()
+symbols = [(f"_{symbol}", f"{symbol}W") for symbol in exception_symbols] + [(f"S{i}", f"S{i}") for i in range(SYMBOLS - len(exception_symbols))]
+con.execute("CREATE TABLE SYMBOLS (id INTEGER, symbol VARCHAR, root VARCHAR)")
+con.executemany("INSERT INTO SYMBOLS VALUES (?, ?, ?)", [[i, symbol, root] for i, (symbol, root) in enumerate(symbols)])
+
+started = time.perf_counter()
+con.execute(f"""
+    CREATE TABLE RAW AS
+    SELECT S.symbol,
+        S.root || strftime(DATE '2026-01-02' + CAST(i % 300 AS INTEGER), '%y%m%d') || IF(i % 2 = 0, 'C', 'P') || lpad(CAST((i % 4000) * 500 AS VARCHAR), 8, '0') AS option,
+        CAST(i % 50000 AS INTEGER) AS open_interest, CAST(i % 7000 AS INTEGER) AS volume,
+        CAST(random() AS FLOAT) AS delta, CAST(random() / 10 AS FLOAT) AS gamma, CAST(random() AS FLOAT) AS iv
+    FROM range({ROWS}) t(i) JOIN SYMBOLS S ON S.id = i % {len(symbols)}
+""")
+print(f"Generated {ROWS} rows over {len(symbols)} symbols in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def legacy():
+    # what main-options-cboe-consolidate.py did: regex insert, full table UPDATE, then one UPDATE per exception symbol
+    con.execute("CREATE OR REPLACE TABLE LEGACY (symbol string, option string, option_symbol string, expiration string, option_type string, strike float, open_interest int, volume int, delta float, gamma float, iv float)")
+    con.execute("""INSERT INTO LEGACY SELECT replace(symbol,'_', '') as symbol, option, UNNEST(regexp_extract(option, '(\\w+)(\\d{6})([CP])(\\d+)', ['option_symbol', 'expiration', 'option_type', 'strike'])), open_interest, volume, delta, gamma, iv FROM RAW""")
+    con.execute("UPDATE LEGACY SET strike = strike/1000, expiration='20'|| expiration")
+    for exception_symbol in exception_symbols:
+        con.execute(f"UPDATE LEGACY SET option_symbol = '{exception_symbol}' WHERE symbol = '{exception_symbol}'")
+
+
+def single_pass():
+    table = create_exception_symbols_table(con, exception_symbols)
+    con.execute(f"""CREATE OR REPLACE TABLE SINGLE_PASS AS
+        SELECT symbol, option, option_symbol, expiration, option_type, strike, open_interest, volume, delta, gamma, iv
+        FROM {occ_normalise_sql("RAW", table)}""")
+
+
+def timed(name, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {name}: {elapsed:.2f}s ({ROWS / elapsed / 1e6:.1f}M rows/s)", flush=True)
+    return elapsed
+
+
+legacy_time = timed("regex + updates", legacy)
+single_pass_time = timed("single pass", single_pass)
+print(f"  speedup: {legacy_time / single_pass_time:.1f}x")
+
+mismatches = con.execute("""
+    SELECT count(*) FROM (
+        SELECT symbol, option, option_symbol, CAST(strptime(expiration, '%Y%m%d') AS DATE), option_type, strike FROM LEGACY
+        EXCEPT ALL
+        SELECT symbol, option, option_symbol, expiration, option_type, strike FROM SINGLE_PASS
+    )""").fetchone()[0]
+print(f"  rows differing from the legacy output: {mismatches}", flush=True)
@@ -0,0 +1,44 @@
+# Micro-benchmark of the cboe payload parsers.
+#
+#   python jobs/benchmarks/parse_payloads.py [payload.json ...]
+#
+# Pass recorded cdn payloads, e.g.
+#   curl -o spx.json https://cdn.cboe.com/api/global/delayed_quotes/options/_SPX.json
+#   curl -o aapl.json https://cdn.cboe.com/api/global/delayed_quotes/options/AAPL.json
+# Without arguments SPX and AAPL sized synthetic payloads are generated.
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mzdata.chains import parse_payload_arrow, parse_payload_python
+from synthetic import synthetic_payload
+
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+
+def bench(parser, raw):
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        payload = parser(raw)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(payload.options)
+
+
+if len(sys.argv) > 1:
+    fixtures = [(os.path.basename(path), open(path, "rb").read()) for path in sys.argv[1:]]
+else:
+    random.seed(42)
+    fixtures = [("SPX (synthetic)", synthetic_payload("SPXW", 60, 200, 5800.0)), ("AAPL (synthetic)", synthetic_payload("AAPL", 20, 80, 230.0))]
+
+for name, raw in fixtures:
+    python_time, contracts = bench(parse_payload_python, raw)
+    arrow_time, _ = bench(parse_payload_arrow, raw)
+    per_100k = 100_000 / contracts
+    print(f"{name}: {contracts} contracts, {len(raw) / (1024 * 1024):.2f} MB")
+    print(f"  python: {python_time * 1000:.1f} ms ({python_time * per_100k * 1000:.1f} ms per 100k contracts)")
+    print(f"  arrow:  {arrow_time * 1000:.1f} ms ({arrow_time * per_100k * 1000:.1f} ms per 100k contracts)")
+    print(f"  speedup: {python_time / arrow_time:.1f}x", flush=True)
@@ -0,0 +1,84 @@
+# Time and peak memory of the rolling output stage of main-options-cboe-consolidate.py:
+# the old pandas read/sort/write round-trip against the duckdb sorted copies.
+#
+#   python jobs/benchmarks/rolling_outputs.py [days ...]
+#
+# Synthetic normalised days (BENCH_DAY_ROWS rows each, default 1.5M) are generated under temp/bench-rolling
+# once, every stage runs in its own process so its peak RSS can be measured in isolation.
+# BENCH_STAGES=duckdb skips the pandas stage, which needs the whole window in memory several times over.
+import os
+import sys
+import time
+import resource
+import subprocess
+
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mzdata.duckdb_settings import configure_duckdb
+
+DAY_ROWS = int(os.getenv("BENCH_DAY_ROWS", "1500000"))
+STAGES = os.getenv("BENCH_STAGES", "pandas,duckdb").split(",")
+BENCH_DIR = os.getenv("BENCH_DIR", "temp/bench-rolling")
+SORT_ORDER = "option_symbol, dt, expiration, option_type, strike"
+OPDATA_COLUMNS = "dt DATE, symbol string, option string, option_symbol string, expiration DATE, option_type string, strike float, open_interest int, volume int, delta float, gamma float, iv float"
+
+
+def day_file(day):
+    return os.path.join(BENCH_DIR, f"options-{day:03d}.parquet")
+
+
+def generate(days):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    for day in range(days):
+        if os.path.isfile(day_file(day)):
+            continue
+        duckdb.sql(f"""COPY (
+            SELECT DATE '2026-01-02' + {day} AS dt, 'S' || (i % 3000) AS symbol, 'S' || (i % 3000) || '260116C' || lpad(CAST(i % 100000 AS VARCHAR), 8, '0') AS option,
+                'S' || (i % 3000) AS option_symbol, DATE '2026-01-16' + CAST(i % 400 AS INTEGER) AS expiration, IF(i % 2 = 0, 'C', 'P') AS option_type,
+                CAST(i % 100000 AS FLOAT) / 1000 AS strike, CAST(i % 50000 AS INTEGER) AS open_interest, CAST(i % 7000 AS INTEGER) AS volume,
+                CAST(random() AS FLOAT) AS delta, CAST(random() / 10 AS FLOAT) AS gamma, CAST(random() AS FLOAT) AS iv
+            FROM range({DAY_ROWS}) t(i)
+        ) TO '{day_file(day)}' (FORMAT PARQUET, COMPRESSION zstd)""")
+
+
+def run_pandas(days, output_file, output_iv_file):
+    import pandas as pd
+    files = [day_file(day) for day in range(days)]
+    duckdb.sql(f"CREATE TABLE OPDATA ({OPDATA_COLUMNS})")
+    duckdb.sql(f"INSERT INTO OPDATA SELECT * FROM read_parquet({files})")
+    duckdb.sql(f"""COPY (select dt, option, option_symbol, expiration, DATE_DIFF('day', dt, expiration) AS dte, delta, gamma, option_type, strike, open_interest, volume, iv from OPDATA) to '{output_file}' (FORMAT PARQUET)""")
+    df = pd.read_parquet(output_file)
+    df = df.sort_values(by=['option_symbol', 'dt', 'expiration', 'option_type'])
+    df.drop(columns=["iv"]).to_parquet(output_file, compression='zstd', index=False)
+    df.drop(columns=["delta", "gamma", "open_interest", "volume"]).to_parquet(output_iv_file, compression='zstd', index=False)
+
+
+def run_duckdb(days, output_file, output_iv_file):
+    files = [day_file(day) for day in range(days)]
+    configure_duckdb(duckdb, temp_dir=os.path.join(BENCH_DIR, "spill"))
+    duckdb.sql(f"CREATE TABLE OPDATA ({OPDATA_COLUMNS})")
+    duckdb.sql(f"INSERT INTO OPDATA SELECT * FROM read_parquet({files}) ORDER BY {SORT_ORDER}")
+    columns = "dt, option, option_symbol, expiration, DATE_DIFF('day', dt, expiration) AS dte"
+    duckdb.sql(f"COPY (select {columns}, delta, gamma, option_type, strike, open_interest, volume from OPDATA) to '{output_file}' (FORMAT PARQUET, COMPRESSION zstd, ROW_GROUP_SIZE 100000)")
+    duckdb.sql(f"COPY (select {columns}, option_type, strike, iv from OPDATA) to '{output_iv_file}' (FORMAT PARQUET, COMPRESSION zstd, ROW_GROUP_SIZE 100000)")
+
+
+if len(sys.argv) == 3 and sys.argv[1] in ("pandas", "duckdb"):
+    # child process: run one stage and report its own peak RSS
+    days = int(sys.argv[2])
+    output_file = os.path.join(BENCH_DIR, f"{sys.argv[1]}-options.parquet")
+    output_iv_file = os.path.join(BENCH_DIR, f"{sys.argv[1]}-options-iv.parquet")
+    started = time.perf_counter()
+    (run_pandas if sys.argv[1] == "pandas" else run_duckdb)(days, output_file, output_iv_file)
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    size_mb = (os.path.getsize(output_file) + os.path.getsize(output_iv_file)) / (1024 * 1024)
+    print(f"  {sys.argv[1]}: {elapsed:.1f}s, peak RSS {peak_mb:.0f} MB, outputs {size_mb:.1f} MB", flush=True)
+    sys.exit(0)
+
+for days in [int(arg) for arg in sys.argv[1:]] or [30, 60]:
+    generate(days)
+    print(f"{days} days, {days * DAY_ROWS / 1e6:.1f}M rows", flush=True)
+    for stage in STAGES:
+        subprocess.run([sys.executable, os.path.abspath(__file__), stage, str(days)], check=True)
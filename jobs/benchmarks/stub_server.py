@@ -0,0 +1,162 @@
+# Local stand-in for the endpoints the jobs talk to, so they can be benchmarked offline:
+#   /cdn/<symbol>.json                    cboe delayed quotes chain (synthetic, ETag / If-None-Match aware,
+#                                         throttle() makes it answer 429 first)
+#   /quote/<symbol>                       cboe refresh trigger of stale symbols
+#   /releases/download/<name>/<file>      github release assets, served from a local directory (GET and HEAD)
+#   /api/watchlist                        the watchlist of main-options-cboe.py
+#
+#   python jobs/benchmarks/stub_server.py <releases dir> [port] [symbols]
+#
+# STUB_LATENCY_MS adds a fixed delay to every response, to mimic a remote server.
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import threading
+from functools import lru_cache
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import BENCH_EXPIRATIONS, BENCH_STRIKES, bench_symbols, synthetic_payload
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0") or "0")
+PAYLOAD_CACHE_SIZE = 256
+
+
+class StubServer:
+    def __init__(self, releases_dir, symbols, port=0, latency_ms=STUB_LATENCY_MS, expirations=BENCH_EXPIRATIONS, strikes=BENCH_STRIKES):
+        self.releases_dir = releases_dir
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.bytes_sent = 0
+        self._symbols = {payload_symbol: (symbol, root, price) for symbol, payload_symbol, root, price in symbols}
+        self._timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")    # fresh for the whole run
+        self._throttles = {}    # payload symbol -> (429s left, Retry-After)
+        self._lock = threading.Lock()
+
+        @lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+        def payload(payload_symbol):
+            _, root, price = self._symbols.get(payload_symbol, (payload_symbol, payload_symbol.lstrip("_"), 100.0))
+            body = synthetic_payload(payload_symbol, expirations, strikes, price, self._timestamp, random.Random(payload_symbol), root)
+            return body, '"' + hashlib.md5(body).hexdigest() + '"'
+
+        self._payload = payload
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def release_url(self, name, file_name):
+        return f"{self.base_url}/releases/download/{name}/{file_name}"
+
+    def throttle(self, payload_symbol, times=1, retry_after=None):
+        # the next `times` chain requests of the symbol get a 429, with a Retry-After header when it is given
+        with self._lock:
+            self._throttles[payload_symbol] = (times, retry_after)
+
+    def _throttled(self, payload_symbol):
+        # (True, Retry-After) while the symbol still has 429s left
+        with self._lock:
+            times, retry_after = self._throttles.get(payload_symbol, (0, None))
+            if times:
+                self._throttles[payload_symbol] = (times - 1, retry_after)
+            return times > 0, retry_after
+
+    def _count(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            # a request is counted before it is answered, a client that got its response sees it counted
+            def _send(self, status, body=b"", headers=None, send_body=True):
+                server._count(len(body) if send_body else 0)
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def _release(self, send_body):
+                parts = unquote(self.path.split("?")[0]).split("/")    # ['', 'releases', 'download', name, file]
+                path = os.path.join(server.releases_dir, parts[3], parts[4]) if len(parts) == 5 else None
+                if path is None or not os.path.isfile(path):
+                    return self._send(404, b"not found")
+                stat = os.stat(path)
+                server._count(stat.st_size if send_body else 0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(stat.st_size))
+                self.send_header("ETag", f'"{stat.st_size:x}-{int(stat.st_mtime):x}"')
+                self.end_headers()
+                if send_body:
+                    with open(path, "rb") as file:
+                        shutil.copyfileobj(file, self.wfile)
+
+            def _route(self, send_body):
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                path = self.path.split("?")[0]
+                if path.startswith("/cdn/") and path.endswith(".json"):
+                    payload_symbol = unquote(path[len("/cdn/"):-len(".json")])
+                    throttled, retry_after = server._throttled(payload_symbol)
+                    if throttled:
+                        return self._send(429, b"too many requests", {"Retry-After": str(retry_after)} if retry_after is not None else None)
+                    body, etag = server._payload(payload_symbol)
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, headers={"ETag": etag})
+                    return self._send(200, body, {"ETag": etag, "Content-Type": "application/json"}, send_body)
+                if path.startswith("/quote/"):
+                    return self._send(200, b"{}", {"Content-Type": "application/json"}, send_body)
+                if path.startswith("/releases/download/"):
+                    return self._release(send_body)
+                if path == "/api/watchlist":
+                    items = [{"symbol": symbol, "name": symbol} for symbol, _, _ in server._symbols.values()]
+                    return self._send(200, json.dumps({"items": items}).encode(), {"Content-Type": "application/json"}, send_body)
+                self._send(404, b"not found")
+
+            def do_GET(self):
+                self._route(True)
+
+            def do_HEAD(self):
+                self._route(False)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python jobs/benchmarks/stub_server.py <releases dir> [port] [symbols]")
+        sys.exit(1)
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    symbol_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    stub = StubServer(sys.argv[1], bench_symbols(symbol_count), port)
+    print(f"Serving on {stub.base_url}", flush=True)
+    stub._httpd.serve_forever()
@@ -0,0 +1,216 @@
+# Offline end to end benchmark of the python jobs. Every job runs as its own process against synthetic data
+# (synthetic.py) and the local stub of the cboe and github release endpoints (stub_server.py), its wall time,
+# peak RSS and output size are recorded, with the stage breakdown of its run report when it writes one.
+#
+#   python jobs/benchmarks/suite.py [scenario ...]
+#
+# A scenario is <days>d-<symbols>, e.g. 30d-2000; the default runs 1d, 30d and 90d with 100 and 2000 symbols.
+# BENCH_JOBS picks the jobs (download,finalize,consolidate,anomaly,data-consolidate), BENCH_EXPIRATIONS and
+# BENCH_STRIKES size the chains. Generated data is kept under BENCH_DIR and reused by the next runs, results
+# are written to BENCH_DIR/results-<timestamp>.json so two runs can be compared.
+import os
+import re
+import sys
+import json
+import time
+import glob
+import shutil
+import subprocess
+from datetime import datetime
+
+import duckdb
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import BENCH_EXPIRATIONS, BENCH_STRIKES, SYNTHETIC_VERSION, bench_symbols, generate_days
+from stub_server import StubServer
+
+BENCH_DIR = os.path.abspath(os.getenv("BENCH_DIR", "temp/bench-suite"))
+BENCH_JOBS = os.getenv("BENCH_JOBS", "download,finalize,consolidate,anomaly,data-consolidate").split(",")
+DEFAULT_SCENARIOS = ["1d-100", "30d-100", "90d-100", "1d-2000", "30d-2000", "90d-2000"]
+JOBS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+REPO_DIR = os.path.dirname(JOBS_DIR)
+
+
+def parse_scenario(name):
+    match = re.fullmatch(r"(\d+)d-(\d+)", name)
+    if not match:
+        raise ValueError(f"Unknown scenario {name}, expected <days>d-<symbols> e.g. 30d-2000")
+    return int(match.group(1)), int(match.group(2))
+
+
+def files_size(patterns):
+    files = [f for pattern in patterns for f in glob.glob(pattern, recursive=True) if os.path.isfile(f)]
+    return len(files), sum(os.path.getsize(f) for f in files)
+
+
+def reset(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+
+class Scenario:
+    def __init__(self, name, stub, data_dir):
+        self.name = name
+        self.days, self.symbol_count = parse_scenario(name)
+        self.stub = stub
+        self.data_dir = data_dir
+        self.workspace = os.path.join(BENCH_DIR, "runs", name)
+        self.symbols = bench_symbols(self.symbol_count)
+        self.day_files = generate_days(data_dir, self.days, self.symbols)
+        reset(self.workspace)
+        os.makedirs(os.path.join(self.workspace, "data"))
+        os.makedirs(os.path.join(self.workspace, "temp"))
+        os.makedirs(os.path.join(self.workspace, "logs"))
+        shutil.copy(os.path.join(REPO_DIR, "data", "cboe-exception-symbols.json"), os.path.join(self.workspace, "data"))
+
+    def path(self, *parts):
+        return os.path.join(self.workspace, *parts)
+
+    def env(self):
+        return {
+            "CBOE_CDN_BASE_URL": f"{self.stub.base_url}/cdn",
+            "CBOE_QUOTE_BASE_URL": f"{self.stub.base_url}/quote",
+            "FETCH_RATE_LIMIT": os.getenv("FETCH_RATE_LIMIT", "1000"),    # the stub does not throttle
+            "FETCH_RATE_MAX": os.getenv("FETCH_RATE_MAX", "1000"),
+            "RELEASE_NAME": "bench",
+            "ROLLING_DAYS": str(self.days),
+        }
+
+    # every prepare_<job> sets the workspace up (untimed) and returns (script, extra env, output globs)
+    def prepare_download(self):
+        with open(self.path("temp", "batch.json"), "w") as file:
+            json.dump([symbol for symbol, _, _, _ in self.symbols], file)
+        reset(self.path("temp", "options-data"), self.path("temp", "fetch-cache"))
+        env = {"BATCH_FILE": "temp/batch.json", "MATRIX_ID": "0", "TRADING_DATE": list(self.day_files)[-1]}
+        return os.path.join(JOBS_DIR, "options-data", "download-data.py"), env, [self.path("temp", "options-data", "**", "*.parquet")]
+
+    def prepare_finalize(self):
+        if not glob.glob(self.path("temp", "options-data", "*", "manifest.json")):
+            raise RuntimeError("finalize needs the download job of the same run")
+        reset(self.path("data", "cboe-options-summary.json"))
+        return os.path.join(JOBS_DIR, "options-data", "finalize-summary.py"), {}, [self.path("temp", "options_data.parquet"), self.path("temp", "stock_data.parquet")]
+
+    def prepare_consolidate(self):
+        summary = [{
+            "name": dt,
+            "optionsAssetUrl": self.stub.release_url(dt, "options_data.parquet"),
+            "stocksAssetUrl": self.stub.release_url(dt, "stock_data.parquet"),
+        } for dt in self.day_files]
+        with open(self.path("data", "cboe-options-summary.json"), "w") as file:
+            json.dump(summary, file, indent=4)
+        reset(self.path("temp", "rolling-cache"), self.path("temp", "asset-cache"),
+              self.path("data", "options-expirations-strikes.json"), self.path("data", "options-expirations-strikes.parquet"))
+        outputs = [self.path("temp", name) for name in ("options_cboe_rolling_30.parquet", "options_cboe_rolling_iv_30.parquet",
+                                                        "stocks_cboe_rolling_30.parquet", "options_cboe_exposure_30.parquet", "all_symbols_summary_report.csv")]
+        return os.path.join(JOBS_DIR, "main-options-cboe-consolidate.py"), {}, outputs
+
+    def prepare_anomaly(self):
+        rolling_file = self.path("temp", "options_cboe_rolling_30.parquet")
+        if not os.path.isfile(rolling_file):
+            raise RuntimeError("anomaly needs the consolidate job of the same run")
+        # the rolling file is released next to the daily files, under a name of its own
+        release_name = f"rolling-{self.name}"
+        os.makedirs(os.path.join(self.data_dir, release_name), exist_ok=True)
+        shutil.copy(rolling_file, os.path.join(self.data_dir, release_name, "options_cboe_rolling_30.parquet"))
+        with open(self.path("data", "cboe-options-rolling.json"), "r") as file:
+            rolling = json.load(file)
+        rolling["assetUrl"] = self.stub.release_url(release_name, "options_cboe_rolling_30.parquet")
+        with open(self.path("data", "cboe-options-rolling.json"), "w") as file:
+            json.dump(rolling, file, indent=4)
+        reset(self.path("temp", "oi-anomaly-state"), self.path("temp", "asset-cache"))
+        return os.path.join(JOBS_DIR, "main-options-cboe-oi-anomaly.py"), {}, [self.path("temp", "options_cboe_oi_anomaly.parquet")]
+
+    def prepare_data_consolidate(self):
+        # the w2 and ohlc-raw stores: one dt= partition per day, built once from the daily files
+        store = self.path("store")
+        reset(store, self.path("store-out"))
+        for dt, (options_file, stocks_file) in self.day_files.items():
+            w2_file = os.path.join(self.data_dir, "w2", f"dt={dt}", "part-0.parquet")
+            ohlc_file = os.path.join(self.data_dir, "ohlc-raw", f"dt={dt}", "part-0.parquet")
+            if not os.path.isfile(w2_file):
+                os.makedirs(os.path.dirname(w2_file), exist_ok=True)
+                duckdb.sql(f"COPY (SELECT DATE '{dt}' AS dt, * FROM read_parquet('{options_file}')) TO '{w2_file}' (FORMAT PARQUET, COMPRESSION zstd)")
+            if not os.path.isfile(ohlc_file):
+                os.makedirs(os.path.dirname(ohlc_file), exist_ok=True)
+                shutil.copy(stocks_file, ohlc_file)
+            for source in (w2_file, ohlc_file):
+                target = os.path.join(store, os.path.relpath(source, self.data_dir))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.symlink(source, target)
+        os.makedirs(os.path.join(store, "ohlc"))
+        env = {"DATA_DIR": store, "TEMP_DIR": self.path("store-out"), "BACKFILL": "1"}
+        return os.path.join(JOBS_DIR, "main-options-data-consolidate.py"), env, [self.path("store-out", "**", "*.parquet")]
+
+    def run(self, job):
+        script, env, outputs = getattr(self, f"prepare_{job.replace('-', '_')}")()
+        log_path = self.path("logs", f"{job}.log")
+        report_patterns = [self.path("temp", "run-report-*.json"), self.path("store-out", "run-report-*.json")]
+        reset(*[f for pattern in report_patterns for f in glob.glob(pattern)])
+        requests_before, bytes_before = self.stub.requests, self.stub.bytes_sent
+        started = time.perf_counter()
+        with open(log_path, "w") as log:
+            process = subprocess.Popen([sys.executable, script], cwd=self.workspace, env={**os.environ, **self.env(), **env}, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        exit_code = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+        output_files, output_bytes = files_size(outputs)
+
+        # the peak rss comes from the run report of the job: on linux the ru_maxrss of a child also counts the
+        # memory of this process at fork time, it is only the fallback for a job that died before writing one
+        peak_rss_mb = usage.ru_maxrss / 1024 if sys.platform != "darwin" else usage.ru_maxrss / (1024 * 1024)
+        stages = []
+        for report_path in [f for pattern in report_patterns for f in glob.glob(pattern)]:
+            with open(report_path, "r") as file:
+                report = json.load(file)
+            peak_rss_mb = report["peakRssMb"]
+            stages = [{k: stage[k] for k in ("name", "seconds", "peakRssMb")} for stage in report["stages"]]
+        result = {
+            "scenario": self.name, "job": job, "days": self.days, "symbols": self.symbol_count, "exitCode": exit_code,
+            "seconds": round(elapsed, 3), "peakRssMb": round(peak_rss_mb, 1),
+            "outputFiles": output_files, "outputMb": round(output_bytes / (1024 * 1024), 2),
+            "httpRequests": self.stub.requests - requests_before, "httpMb": round((self.stub.bytes_sent - bytes_before) / (1024 * 1024), 2),
+            "stages": stages, "log": log_path,
+        }
+        status_text = "ok" if exit_code == 0 else f"FAILED ({exit_code}), see {log_path}"
+        print(f"  {job:<17} {elapsed:8.2f}s {peak_rss_mb:8.0f} MB rss {output_bytes / (1024 * 1024):9.2f} MB out   {status_text}", flush=True)
+        return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(scenarios):
+    results = []
+    stubs = {}
+    try:
+        for name in scenarios:
+            _, symbol_count = parse_scenario(name)
+            # one data set (and stub) per symbol count, the scenarios with fewer days use its first days
+            data_dir = os.path.join(BENCH_DIR, "data", f"{symbol_count}s-{BENCH_EXPIRATIONS}e-{BENCH_STRIKES}k-v{SYNTHETIC_VERSION}")
+            if symbol_count not in stubs:
+                stubs[symbol_count] = StubServer(data_dir, bench_symbols(symbol_count)).start()
+            print(f"{name}: preparing data", flush=True)
+            scenario = Scenario(name, stubs[symbol_count], data_dir)
+            print(f"{name}: {scenario.days} days, {scenario.symbol_count} symbols, {BENCH_EXPIRATIONS} expirations x {BENCH_STRIKES} strikes", flush=True)
+            for job in BENCH_JOBS:
+                results.append(scenario.run(job))
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+
+    results_file = os.path.join(BENCH_DIR, f"results-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_file, "w") as file:
+        json.dump({"revision": git_revision(), "expirations": BENCH_EXPIRATIONS, "strikes": BENCH_STRIKES, "results": results}, file, indent=4)
+    print(f"Results: {results_file}", flush=True)
+    return 1 if any(result["exitCode"] != 0 for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or DEFAULT_SCENARIOS))
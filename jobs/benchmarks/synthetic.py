@@ -0,0 +1,174 @@
+# Synthetic cboe data for the benchmarks: chain payloads shaped like the cdn json and daily options/stocks
+# parquet files shaped like the release assets (mzdata.schema), for any number of symbols, expirations,
+# strikes and days. Everything is derived from the symbol and the date, so a rerun produces the same data.
+#
+#   python jobs/benchmarks/synthetic.py <output dir> [days] [symbols]
+#
+# writes <output dir>/<yyyy-mm-dd>/options_data.parquet and stock_data.parquet for every day.
+import os
+import sys
+import json
+import random
+import zlib
+from datetime import date, timedelta
+
+import duckdb
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mzdata.schema import OPTIONS_SCHEMA, STOCK_SCHEMA, conform_table
+
+BENCH_EXPIRATIONS = int(os.getenv("BENCH_EXPIRATIONS", "12"))
+BENCH_STRIKES = int(os.getenv("BENCH_STRIKES", "40"))
+BENCH_START_DATE = os.getenv("BENCH_START_DATE", "2026-01-05")
+# (min, max) of the generated greeks, in the payloads and the daily options files (checked by write_daily_files)
+GREEK_RANGES = {"delta": (-1, 1), "gamma": (0, 0.05), "vega": (0, 2), "theta": (-2, 0), "rho": (-1, 1), "iv": (0.05, 1.5)}
+# bump when the generated data changes, the suite keeps the generated days under a directory per version
+SYNTHETIC_VERSION = 2
+EXCEPTION_SYMBOLS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "cboe-exception-symbols.json")
+
+
+def load_exception_symbols():
+    with open(EXCEPTION_SYMBOLS_FILE, "r") as file:
+        return json.load(file)
+
+
+def bench_symbols(count, exception_symbols=None):
+    # (symbol, payload symbol, option root, price) of `count` symbols, the index symbols (SPX -> _SPX / SPXW) first
+    exception_symbols = load_exception_symbols() if exception_symbols is None else exception_symbols
+    symbols = [(symbol, f"_{symbol}", f"{symbol}W") for symbol in exception_symbols[:count]]
+    symbols += [(f"S{i:04d}", f"S{i:04d}", f"S{i:04d}") for i in range(count - len(symbols))]
+    return [(symbol, payload_symbol, root, float(10 + zlib.crc32(symbol.encode()) % 990)) for symbol, payload_symbol, root in symbols]
+
+
+def trading_days(days, start=BENCH_START_DATE):
+    # the first `days` weekdays from `start`, as yyyy-mm-dd
+    result = []
+    day = date.fromisoformat(start)
+    while len(result) < days:
+        if day.weekday() < 5:
+            result.append(day.isoformat())
+        day += timedelta(days=1)
+    return result
+
+
+def synthetic_payload(symbol, expirations, strikes, price, timestamp="2026-10-16 20:00:00", rng=random, root=None):
+    root = root or symbol
+    options = []
+    for e in range(expirations):
+        expiration = f"26{1 + e % 12:02d}{1 + e % 28:02d}"
+        for k in range(strikes):
+            strike = round(price * (0.5 + k / strikes), 0)
+            for option_type in ("C", "P"):
+                options.append({
+                    "option": f"{root}{expiration}{option_type}{int(strike * 1000):08d}",
+                    "bid": round(rng.uniform(0, 50), 2), "bid_size": rng.randint(0, 500),
+                    "ask": round(rng.uniform(0, 50), 2), "ask_size": rng.randint(0, 500),
+                    "iv": round(rng.uniform(0.05, 1.5), 4), "open_interest": rng.randint(0, 50000),
+                    "volume": rng.randint(0, 20000), "delta": round(rng.uniform(-1, 1), 4),
+                    "gamma": round(rng.uniform(0, 0.05), 4), "vega": round(rng.uniform(0, 2), 4),
+                    "theta": round(rng.uniform(-2, 0), 4), "rho": round(rng.uniform(-1, 1), 4),
+                    "theo": round(rng.uniform(0, 50), 4), "change": round(rng.uniform(-5, 5), 2),
+                    "open": round(rng.uniform(0, 50), 2), "high": round(rng.uniform(0, 50), 2),
+                    "low": round(rng.uniform(0, 50), 2), "tick": rng.choice(["up", "down", "no_change"]),
+                    "last_trade_price": round(rng.uniform(0, 50), 2), "last_trade_time": "2026-10-16T15:59:59",
+                    "percent_change": round(rng.uniform(-50, 50), 2), "prev_day_close": round(rng.uniform(0, 50), 2),
+                })
+    data = {
+        "symbol": symbol, "security_type": "stock", "current_price": price, "price_change": 1.5,
+        "price_change_percent": 0.3, "bid": price - 0.1, "ask": price + 0.1, "bid_size": 10, "ask_size": 10,
+        "open": price, "high": price + 5, "low": price - 5, "close": price, "prev_day_close": price - 1.5,
+        "volume": 1000000, "iv30": 18.5, "iv30_change": 0.2, "iv30_change_percent": 1.1,
+        "last_trade_time": "2026-10-16T15:59:59", "tick": "up", "seqno": 1, "options": options,
+    }
+    return json.dumps({"timestamp": timestamp, "symbol": symbol, "data": data}).encode()
+
+
+def _fetch_table(result):
+    # to_arrow_table replaced fetch_arrow_table in newer duckdb releases
+    if hasattr(result, "to_arrow_table"):
+        return result.to_arrow_table()
+    return result.fetch_arrow_table()
+
+
+def _create_symbols_table(con, symbols):
+    con.execute("CREATE OR REPLACE TEMP TABLE BENCH_SYMBOLS (symbol VARCHAR, root VARCHAR, price DOUBLE)")
+    con.executemany("INSERT INTO BENCH_SYMBOLS VALUES (?, ?, ?)", [[payload_symbol, root, price] for _, payload_symbol, root, price in symbols])
+
+
+def check_greeks(options):
+    # a greek out of its range is a generator bug (e.g. an unsigned hash negated), not data to benchmark with
+    for column, (low, high) in GREEK_RANGES.items():
+        values = pc.min_max(options.column(column))
+        if values["min"].as_py() < low or values["max"].as_py() > high:
+            raise ValueError(f"Generated {column} in [{values['min']}, {values['max']}], expected [{low}, {high}]")
+
+
+def write_daily_files(con, dt, symbols, options_file, stocks_file, expirations=BENCH_EXPIRATIONS, strikes=BENCH_STRIKES):
+    # one day of release assets: weekly expirations from the next friday on, strikes from 50% to 150% of the
+    # price. Open interest drifts a little every day and jumps now and then, so the anomaly job has work to do.
+    _create_symbols_table(con, symbols)
+    timestamp = f"{dt} 20:00:00"
+    options = _fetch_table(con.execute(f"""
+        WITH C AS (
+            SELECT S.symbol, S.price,
+                S.root || strftime(DATE '{dt}' + CAST(7 * e + (12 - dayofweek(DATE '{dt}')) % 7 AS INTEGER), '%y%m%d') || T.t
+                    || lpad(CAST(CAST(round(S.price * (0.5 + k / {strikes})) * 1000 AS BIGINT) AS VARCHAR), 8, '0') AS option,
+                hash(S.root, e, k, T.t) AS h
+            FROM BENCH_SYMBOLS S, range({expirations}) E(e), range({strikes}) K(k), (VALUES ('C'), ('P')) T(t)
+        )
+        SELECT option,
+            (h % 5000) / 100.0 AS bid, CAST(h % 500 AS INTEGER) AS bid_size, (h % 5000) / 100.0 + 0.05 AS ask, CAST(h % 400 AS INTEGER) AS ask_size,
+            0.05 + (h % 145) / 100.0 AS iv,
+            CAST(h % 50000 + hash(option, DATE '{dt}') % 500 + IF(hash(option, DATE '{dt}') % 997 = 0, 100000, 0) AS INTEGER) AS open_interest,
+            CAST(hash(option, DATE '{dt}') % 20000 AS INTEGER) AS volume,
+            IF(right(option, 9)[1] = 'C', 1, -1) * (h % 1000) / 1000.0 AS delta, (h % 500) / 10000.0 AS gamma, (h % 200) / 100.0 AS vega,
+            -((h % 200)::BIGINT) / 100.0 AS theta, (h % 200) / 100.0 - 1 AS rho, (h % 5000) / 100.0 AS theo, (h % 1000) / 100.0 - 5 AS change,
+            (h % 5000) / 100.0 AS open, (h % 5000) / 100.0 + 1 AS high, (h % 5000) / 100.0 - 1 AS low,
+            ['up', 'down', 'no_change'][CAST(1 + h % 3 AS BIGINT)] AS tick, (h % 5000) / 100.0 AS last_trade_price,
+            TIMESTAMP '{dt} 15:59:59' AS last_trade_time, (h % 10000) / 100.0 - 50 AS percent_change, (h % 5000) / 100.0 AS prev_day_close,
+            TIMESTAMPTZ '{timestamp}+00' AS timestamp, symbol
+        FROM C
+        ORDER BY symbol
+    """))
+    stocks = _fetch_table(con.execute(f"""
+        SELECT TIMESTAMPTZ '{timestamp}+00' AS timestamp, symbol, 'stock' AS security_type, price AS current_price, 1.5 AS price_change,
+            0.3 AS price_change_percent, price - 0.1 AS bid, price + 0.1 AS ask, 10 AS bid_size, 10 AS ask_size, price AS open,
+            price + 5 AS high, price - 5 AS low, price AS close, price - 1.5 AS prev_day_close, 1000000 AS volume,
+            18.5 AS iv30, 0.2 AS iv30_change, 1.1 AS iv30_change_percent, TIMESTAMP '{dt} 15:59:59' AS last_trade_time,
+            'up' AS tick, 1 AS seqno
+        FROM BENCH_SYMBOLS ORDER BY symbol
+    """))
+    check_greeks(options)
+    pq.write_table(conform_table(options, OPTIONS_SCHEMA), options_file, compression="zstd")
+    pq.write_table(conform_table(stocks, STOCK_SCHEMA), stocks_file, compression="zstd")
+    return options.num_rows
+
+
+def generate_days(data_dir, days, symbols, expirations=BENCH_EXPIRATIONS, strikes=BENCH_STRIKES, con=None):
+    # {yyyy-mm-dd: (options file, stocks file)}, days already generated are kept
+    con = con or duckdb.connect()
+    files = {}
+    for dt in trading_days(days):
+        day_dir = os.path.join(data_dir, dt)
+        options_file = os.path.join(day_dir, "options_data.parquet")
+        stocks_file = os.path.join(day_dir, "stock_data.parquet")
+        if not (os.path.isfile(options_file) and os.path.isfile(stocks_file)):
+            os.makedirs(day_dir, exist_ok=True)
+            rows = write_daily_files(con, dt, symbols, f"{options_file}.tmp", f"{stocks_file}.tmp", expirations, strikes)
+            os.replace(f"{options_file}.tmp", options_file)
+            os.replace(f"{stocks_file}.tmp", stocks_file)
+            print(f"Generated {dt}: {len(symbols)} symbols, {rows} options", flush=True)
+        files[dt] = (options_file, stocks_file)
+    return files
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python jobs/benchmarks/synthetic.py <output dir> [days] [symbols]")
+        sys.exit(1)
+    output_dir = sys.argv[1]
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    symbol_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    generate_days(output_dir, days, bench_symbols(symbol_count))
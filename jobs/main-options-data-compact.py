@@ -0,0 +1,37 @@
+import duckdb
+import os
+import json
+from mzdata.compaction import compact_store, COMPACT_TARGET_MB
+from mzdata.duckdb_settings import configure_duckdb
+from mzdata.instrumentation import start_run
+
+# Compacts the symbol partitioned options store that main-options-data-consolidate.py appends to.
+# No workflow schedules it (the store is not built in actions), run it on the host of the store after the appends.
+# Safe to rerun: partitions without small files or repeated rows are left alone and a lock keeps runs apart.
+COMPACT_DIR = os.environ.get("COMPACT_DIR")
+COMPACT_SYMBOLS = [k for k in os.environ.get("COMPACT_SYMBOLS", "").split(",") if k]    # all symbols when empty
+COMPACT_REPORT_FILE = os.environ.get("COMPACT_REPORT_FILE", "temp/compaction-report.json")
+if not COMPACT_DIR:
+    raise ValueError(f"COMPACT_DIR env var is not set")
+if not os.path.isdir(COMPACT_DIR):
+    raise FileNotFoundError(f"Directory does not exist: {COMPACT_DIR}")
+
+run = start_run("data-compact")
+con = duckdb.connect()
+configure_duckdb(con)
+
+print(f"Compacting {COMPACT_DIR} into files of about {COMPACT_TARGET_MB} MB")
+with run.stage("compact") as stage:
+    totals = compact_store(con, COMPACT_DIR, COMPACT_TARGET_MB, COMPACT_SYMBOLS)
+if totals is None:
+    exit(0)
+stage.add(bytes_read=totals["bytesBefore"], bytes_written=totals["bytesAfter"])
+run.set(**totals)
+
+print(f"Compacted {totals['compacted']} of {totals['partitions']} partitions")
+print(f"Before: {totals['filesBefore']} files, {totals['bytesBefore'] / (1024 * 1024):.2f} MB")
+print(f"After: {totals['filesAfter']} files, {totals['bytesAfter'] / (1024 * 1024):.2f} MB")
+
+os.makedirs(os.path.dirname(COMPACT_REPORT_FILE) or ".", exist_ok=True)
+with open(COMPACT_REPORT_FILE, "w") as file:
+    json.dump(totals, file, indent=4)
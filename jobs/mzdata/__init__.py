@@ -0,0 +1 @@
+# Shared helpers for the python data jobs under jobs/.
@@ -0,0 +1,3 @@
+from mzdata.cli import main
+
+main()
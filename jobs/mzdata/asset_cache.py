@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mzdata.instrumentation import current_run
+
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", "temp/asset-cache")
+ASSET_CACHE_MAX_MB = int(os.getenv("ASSET_CACHE_MAX_MB", "1024") or "1024")
+ASSET_FETCH_WORKERS = int(os.getenv("ASSET_FETCH_WORKERS", "8") or "8")
+INDEX_FILE_NAME = "index.json"
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_remote(url):
+    return url.startswith("http://") or url.startswith("https://")
+
+
+class AssetCache:
+    # Local copies of remote release assets (parquet files) so the sql reads local files. A copy is addressed by
+    # the url plus the size and ETag the server reports, so a re-uploaded asset under the same url is fetched
+    # again. Least recently used copies are evicted once the cache is over its size cap.
+    def __init__(self, cache_dir=ASSET_CACHE_DIR, max_bytes=ASSET_CACHE_MAX_MB * 1024 * 1024, workers=ASSET_FETCH_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.entries = {}
+        self.bytes_fetched = 0
+        self.bytes_cached = 0
+        self.fetched = 0
+        self.cached = 0
+        self.evicted = 0
+        self._session = requests.Session()
+        self._lock = threading.Lock()    # prefetch workers share the index and the counters
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    @classmethod
+    def load(cls, cache_dir=ASSET_CACHE_DIR, max_bytes=ASSET_CACHE_MAX_MB * 1024 * 1024, workers=ASSET_FETCH_WORKERS):
+        cache = cls(cache_dir, max_bytes, workers)
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.isfile(cache.index_path):
+            with open(cache.index_path, "r") as file:
+                cache.entries = json.load(file)
+        # drop index entries without files and files (including unfinished downloads) without index entries
+        cache.entries = {key: entry for key, entry in cache.entries.items() if os.path.isfile(cache._path(key))}
+        for file in Path(cache_dir).iterdir():
+            if file.name != INDEX_FILE_NAME and file.name not in cache.entries:
+                file.unlink()
+        print(f"Loaded asset cache with {len(cache.entries)} files ({cache.size_bytes / (1024 * 1024):.2f} MB) from {cache_dir}", flush=True)
+        return cache
+
+    @property
+    def size_bytes(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _key(self, url, size, etag):
+        suffix = os.path.splitext(url.split("?")[0])[1]
+        return hashlib.sha256(f"{url}|{size}|{etag}".encode()).hexdigest() + suffix
+
+    def fetch(self, url):
+        # local path of `url`, downloaded unless an identical copy is cached; local paths are returned as is
+        if not is_remote(url):
+            return url
+        with current_run().histogram("asset.head").time() as timing:
+            head = self._session.head(url, allow_redirects=True, timeout=60)
+            timing["status"] = head.status_code
+        head.raise_for_status()
+        size = int(head.headers.get("Content-Length", 0) or 0)
+        etag = head.headers.get("ETag") or head.headers.get("Last-Modified")    # plain file servers only send the latter
+        key = self._key(url, size, etag)
+        path = self._path(key)
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and os.path.isfile(path):
+                entry["used_at"] = time.time()
+                self.bytes_cached += entry["size"]
+                self.cached += 1
+                return path
+
+        tmp_path = f"{path}.tmp"
+        with current_run().histogram("asset.download").time() as timing, self._session.get(url, stream=True, timeout=300) as response:
+            timing["status"] = response.status_code
+            response.raise_for_status()
+            with open(tmp_path, "wb") as file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self.entries[key] = {"url": url, "size": size, "etag": etag, "used_at": time.time()}
+            self.bytes_fetched += size
+            self.fetched += 1
+        return path
+
+    def prefetch(self, urls):
+        # downloads every url in parallel, returns {url: local path}
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            paths = dict(zip(urls, pool.map(self.fetch, urls)))
+        self.evict(keep=set(paths.values()))
+        self.save()
+        return paths
+
+    def evict(self, keep=()):
+        # least recently used files go first until the cache fits its size cap, files in `keep` are in use
+        size = self.size_bytes
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used_at"]):
+            if size <= self.max_bytes:
+                break
+            if self._path(key) in keep:
+                continue
+            os.remove(self._path(key))
+            del self.entries[key]
+            size -= entry["size"]
+            self.evicted += 1
+
+    def save(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file, indent=4)
+        os.replace(tmp_path, self.index_path)
+
+    def summary(self):
+        return (
+            f"Asset cache: {self.fetched} fetched ({self.bytes_fetched / (1024 * 1024):.2f} MB), "
+            f"{self.cached} served from cache ({self.bytes_cached / (1024 * 1024):.2f} MB), "
+            f"{self.evicted} evicted, {self.size_bytes / (1024 * 1024):.2f} MB on disk"
+        )
@@ -0,0 +1,243 @@
+import os
+import asyncio
+import heapq
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+
+import aiohttp
+
+from mzdata.chains import parse_payload
+from mzdata.fetch_cache import peek_timestamp
+from mzdata.instrumentation import current_run
+from mzdata.rate_limit import AdaptiveRateLimiter
+
+DATA_STALE_THRESHOLD = 60  # minutes
+STALE_RECHECK_SECONDS = int(os.getenv("STALE_RECHECK_SECONDS", "10") or "10")  # wait after triggering a refresh before re-checking a stale symbol
+STALE_MAX_REVISITS = int(os.getenv("STALE_MAX_REVISITS", "6") or "6")  # give up on a symbol that is still stale after this many re-checks
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8") or "8")
+
+# Base urls are overridable so the fetcher can be pointed at a local stub server
+CDN_BASE_URL = os.getenv("CBOE_CDN_BASE_URL", "https://cdn.cboe.com/api/global/delayed_quotes/options")
+QUOTE_BASE_URL = os.getenv("CBOE_QUOTE_BASE_URL", "https://www.cboe.com/delayed_quote/api/options")
+
+retries = 5
+retry_codes = [
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+]
+throttle_codes = [HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE]  # these slow down every worker
+
+
+def options_url(symbol, exception_symbols):
+    # if the symbol is one of the exception_symbols, then prefix it with _
+    if symbol in exception_symbols:
+        return f"{CDN_BASE_URL}/_{symbol}.json"
+    return f"{CDN_BASE_URL}/{symbol}.json"
+
+
+def refresh_url(symbol, exception_symbols):
+    # the latest data api uses ^ for the index symbols
+    if symbol in exception_symbols:
+        return f"{QUOTE_BASE_URL}/^{symbol}"
+    return f"{QUOTE_BASE_URL}/{symbol}"
+
+
+def is_stale(timestamp_str):
+    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    time_difference = (datetime.now(timezone.utc) - timestamp).total_seconds()
+    return time_difference / 60 > DATA_STALE_THRESHOLD
+
+
+class FetchStats:
+    def __init__(self):
+        self.success = 0
+        self.failed = 0
+        self.stale_revisits = 0
+        self.stale_dropped = 0
+        self.rate_limiter = None
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def symbols_per_second(self):
+        return self.success / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"Processed {self.success} symbols successfully, {self.failed} failed "
+                f"({self.stale_dropped} still stale after {self.stale_revisits} re-checks) "
+                f"in {self.elapsed:.2f}s ({self.symbols_per_second:.2f} symbols/s)."
+                + (f"\n{self.rate_limiter.summary()}" if self.rate_limiter else ""))
+
+
+class RevisitScheduler:
+    # Hands out symbols to the workers. Fresh symbols come from a fifo, stale ones wait in a
+    # heap keyed by the earliest time they can be re-checked so they never block the others.
+    def __init__(self, symbols, recheck_seconds=STALE_RECHECK_SECONDS, max_revisits=STALE_MAX_REVISITS):
+        self.recheck_seconds = recheck_seconds
+        self.max_revisits = max_revisits
+        self._ready = deque(symbols)
+        self._waiting = []  # (due_at, seq, symbol)
+        self._revisits = {}
+        self._in_flight = 0
+        self._seq = 0
+        self._cond = asyncio.Condition()
+
+    async def next(self):
+        # returns the next symbol to fetch, or None once nothing is ready, waiting or in flight
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._waiting and self._waiting[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._waiting)[2])
+                if self._ready:
+                    self._in_flight += 1
+                    return self._ready.popleft()
+                if not self._waiting and self._in_flight == 0:
+                    return None
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def done(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def revisit(self, symbol):
+        # schedules a stale symbol for a later re-check, False once it ran out of revisits
+        async with self._cond:
+            self._in_flight -= 1
+            count = self._revisits.get(symbol, 0) + 1
+            self._revisits[symbol] = count
+            scheduled = count <= self.max_revisits
+            if scheduled:
+                self._seq += 1
+                heapq.heappush(self._waiting, (time.monotonic() + self.recheck_seconds, self._seq, symbol))
+            self._cond.notify_all()
+            return scheduled
+
+
+def _retry_after_seconds(value):
+    # Retry-After is either delay-seconds or an http date, None when it is malformed or asks for no wait at all
+    try:
+        seconds = int(value)
+    except ValueError:
+        try:
+            seconds = int((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return seconds if seconds > 0 else None
+
+
+async def _request(session, limiter, url, symbol, read_body=True, headers=None):
+    # GET with the retry_codes / Retry-After handling, returns (raw body or None, response headers)
+    histogram = current_run().histogram("cboe.options" if url.startswith(CDN_BASE_URL) else "cboe.refresh")
+    for n in range(retries):
+        await limiter.acquire()
+        started = time.monotonic()
+        async with session.get(url, headers=headers) as response:
+            histogram.observe(time.monotonic() - started, response.status)    # time to the response headers
+            if response.status in retry_codes:
+                retry_after = response.headers.get("Retry-After")
+                if retry_after:
+                    print(f"Retry-After header present with value: {retry_after}", flush=True)
+                    retry_after = _retry_after_seconds(retry_after)
+                sleep_time = retry_after or 10 * (n + 1)    # a malformed or zero Retry-After falls back to the backoff
+                if response.status in throttle_codes:
+                    # shrink the shared rate, a Retry-After pauses every worker inside limiter.acquire()
+                    if limiter.on_throttle(retry_after):
+                        print(f"Http error '{response.status}' occurred while fetching data for symbol: {symbol}... Pausing all requests for {sleep_time} seconds", flush=True)
+                        continue
+                print(f"Http error '{response.status}' occurred while fetching data for symbol: {symbol}... Sleeping for {sleep_time} seconds", flush=True)
+                await asyncio.sleep(sleep_time)
+                continue
+            response.raise_for_status()
+            limiter.on_success()
+            if not read_body or response.status == HTTPStatus.NOT_MODIFIED:
+                return None, response.headers
+            return await response.read(), response.headers
+    raise RuntimeError(f"Max retries reached for symbol: {symbol}")
+
+
+async def _fetch_payload(session, limiter, cache, url, symbol):
+    # fetches and parses the payload of a symbol, served from the fetch cache when the cdn says it didn't change
+    if cache is None:
+        raw, _ = await _request(session, limiter, url, symbol)
+        return parse_payload(raw)
+    raw, headers = await _request(session, limiter, url, symbol, headers=cache.conditional_headers(symbol))
+    if raw is None or cache.has_timestamp(symbol, peek_timestamp(raw)):
+        payload = cache.get(symbol)
+        if payload is not None:
+            cache.hits += 1
+            cache.not_modified += raw is None
+            return payload
+        if raw is None:
+            # 304 for a payload we no longer have, ask again without the conditional headers
+            raw, headers = await _request(session, limiter, url, symbol)
+    cache.misses += 1
+    payload = parse_payload(raw)
+    cache.put(symbol, payload, headers.get("ETag"), headers.get("Last-Modified"))
+    return payload
+
+
+async def _worker(session, limiter, scheduler, cache, exception_symbols, on_data, stats):
+    while True:
+        symbol = await scheduler.next()
+        if symbol is None:
+            return
+        try:
+            print(f"Fetching data for symbol: {symbol}", flush=True)
+            payload = await _fetch_payload(session, limiter, cache, options_url(symbol, exception_symbols), symbol)
+            timestamp_str = payload.timestamp
+            if is_stale(timestamp_str):
+                print(f"Timestamp {timestamp_str} is older than {DATA_STALE_THRESHOLD} minutes. Fetching latest data for symbol: {symbol}", flush=True)
+                await _request(session, limiter, refresh_url(symbol, exception_symbols), symbol, read_body=False)
+                stats.stale_revisits += 1
+                if await scheduler.revisit(symbol):
+                    print(f"Scheduled symbol {symbol} for a re-check in {scheduler.recheck_seconds} seconds.", flush=True)
+                else:
+                    stats.failed += 1
+                    stats.stale_dropped += 1
+                    print(f"Data for symbol: {symbol} is still stale after {scheduler.max_revisits} re-checks. Skipping...", flush=True)
+                continue
+            on_data(symbol, payload)
+            stats.success += 1
+        except Exception as e:
+            stats.failed += 1
+            print(f"Error fetching data for {symbol}: {e}", flush=True)
+        await scheduler.done()
+
+
+async def fetch_symbols_async(symbols, exception_symbols, on_data, concurrency=FETCH_CONCURRENCY, cache=None):
+    stats = FetchStats()
+    scheduler = RevisitScheduler(symbols)
+    stats.rate_limiter = limiter = AdaptiveRateLimiter()
+
+    # one keep-alive connection pool shared by all the workers, sized to the in-flight limit
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*[_worker(session, limiter, scheduler, cache, exception_symbols, on_data, stats) for _ in range(concurrency)])
+
+    stats.elapsed = time.monotonic() - stats.started_at
+    return stats
+
+
+def fetch_symbols(symbols, exception_symbols, on_data, concurrency=FETCH_CONCURRENCY, cache=None):
+    # on_data(symbol, payload) is called on the event loop thread with the parsed ChainPayload of every fresh symbol,
+    # with a FetchCache unchanged payloads are served from disk instead of being parsed again
+    print(f"Fetching {len(symbols)} symbols with concurrency: {concurrency}", flush=True)
+    try:
+        return asyncio.run(fetch_symbols_async(symbols, exception_symbols, on_data, concurrency, cache))
+    finally:
+        if cache is not None:
+            cache.save()
+            print(cache.summary(), flush=True)
@@ -0,0 +1,163 @@
+import os
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import pyarrow.json as pa_json
+except ImportError:  # pyarrow builds without the json reader fall back to the python parser
+    pa_json = None
+
+from mzdata.schema import (
+    OPTIONS_SCHEMA, STOCK_SCHEMA, RAW_OPTION_FIELDS_SCHEMA, PAYLOAD_SCHEMA,
+    PARQUET_COMPRESSION, SchemaReport, conform_table,
+)
+
+ROW_GROUP_SIZE = 100_000  # rows buffered before a row group is flushed to disk
+FAST_PARSE = os.getenv("CBOE_FAST_PARSE", "1") == "1"
+
+
+# Function to normalize and extract stock data
+def parse_stock_data(data):
+    # Extract stock (main) data excluding "options"
+    stock_data = {
+        "timestamp": data["timestamp"],
+        "symbol": data["symbol"],
+        **{k: v for k, v in data["data"].items() if k != "options"},  # Exclude "options"
+    }
+    return stock_data
+
+
+# Function to normalize and extract options data
+def parse_options_data(data):
+    options = data["data"]["options"]
+    table = pa.Table.from_pylist(options, schema=RAW_OPTION_FIELDS_SCHEMA)
+    # keep any field we don't know about so the schema report can tell it was dropped
+    extra_fields = sorted(set(options[0]) - set(RAW_OPTION_FIELDS_SCHEMA.names)) if options else []
+    for name in extra_fields:
+        table = table.append_column(name, pa.array([option.get(name) for option in options]))
+    table = table.append_column("timestamp", pa.repeat(pa.scalar(data["timestamp"], pa.string()), len(table)))  # Add timestamp
+    table = table.append_column("symbol", pa.repeat(pa.scalar(data["symbol"], pa.string()), len(table)))  # Add symbol
+    return table
+
+
+class ChainPayload:
+    # A decoded cdn payload: the one row stock table and the option chain table
+    def __init__(self, timestamp, symbol, stock, options):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.stock = stock
+        self.options = options
+
+
+def parse_payload_python(raw):
+    data = json.loads(raw)
+    stock = pa.Table.from_pylist([parse_stock_data(data)])
+    return ChainPayload(data["timestamp"], data["symbol"], stock, parse_options_data(data))
+
+
+def parse_payload_arrow(raw):
+    # Decodes the payload with the arrow json reader, the option rows never become python objects.
+    # Unknown fields are kept (inferred) so they show up as dropped in the schema report.
+    table = pa_json.read_json(
+        io.BytesIO(raw),
+        read_options=pa_json.ReadOptions(block_size=len(raw) + 1),  # the payload is a single object, read it as one block
+        parse_options=pa_json.ParseOptions(explicit_schema=PAYLOAD_SCHEMA, unexpected_field_behavior="infer", newlines_in_values=True),
+    )
+    if len(table) != 1:
+        raise ValueError(f"Expected a single payload object, got {len(table)} rows")
+    timestamp = table.column("timestamp")[0].as_py()
+    symbol = table.column("symbol")[0].as_py()
+    data = table.column("data").combine_chunks()
+
+    stock_fields = [field.name for field in data.type if field.name != "options"]
+    columns = dict(zip(stock_fields, [data.field(name) for name in stock_fields]))
+    if columns["symbol"].null_count:
+        columns["symbol"] = table.column("symbol").combine_chunks()
+    columns["timestamp"] = table.column("timestamp").combine_chunks()
+    stock = pa.Table.from_arrays(list(columns.values()), names=list(columns.keys()))
+
+    contracts = data.field("options").flatten()
+    options = pa.Table.from_arrays(
+        contracts.flatten() + [pa.repeat(pa.scalar(timestamp, pa.string()), len(contracts)), pa.repeat(pa.scalar(symbol, pa.string()), len(contracts))],
+        names=[field.name for field in contracts.type] + ["timestamp", "symbol"],
+    )
+    return ChainPayload(timestamp, symbol, stock, options)
+
+
+def parse_payload(raw):
+    # Fast arrow path when available, otherwise (or if arrow rejects the payload) the python path
+    if FAST_PARSE and pa_json is not None:
+        try:
+            return parse_payload_arrow(raw)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            print(f"Fast parser rejected the payload, falling back to the python parser: {e}", flush=True)
+    return parse_payload_python(raw)
+
+
+class ParquetSink:
+    # Streams tables into a single parquet file, flushing a row group every `row_group_size` rows
+    # so only the rows not yet flushed are held in memory. Every table is conformed to `schema`,
+    # `report` collects whatever had to be coerced or dropped on the way.
+    def __init__(self, path, schema, row_group_size=ROW_GROUP_SIZE, report=None):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.report = report or SchemaReport(os.path.basename(path))
+        self.rows_written = 0
+        self._buffer = []
+        self._buffered_rows = 0
+        self._writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+
+    def write(self, table):
+        self._buffer.append(conform_table(table, self.schema, self.report))
+        self._buffered_rows += len(table)
+        if self._buffered_rows >= self.row_group_size:
+            self.flush()
+
+    @property
+    def rows(self):
+        return self.rows_written + self._buffered_rows
+
+    def flush(self):
+        if self._buffer:
+            self._writer.write_table(pa.concat_tables(self._buffer), row_group_size=self.row_group_size)
+            self.rows_written += self._buffered_rows
+            self._buffer = []
+            self._buffered_rows = 0
+
+    def close(self):
+        # writes the footer, the file is a valid parquet file with everything flushed so far
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChainWriter:
+    # Writes the stock row and option chain of every fetched symbol as soon as it arrives.
+    def __init__(self, stock_file, options_file, row_group_size=ROW_GROUP_SIZE):
+        self.stocks = ParquetSink(stock_file, STOCK_SCHEMA, row_group_size, SchemaReport("stock data"))
+        self.options = ParquetSink(options_file, OPTIONS_SCHEMA, row_group_size, SchemaReport("options data"))
+
+    def on_data(self, symbol, payload):
+        self.options.write(payload.options)
+        self.stocks.write(payload.stock)
+
+    def close(self):
+        self.stocks.close()
+        self.options.close()
+        print(self.options.report.summary(), flush=True)
+        print(self.stocks.report.summary(), flush=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,133 @@
+import os
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mzdata.chains import ParquetSink
+from mzdata.schema import OPTIONS_SCHEMA, STOCK_SCHEMA, SchemaReport
+
+MANIFEST_FILE_NAME = "manifest.json"
+PARTS_DIR_NAME = "parts"
+OPTIONS_DATA_DIR_NAME = "options-data"
+BATCH_DIR_PREFIX = "batch-"    # a batch writes to <temp>/options-data/batch-<matrix id>
+CHECKPOINT_SYMBOLS = int(os.getenv("CHECKPOINT_SYMBOLS", "10") or "10")  # close the current part after this many symbols
+CHECKPOINT_ROWS = int(os.getenv("CHECKPOINT_ROWS", "250000") or "250000")  # ...or once it holds this many option rows
+
+
+def current_trading_date():
+    # the cdn only serves data that is less than an hour old, so the utc date is the trading date of the payloads
+    return os.getenv("TRADING_DATE") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class BatchManifest:
+    # Records which symbols of a batch are safely on disk and in which part files.
+    def __init__(self, base_path, trading_date, parts=None):
+        self.base_path = base_path
+        self.trading_date = trading_date
+        self.parts = parts or []
+
+    @property
+    def path(self):
+        return os.path.join(self.base_path, MANIFEST_FILE_NAME)
+
+    @property
+    def completed_symbols(self):
+        return {symbol for part in self.parts for symbol in part["symbols"]}
+
+    @classmethod
+    def load(cls, base_path, trading_date):
+        # resumes the manifest of the same trading date, anything else starts from scratch
+        manifest = cls(base_path, trading_date)
+        if os.path.isfile(manifest.path):
+            with open(manifest.path, "r") as file:
+                data = json.load(file)
+            if data.get("tradingDate") == trading_date:
+                manifest.parts = data.get("parts", [])
+            else:
+                print(f"Ignoring checkpoint manifest of trading date {data.get('tradingDate')}, current trading date is {trading_date}", flush=True)
+        manifest.remove_orphan_parts()
+        return manifest
+
+    def remove_orphan_parts(self):
+        # part files not in the manifest were still being written when the previous run died
+        referenced = {name for part in self.parts for name in (part["options"], part["stocks"])}
+        parts_dir = Path(self.base_path, PARTS_DIR_NAME)
+        if parts_dir.is_dir():
+            for file in parts_dir.iterdir():
+                if f"{PARTS_DIR_NAME}/{file.name}" not in referenced:
+                    print(f"Removing incomplete part file: {file}", flush=True)
+                    file.unlink()
+
+    def add_part(self, options, stocks, symbols, rows):
+        self.parts.append({"options": options, "stocks": stocks, "symbols": symbols, "rows": rows})
+        self.save()
+
+    def save(self):
+        # write to a temp file and rename so a crash never leaves a half written manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"tradingDate": self.trading_date, "parts": self.parts}, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class CheckpointedChainWriter:
+    # Same job as ChainWriter, but rotates the output into part files and records every
+    # closed part in the batch manifest, so at most the open part is lost if the job dies.
+    def __init__(self, manifest, checkpoint_symbols=CHECKPOINT_SYMBOLS, checkpoint_rows=CHECKPOINT_ROWS):
+        self.manifest = manifest
+        self.checkpoint_symbols = checkpoint_symbols
+        self.checkpoint_rows = checkpoint_rows
+        self._part_number = len(manifest.parts)
+        self._symbols = []
+        self._stocks = None
+        self._options = None
+        self.options_report = SchemaReport("options data")
+        self.stocks_report = SchemaReport("stock data")
+        os.makedirs(os.path.join(manifest.base_path, PARTS_DIR_NAME), exist_ok=True)
+
+    def _part_name(self, kind):
+        return f"{PARTS_DIR_NAME}/{kind}-{self._part_number:05d}.parquet"
+
+    def on_data(self, symbol, payload):
+        if self._options is None:
+            self._stocks = ParquetSink(os.path.join(self.manifest.base_path, self._part_name("stocks")), STOCK_SCHEMA, report=self.stocks_report)
+            self._options = ParquetSink(os.path.join(self.manifest.base_path, self._part_name("options")), OPTIONS_SCHEMA, report=self.options_report)
+        self._options.write(payload.options)
+        self._stocks.write(payload.stock)
+        self._symbols.append(symbol)
+        if len(self._symbols) >= self.checkpoint_symbols or self._options.rows >= self.checkpoint_rows:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self._options is None:
+            return
+        self._stocks.close()
+        self._options.close()
+        self.manifest.add_part(self._part_name("options"), self._part_name("stocks"), self._symbols, self._options.rows_written)
+        print(f"Checkpointed {len(self._symbols)} symbol(s) to {self._part_name('options')}", flush=True)
+        self._part_number += 1
+        self._symbols = []
+        self._stocks = None
+        self._options = None
+
+    def close(self):
+        self.checkpoint()
+        print(self.options_report.summary(), flush=True)
+        print(self.stocks_report.summary(), flush=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_manifests(root):
+    # every batch manifest below root as (batch directory, parsed manifest): the batch directories of this run or
+    # of the downloaded batch artifacts (<root>/cboe-data-batch-N/temp/options-data/batch-N). The rolling cache and
+    # the oi anomaly state keep a manifest.json of their own under the same root, they are not batch directories.
+    manifests = []
+    for path in sorted(Path(root).glob(f"**/{OPTIONS_DATA_DIR_NAME}/{BATCH_DIR_PREFIX}*/{MANIFEST_FILE_NAME}")):
+        with open(path, "r") as file:
+            manifests.append((path.parent, json.load(file)))
+    return manifests
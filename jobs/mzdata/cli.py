@@ -0,0 +1,116 @@
+# One entry point for the python jobs: runs the given stages in order in a single process. The stages share
+# one JobContext, so a stage reads what an earlier one produced from the duckdb connection (or the local file)
+# instead of downloading the release asset back, e.g. the day merged by finalize or the rolling window
+# consolidate leaves in duckdb for anomaly.
+#
+#   PYTHONPATH=jobs python -m mzdata finalize consolidate anomaly
+#   PYTHONPATH=jobs python -m mzdata fetch consolidate anomaly --release-name "2026-10-16 20:00"
+#   PYTHONPATH=jobs python -m mzdata w2 --w2-data-dir /data/options --w2-temp-dir /data/out
+#
+# The fused daily pipeline (finalize, consolidate, anomaly) keeps the day in a duckdb database file, every
+# output lands in temp/ and data/ and the workflow uploads them to the release once at the end:
+#
+#   PYTHONPATH=jobs python -m mzdata daily --database temp/daily.duckdb
+import os
+import sys
+import json
+import argparse
+
+from mzdata.context import JobContext
+from mzdata.instrumentation import start_run
+from mzdata.compaction import compact_store, COMPACT_TARGET_MB
+from mzdata.stages.fetch import fetch_watchlist, fetch_day, fetch_batch
+from mzdata.stages.finalize import finalize_batches
+from mzdata.stages.releases import ROLLING_DAYS, add_summary_entry
+from mzdata.stages.rolling import consolidate_rolling
+from mzdata.stages.anomaly import score_anomalies
+from mzdata.stages.w2 import consolidate_w2
+
+
+def run_fetch(ctx, args):
+    stats = fetch_day(ctx, fetch_watchlist(ctx))
+    add_summary_entry(ctx)
+    print(stats.summary(), flush=True)
+
+
+def run_download(ctx, args):
+    if not args.batch_file:
+        raise ValueError("download needs --batch-file (or BATCH_FILE)")
+    with open(args.batch_file, "r") as file:
+        symbols = json.load(file)
+    print(fetch_batch(ctx, symbols, args.matrix_id).summary(), flush=True)
+
+
+def run_finalize(ctx, args):
+    finalize_batches(ctx)
+    add_summary_entry(ctx)
+
+
+def run_consolidate(ctx, args):
+    consolidate_rolling(ctx, rolling_days=args.rolling_days)
+
+
+def run_anomaly(ctx, args):
+    score_anomalies(ctx, rolling_days=args.rolling_days)
+
+
+def run_w2(ctx, args):
+    if not args.w2_data_dir or not args.w2_temp_dir:
+        raise ValueError("w2 needs --w2-data-dir and --w2-temp-dir (or DATA_DIR and TEMP_DIR)")
+    consolidate_w2(ctx.con, args.w2_data_dir, args.w2_temp_dir, run=ctx.run)
+
+
+def run_compact(ctx, args):
+    if not args.compact_dir:
+        raise ValueError("compact needs --compact-dir (or COMPACT_DIR)")
+    totals = compact_store(ctx.con, args.compact_dir, COMPACT_TARGET_MB)
+    if totals is not None:
+        ctx.run.set(**totals)
+
+
+# stage name -> (function, what it does), in the order of the daily flow
+STAGES = {
+    "fetch": (run_fetch, "fetch the watchlist chains into temp/, add the release to the summary"),
+    "download": (run_download, "fetch one batch of symbols into temp/options-data/batch-<matrix id>"),
+    "finalize": (run_finalize, "merge the batches into temp/, add the release to the summary"),
+    "consolidate": (run_consolidate, "build the rolling window outputs"),
+    "anomaly": (run_anomaly, "score the open interest anomalies of the rolling window"),
+    "w2": (run_w2, "append the new w2 dates to the symbol partitioned store"),
+    "compact": (run_compact, "compact the symbol partitioned store"),
+}
+
+# pipeline name -> its stages, usable in place of a stage
+PIPELINES = {
+    "daily": ["finalize", "consolidate", "anomaly"],
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m mzdata", description="Runs the data job stages in one process.",
+                                     epilog="stages: " + "; ".join(f"{name}: {help}" for name, (_, help) in STAGES.items())
+                                     + ". pipelines: " + "; ".join(f"{name}: {' '.join(stages)}" for name, stages in PIPELINES.items()))
+    parser.add_argument("stages", nargs="+", choices=list(STAGES) + list(PIPELINES), metavar="stage", help="stages (or pipelines) to run, in order")
+    parser.add_argument("--job", default="pipeline", help="name of the run report (temp/run-report-<job>.json)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--temp-dir", default="temp")
+    parser.add_argument("--release-name", default=None, help="defaults to RELEASE_NAME or the current time")
+    parser.add_argument("--database", default=None, help="duckdb database file holding the tables of the stages, in memory when not set")
+    parser.add_argument("--rolling-days", type=int, default=ROLLING_DAYS)
+    parser.add_argument("--batch-file", default=os.getenv("BATCH_FILE"))
+    parser.add_argument("--matrix-id", default=os.getenv("MATRIX_ID", "0"))
+    parser.add_argument("--w2-data-dir", default=os.getenv("DATA_DIR"))
+    parser.add_argument("--w2-temp-dir", default=os.getenv("TEMP_DIR"))
+    parser.add_argument("--compact-dir", default=os.getenv("COMPACT_DIR"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    stages = [stage for name in args.stages for stage in PIPELINES.get(name, [name])]
+    run = start_run(args.job, args.temp_dir)
+    ctx = JobContext(args.data_dir, args.temp_dir, args.release_name, run=run, database=args.database)
+    for name in stages:
+        print(f"=== {name} ===", flush=True)
+        with run.stage(name):
+            STAGES[name][0](ctx, args)
+    return ctx
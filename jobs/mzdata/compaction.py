@@ -0,0 +1,145 @@
+import os
+import math
+import time
+import shutil
+from pathlib import Path
+
+COMPACT_TARGET_MB = int(os.getenv("COMPACT_TARGET_MB", "128") or "128")
+COMPACT_LOCK_TTL_HOURS = float(os.getenv("COMPACT_LOCK_TTL_HOURS", "6") or "6")    # older locks are left by crashed runs
+COMPACT_SORT_ORDER = "dt, expiration, strike, option_type"
+COMPACT_DEDUP_KEY = "dt, option"
+LOCK_FILE_NAME = ".compaction.lock"
+TMP_SUFFIX = ".compact-tmp"
+OLD_SUFFIX = ".compact-old"
+
+
+# Compaction of a hive store partitioned by symbol (symbol=XYZ/*.parquet). Every appended run leaves another
+# small file per symbol, compaction rewrites a symbol into a few size-targeted files sorted by dt, expiration
+# and strike and drops the (dt, option) rows a re-appended day repeated. A partition is rebuilt next to the
+# live one and swapped in with two renames, so the swap is not atomic: a reader listing the store between them
+# misses the symbol, run it when nothing reads the store. A crash between them is repaired when the next run starts.
+
+def _parquet_files(partition_dir):
+    return sorted(p for p in Path(partition_dir).iterdir() if p.is_file() and p.suffix == ".parquet")
+
+
+def _stats(files):
+    return len(files), sum(f.stat().st_size for f in files)
+
+
+def recover(store_dir):
+    # finishes or rolls back the swaps and rebuilds a crashed run left behind
+    for path in list(Path(store_dir).iterdir()):
+        if path.name.endswith(TMP_SUFFIX):
+            shutil.rmtree(path)
+        elif path.name.endswith(OLD_SUFFIX):
+            live = Path(store_dir, path.name[:-len(OLD_SUFFIX)])
+            if live.exists():
+                shutil.rmtree(path)    # the new partition was swapped in, only the delete was missing
+            else:
+                os.replace(path, live)    # crashed between the renames, the old partition goes back
+            print(f"Recovered {live.name} from an interrupted compaction", flush=True)
+
+
+def needs_compaction(files, target_bytes):
+    # more files than its size calls for means small appended files are left
+    count, size = _stats(files)
+    return count > max(1, math.ceil(size / target_bytes))
+
+
+def has_repeated_rows(con, files):
+    # a day appended twice leaves the same (dt, option) in two files, however few files there are only the
+    # rewrite dedupes it. The dt ranges in the footers rule out most partitions without reading any rows.
+    if len(files) < 2:
+        return False
+    file_list = ", ".join(f"'{f}'" for f in files)
+    overlapping = con.execute(f"""
+        WITH R AS (
+            SELECT file_name, min(stats_min_value) AS lo, max(stats_max_value) AS hi
+            FROM parquet_metadata([{file_list}]) WHERE path_in_schema = 'dt' GROUP BY file_name
+        )
+        SELECT count(*) FROM R A JOIN R B ON A.file_name < B.file_name AND A.lo <= B.hi AND B.lo <= A.hi
+    """).fetchone()[0]
+    if not overlapping:
+        return False
+    return con.execute(f"""
+        SELECT count(*) FROM (
+            SELECT 1 FROM read_parquet([{file_list}], union_by_name=true, hive_partitioning=false)
+            GROUP BY {COMPACT_DEDUP_KEY} HAVING count(*) > 1 LIMIT 1
+        )
+    """).fetchone()[0] > 0
+
+
+def compact_partition(con, partition_dir, target_bytes):
+    # rewrites one symbol=XYZ directory, a (dt, option) appended more than once keeps the row of the newest file.
+    # Returns (files, bytes) before and after.
+    files = _parquet_files(partition_dir)
+    before = _stats(files)
+    tmp_dir = f"{partition_dir}{TMP_SUFFIX}"
+    old_dir = f"{partition_dir}{OLD_SUFFIX}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    con.execute("CREATE OR REPLACE TEMP TABLE COMPACT_FILES (filename VARCHAR, mtime DOUBLE)")
+    con.executemany("INSERT INTO COMPACT_FILES VALUES (?, ?)", [[str(f), f.stat().st_mtime] for f in files])
+    file_list = ", ".join(f"'{f}'" for f in files)
+    con.execute(f"""
+        COPY (
+            SELECT * EXCLUDE (filename) FROM (
+                SELECT P.* FROM read_parquet([{file_list}], filename=true, union_by_name=true, hive_partitioning=false) P
+                JOIN COMPACT_FILES F ON F.filename = P.filename
+                QUALIFY row_number() OVER (PARTITION BY {COMPACT_DEDUP_KEY} ORDER BY F.mtime DESC, F.filename DESC) = 1
+            )
+            ORDER BY {COMPACT_SORT_ORDER}
+        ) TO '{tmp_dir}'
+        (FORMAT PARQUET, COMPRESSION zstd, FILE_SIZE_BYTES {target_bytes}, FILENAME_PATTERN 'data_{{i}}')
+    """)
+
+    os.replace(partition_dir, old_dir)
+    try:
+        os.replace(tmp_dir, partition_dir)
+    except BaseException:
+        os.replace(old_dir, partition_dir)    # the live partition goes back, recover() covers a hard crash here
+        raise
+    shutil.rmtree(old_dir)
+    return before, _stats(_parquet_files(partition_dir))
+
+
+def compact_store(con, store_dir, target_mb=COMPACT_TARGET_MB, symbols=None):
+    # compacts every symbol partition that has small files left, returns the totals before and after.
+    # A lock file keeps two runs from rewriting the same store, the swaps a crashed run left are repaired first.
+    target_bytes = target_mb * 1024 * 1024
+    lock_path = os.path.join(store_dir, LOCK_FILE_NAME)
+    if os.path.isfile(lock_path) and time.time() - os.path.getmtime(lock_path) > COMPACT_LOCK_TTL_HOURS * 3600:
+        print(f"Removing the stale lock {lock_path}", flush=True)
+        os.remove(lock_path)
+    try:
+        lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        print(f"{lock_path} exists, another compaction is running", flush=True)
+        return None
+    os.write(lock, str(os.getpid()).encode())
+    os.close(lock)
+
+    totals = {"partitions": 0, "compacted": 0, "filesBefore": 0, "bytesBefore": 0, "filesAfter": 0, "bytesAfter": 0}
+    try:
+        recover(store_dir)
+        for partition in sorted(Path(store_dir).iterdir()):
+            if not partition.is_dir() or not partition.name.startswith("symbol="):
+                continue
+            if symbols and partition.name.split("=", 1)[1] not in symbols:
+                continue
+            files = _parquet_files(partition)
+            before = after = _stats(files)
+            if files and (needs_compaction(files, target_bytes) or has_repeated_rows(con, files)):
+                before, after = compact_partition(con, str(partition), target_bytes)
+                totals["compacted"] += 1
+                print(f"{partition.name}: {before[0]} files ({before[1] / (1024 * 1024):.2f} MB) -> {after[0]} files ({after[1] / (1024 * 1024):.2f} MB)", flush=True)
+            totals["partitions"] += 1
+            totals["filesBefore"] += before[0]
+            totals["bytesBefore"] += before[1]
+            totals["filesAfter"] += after[0]
+            totals["bytesAfter"] += after[1]
+    finally:
+        os.remove(lock_path)
+    return totals
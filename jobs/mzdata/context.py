@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+
+from mzdata.instrumentation import current_run
+
+RELEASE_BASE_URL = "https://github.com/mnsrulz/mztrading-data/releases/download"
+EXCEPTION_SYMBOLS_FILE_NAME = "cboe-exception-symbols.json"
+SOURCES_TABLE = "PIPELINE_SOURCES"
+
+
+class JobContext:
+    # What the stages of one process share: the duckdb connection, the data/ and temp/ directories, the release
+    # the outputs go to and the run report. A stage producing a release asset publishes it under its release
+    # url, a later stage then reads the local table or file instead of downloading it back.
+    # With a `database` file the tables live in that file and the published sources are recorded in it too, so
+    # the day's data stays on disk rather than in memory and a later process can pick up where one stopped.
+    def __init__(self, data_dir="data", temp_dir="temp", release_name=None, con=None, run=None, database=None):
+        self.data_dir = data_dir
+        self.temp_dir = temp_dir
+        self.release_name = release_name or os.getenv("RELEASE_NAME", datetime.now().strftime("%Y-%m-%d %H:%M"))
+        self.database = database
+        self._con = con
+        self.run = run or current_run()
+        self.sources = {}    # release url -> FROM clause source, a table of `con` or a local parquet file
+        os.makedirs(temp_dir, exist_ok=True)
+        if database:
+            self.con.execute(f"CREATE TABLE IF NOT EXISTS {SOURCES_TABLE} (url VARCHAR PRIMARY KEY, source VARCHAR)")
+            self.sources.update(self.con.execute(f"SELECT url, source FROM {SOURCES_TABLE}").fetchall())
+            print(f"Pipeline database {database}: {len(self.sources)} published source(s)", flush=True)
+
+    @property
+    def con(self):
+        # opened (and configured) on first use, the fetch and merge stages never need duckdb (and its ~50MB)
+        if self._con is None:
+            import duckdb
+            from mzdata.duckdb_settings import configure_duckdb
+            if self.database:
+                os.makedirs(os.path.dirname(self.database) or ".", exist_ok=True)
+            self._con = duckdb.connect(self.database or ":memory:")
+            configure_duckdb(self._con)
+        return self._con
+
+    def data_path(self, *parts):
+        return os.path.join(self.data_dir, *parts)
+
+    def temp_path(self, *parts):
+        return os.path.join(self.temp_dir, *parts)
+
+    @property
+    def exception_symbols_file(self):
+        return self.data_path(EXCEPTION_SYMBOLS_FILE_NAME)
+
+    def release_url(self, file_name):
+        return f"{RELEASE_BASE_URL}/{self.release_name}/{file_name}"
+
+    def publish(self, file_name, source):
+        # `source` is a parquet file or anything valid in a FROM clause (a table, a parenthesised query)
+        if source.endswith(".parquet"):
+            source = f"read_parquet('{source}')"
+        url = self.release_url(file_name)
+        self.sources[url] = source
+        if self.database:
+            self.con.execute(f"INSERT OR REPLACE INTO {SOURCES_TABLE} VALUES (?, ?)", [url, source])
+
+    def publish_file(self, file_name, path, table):
+        # publishes a parquet file this process wrote, loaded into `table` first when there is a database file
+        # so the next stages scan the table instead of decoding the parquet again
+        if not self.database:
+            return self.publish(file_name, path)
+        self.con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM read_parquet('{path}')")
+        self.publish(file_name, table)
+
+    def resolve(self, urls, asset_cache):
+        # {url: FROM clause source}, the assets published by this process are read in place, the others are
+        # downloaded (or taken from the asset cache) in parallel
+        local_assets = asset_cache.prefetch([url for url in urls if url not in self.sources])
+        return {url: self.sources.get(url) or f"read_parquet('{local_assets[url]}')" for url in urls}
@@ -0,0 +1,17 @@
+import os
+
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR", "temp/duckdb-spill")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))    # 0 keeps duckdb's default (one per core)
+
+
+def configure_duckdb(con, memory_limit=DUCKDB_MEMORY_LIMIT, temp_dir=DUCKDB_TEMP_DIR, threads=DUCKDB_THREADS):
+    # Caps the memory duckdb may use, sorts/aggregates/tables that do not fit spill to `temp_dir`.
+    # Insertion order is kept so a table filled with ORDER BY is copied out in that order.
+    os.makedirs(temp_dir, exist_ok=True)
+    con.execute(f"SET memory_limit = '{memory_limit}'")
+    con.execute(f"SET temp_directory = '{temp_dir}'")
+    con.execute("SET preserve_insertion_order = true")
+    if threads:
+        con.execute(f"SET threads = {threads}")
+    print(f"duckdb memory limit: {memory_limit}, spilling to {temp_dir}", flush=True)
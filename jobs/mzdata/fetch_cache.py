@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+
+import pyarrow as pa
+
+from mzdata.chains import ChainPayload
+
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "temp/fetch-cache")
+FETCH_CACHE_MAX_MB = int(os.getenv("FETCH_CACHE_MAX_MB", "256") or "256")
+INDEX_FILE_NAME = "index.json"
+PEEK_BYTES = 256
+
+# the cdn payload starts with the timestamp, so it can be read without decoding the whole chain
+_timestamp_re = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"')
+
+
+def peek_timestamp(raw):
+    # Only the first PEEK_BYTES are searched, a full scan could match a "timestamp" nested in the chain. A payload
+    # with the key further in gives None, has_timestamp() is then False and the payload is parsed: a miss, never
+    # a stale hit.
+    match = _timestamp_re.search(raw, 0, PEEK_BYTES)
+    return match.group(1).decode() if match else None
+
+
+def _file_name(symbol):
+    # symbols differ in characters a file name can't hold (^SPX and _SPX), the file is named by a hash of the symbol
+    return hashlib.sha256(symbol.encode()).hexdigest() + ".arrow"
+
+
+class FetchCache:
+    # On disk cache of the last parsed payload of every symbol, stored as zstd arrow ipc files.
+    # Keeps the ETag/Last-Modified for conditional requests and the payload timestamp, so a
+    # 304 or an unchanged timestamp reuses the cached tables instead of parsing the payload.
+    def __init__(self, cache_dir=FETCH_CACHE_DIR, max_bytes=FETCH_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    @classmethod
+    def load(cls, cache_dir=FETCH_CACHE_DIR, max_bytes=FETCH_CACHE_MAX_MB * 1024 * 1024):
+        cache = cls(cache_dir, max_bytes)
+        if os.path.isfile(cache.index_path):
+            with open(cache.index_path, "r") as file:
+                cache.entries = json.load(file)
+        # drop index entries without files and files without index entries
+        cache.entries = {symbol: entry for symbol, entry in cache.entries.items() if os.path.isfile(cache._path(entry["file"]))}
+        referenced = {entry["file"] for entry in cache.entries.values()}
+        for file in Path(cache_dir).glob("*.arrow"):
+            if file.name not in referenced:
+                file.unlink()
+        print(f"Loaded fetch cache with {len(cache.entries)} symbols ({cache.size_bytes / (1024 * 1024):.2f} MB) from {cache_dir}", flush=True)
+        return cache
+
+    @property
+    def size_bytes(self):
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def conditional_headers(self, symbol):
+        entry = self.entries.get(symbol)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def has_timestamp(self, symbol, timestamp):
+        entry = self.entries.get(symbol)
+        return entry is not None and timestamp is not None and entry["timestamp"] == timestamp
+
+    def get(self, symbol):
+        # the cached payload, or None if it can't be read back
+        entry = self.entries.get(symbol)
+        if entry is None:
+            return None
+        try:
+            with pa.ipc.open_file(self._path(entry["file"])) as reader:
+                table = reader.read_all()
+        except (OSError, pa.ArrowInvalid) as e:
+            print(f"Unable to read cached payload for symbol: {symbol}: {e}", flush=True)
+            self.entries.pop(symbol, None)
+            return None
+        entry["used_at"] = time.time()
+        stock = pa.Table.from_pylist([json.loads(entry["stock"])])
+        return ChainPayload(entry["timestamp"], entry["symbol"], stock, table)
+
+    def put(self, symbol, payload, etag=None, last_modified=None):
+        name = _file_name(symbol)
+        path = self._path(name)
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_file(f"{path}.tmp", payload.options.schema, options=options) as writer:
+            writer.write_table(payload.options)
+        os.replace(f"{path}.tmp", path)
+        self.entries[symbol] = {
+            "file": name,
+            "size": os.path.getsize(path),
+            "timestamp": payload.timestamp,
+            "symbol": payload.symbol,
+            "stock": json.dumps(payload.stock.to_pylist()[0]),
+            "etag": etag,
+            "last_modified": last_modified,
+            "used_at": time.time(),
+        }
+
+    def evict(self):
+        # least recently used symbols go first until the cache fits its size cap
+        size = self.size_bytes
+        for symbol, entry in sorted(self.entries.items(), key=lambda item: item[1]["used_at"]):
+            if size <= self.max_bytes:
+                break
+            os.remove(self._path(entry["file"]))
+            del self.entries[symbol]
+            size -= entry["size"]
+            self.evicted += 1
+
+    def save(self):
+        self.evict()
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.index_path)
+
+    def summary(self):
+        return (f"Fetch cache: {self.hits} hit(s) ({self.not_modified} not modified), {self.misses} miss(es), "
+                f"{self.evicted} evicted, {len(self.entries)} symbols / {self.size_bytes / (1024 * 1024):.2f} MB cached.")
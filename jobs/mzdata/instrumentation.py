@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import builtins
+import platform
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:    # windows
+    resource = None
+
+RUN_REPORT_DIR = os.getenv("RUN_REPORT_DIR", "temp")
+RUN_REPORT_VERSION = 1
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+# Shared instrumentation of the jobs: named stage timers with the peak rss, rows and bytes of every stage, and
+# latency histograms of the http calls. A job starts one RunReport, it is written as json to
+# temp/run-report-<job>.json when the process exits (failed runs included), ready to be uploaded with the data.
+
+def _peak_rss_bytes():
+    # high water mark of the resident set, VmHWM on linux (resettable), ru_maxrss elsewhere
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def _reset_peak_rss():
+    # linux resets VmHWM to the current rss, elsewhere the peak stays the process peak
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class LatencyHistogram:
+    # Request latencies in fixed millisecond buckets, plus the count of every status code. Thread safe.
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.statuses = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, status=None):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+            self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+            if status is not None:
+                self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    @contextmanager
+    def time(self):
+        # times the block, the status is set on the yielded dict
+        started = time.monotonic()
+        result = {"status": None}
+        try:
+            yield result
+        finally:
+            self.observe(time.monotonic() - started, result["status"])
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th request
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "meanMs": round(self.total_ms / self.count, 2) if self.count else None,
+            "minMs": round(self.min_ms, 2) if self.min_ms is not None else None,
+            "maxMs": round(self.max_ms, 2) if self.max_ms is not None else None,
+            "p50Ms": self.percentile(0.5),
+            "p95Ms": self.percentile(0.95),
+            "p99Ms": self.percentile(0.99),
+            "bucketsMs": self.buckets_ms,
+            "counts": self.counts,
+            "statuses": self.statuses,
+        }
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.peak_rss_bytes = 0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def add(self, rows_in=0, rows_out=0, bytes_read=0, bytes_written=0):
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def read_file(self, path):
+        self.bytes_read += os.path.getsize(path)
+
+    def wrote_file(self, path):
+        self.bytes_written += os.path.getsize(path)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "seconds": round(self.seconds, 3),
+            "peakRssMb": round(self.peak_rss_bytes / (1024 * 1024), 2),
+            "rowsIn": self.rows_in,
+            "rowsOut": self.rows_out,
+            "bytesRead": self.bytes_read,
+            "bytesWritten": self.bytes_written,
+        }
+
+
+class RunReport:
+    def __init__(self, job, report_dir=RUN_REPORT_DIR):
+        self.job = job
+        self.report_dir = report_dir
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.monotonic()
+        self.stages = []
+        self.histograms = {}
+        self.metrics = {}
+        self.status = "running"
+        self.exit_code = None
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.report_dir, f"run-report-{self.job}.json")
+
+    @contextmanager
+    def stage(self, name):
+        # times the block and records its peak rss, the yielded Stage takes the rows/bytes counters.
+        # The peak of an outer stage includes the peaks of the stages nested in it.
+        stage = Stage(name)
+        if self._stack:
+            self._stack[-1].peak_rss_bytes = max(self._stack[-1].peak_rss_bytes, _peak_rss_bytes())
+        _reset_peak_rss()
+        self._stack.append(stage)
+        started = time.monotonic()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.monotonic() - started
+            stage.peak_rss_bytes = max(stage.peak_rss_bytes, _peak_rss_bytes())
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].peak_rss_bytes = max(self._stack[-1].peak_rss_bytes, stage.peak_rss_bytes)
+            self.stages.append(stage)
+            print(f"[{self.job}] {name}: {stage.seconds:.2f}s, peak rss {stage.peak_rss_bytes / (1024 * 1024):.1f} MB", flush=True)
+
+    def histogram(self, name):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            return self.histograms[name]
+
+    def set(self, **metrics):
+        # free form numbers of the job (symbols fetched, cache hits, ...)
+        self.metrics.update(metrics)
+
+    def to_dict(self):
+        return {
+            "version": RUN_REPORT_VERSION,
+            "job": self.job,
+            "status": self.status,
+            "exitCode": self.exit_code,
+            "startedAt": self.started_at.isoformat(),
+            "seconds": round(time.monotonic() - self._started, 3),
+            "peakRssMb": round(max([_peak_rss_bytes()] + [s.peak_rss_bytes for s in self.stages]) / (1024 * 1024), 2),
+            "python": platform.python_version(),
+            "env": {k: os.environ[k] for k in ("GITHUB_RUN_ID", "GITHUB_RUN_ATTEMPT", "RELEASE_NAME", "MATRIX_ID") if k in os.environ},
+            "stages": [s.to_dict() for s in self.stages],
+            "http": {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+            "metrics": self.metrics,
+        }
+
+    def write(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.to_dict(), file, indent=4)
+        os.replace(tmp_path, self.path)
+        print(f"Run report: {self.path}", flush=True)
+
+
+_current = None
+
+
+def _exit_code(code):
+    # the process exit status of SystemExit(code): None is 0, anything but an int is printed and exits with 1
+    if code is None:
+        return 0
+    return code if isinstance(code, int) else 1
+
+
+def _recording_exit(previous):
+    def exit(code=None):
+        _current.exit_code = _exit_code(code)
+        previous(code)
+    return exit
+
+
+def start_run(job, report_dir=RUN_REPORT_DIR):
+    # The report of this process, written at exit with status failed when an exception or a non zero exit ended
+    # the job. An atexit hook does not see the exit status, sys.exit() and the exit()/quit() builtins record it on
+    # the way out; a bare `raise SystemExit(n)` is not seen and counts as a success.
+    global _current
+    _current = RunReport(job, report_dir)
+    previous_hook = sys.excepthook
+
+    def excepthook(exc_type, exc, tb):
+        _current.status = "failed"
+        _current.exit_code = 1
+        previous_hook(exc_type, exc, tb)
+
+    def finish():
+        if _current.status == "running":
+            _current.status = "succeeded" if not _current.exit_code else "failed"
+        if _current.exit_code is None:
+            _current.exit_code = 0
+        _current.write()
+
+    sys.excepthook = excepthook
+    sys.exit = _recording_exit(sys.exit)
+    for name in ("exit", "quit"):
+        if hasattr(builtins, name):    # not there under python -S
+            setattr(builtins, name, _recording_exit(getattr(builtins, name)))
+    atexit.register(finish)
+    return _current
+
+
+def current_run():
+    # the report started by the job, or a throw away one so library code can always record into it
+    global _current
+    if _current is None:
+        _current = RunReport("unnamed")
+    return _current
@@ -0,0 +1,44 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow.parquet as pq
+
+from mzdata.chains import ParquetSink, ROW_GROUP_SIZE
+
+MERGE_WORKERS = int(os.getenv("MERGE_WORKERS", str(os.cpu_count() or 2)))
+
+
+def _read_row_group(path, index):
+    with pq.ParquetFile(path) as file:
+        return file.read_row_group(index)
+
+
+def iter_row_groups(files, workers=MERGE_WORKERS):
+    # Reads the row groups of all the files on a thread pool and yields them in file order.
+    # At most `workers * 2` row groups are read ahead, so memory does not grow with the inputs.
+    tasks = [(path, index) for path in files for index in range(pq.read_metadata(path).num_row_groups)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path, index in tasks:
+            pending.append(executor.submit(_read_row_group, path, index))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def merge_parquet(files, output_file, schema, workers=MERGE_WORKERS, row_group_size=ROW_GROUP_SIZE):
+    # Streams every row group of `files` into one output file conformed to `schema`
+    started = time.monotonic()
+    bytes_in = sum(os.path.getsize(path) for path in files)
+    with ParquetSink(output_file, schema, row_group_size) as sink:
+        for table in iter_row_groups(files, workers):
+            sink.write(table)
+    elapsed = time.monotonic() - started
+    mb_in = bytes_in / (1024 * 1024)
+    print(f"Merged {len(files)} files ({mb_in:.2f} MB, {sink.rows_written} rows) into {output_file} "
+          f"in {elapsed:.2f}s ({mb_in / elapsed if elapsed > 0 else 0:.2f} MB/s)", flush=True)
+    print(sink.report.summary(), flush=True)
+    return sink.rows_written
@@ -0,0 +1,45 @@
+# Set based normalisation of the cboe option strings, e.g. AAPL250117C00150000 or SPXW251219P05800000.
+# The root has a variable length but the suffix is fixed width (yymmdd + C/P + 8 digit strike * 1000),
+# so every part is sliced positionally from the end of the string instead of matching a regex.
+import json
+
+OCC_SUFFIX_LENGTH = 15
+EXCEPTION_SYMBOLS_TABLE = "EXCEPTION_SYMBOLS"
+EXCEPTION_SYMBOLS_FILE = "data/cboe-exception-symbols.json"
+
+
+def load_exception_symbols(path=EXCEPTION_SYMBOLS_FILE):
+    with open(path, "r") as file:
+        exception_symbols = json.load(file)
+        print(f"Loaded {len(exception_symbols)} exception symbols: {exception_symbols}")
+    ## This is a new set of exception symbol which have special char (.) in it.
+    return exception_symbols + ["BRK.B"]
+
+
+def create_exception_symbols_table(con, exception_symbols, table=EXCEPTION_SYMBOLS_TABLE):
+    # Small lookup table of the symbols (spx, vix, ...) whose option root differs from the symbol (SPXW, VIXW, ...)
+    con.execute(f"CREATE OR REPLACE TABLE {table} (symbol VARCHAR PRIMARY KEY)")
+    if exception_symbols:
+        con.executemany(f"INSERT INTO {table} VALUES (?)", [[symbol] for symbol in sorted(set(exception_symbols))])
+    return table
+
+
+def occ_normalise_sql(source, exception_table=None):
+    # Subquery over `source` (anything valid in a FROM clause) exposing all of its columns plus the parsed
+    # option_symbol, expiration (DATE), option_type and strike, in a single pass. `_` is stripped from the
+    # symbol (the index options like _SPX). With `exception_table` the option_symbol of those symbols is the
+    # symbol itself, resolved with a join against the lookup table.
+    suffix = f"right(O.option, {OCC_SUFFIX_LENGTH})"
+    root = f"rtrim(left(O.option, length(O.option) - {OCC_SUFFIX_LENGTH}))"
+    join = ""
+    if exception_table:
+        root = f"COALESCE(E.symbol, {root})"
+        join = f"LEFT JOIN {exception_table} E ON E.symbol = replace(O.symbol, '_', '')"
+    return f"""(
+        SELECT O.* REPLACE (replace(O.symbol, '_', '') AS symbol),
+            {root} AS option_symbol,
+            CAST(strptime('20' || substr({suffix}, 1, 6), '%Y%m%d') AS DATE) AS expiration,
+            substr({suffix}, 7, 1) AS option_type,
+            CAST(substr({suffix}, 8) AS FLOAT) / 1000 AS strike
+        FROM {source} O {join}
+    )"""
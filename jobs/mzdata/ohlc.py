@@ -0,0 +1,68 @@
+import os
+import hashlib
+from pathlib import Path
+
+OHLC_KEY = "symbol, dt"
+OHLC_LATEST_ORDER = "filename DESC, file_row_number DESC"    # the raw files carry no timestamp, the last file and row written win
+OHLC_FILE_PREFIX = "ohlc_"
+
+
+# Incremental ingest of the raw daily ohlc snapshots (ohlc-raw/dt=YYYY-MM-DD/*.parquet) into the flat ohlc
+# store (ohlc/*.parquet). The raw partitions already consumed are remembered by a signature of their files
+# (name, size and mtime), so a run only reads the partitions that are new or whose files were added or rewritten. Rows are keyed on (symbol, dt) and
+# every changed date is written as its own ohlc_<dt>.parquet file, publishing it again replaces that date.
+
+def partition_signature(partition_dir):
+    # the mtime catches a file rewritten at the same size, a rewrite in place keeps the name
+    files = sorted((p.name, p.stat().st_size, p.stat().st_mtime_ns) for p in Path(partition_dir).iterdir() if p.suffix == ".parquet")
+    return hashlib.sha256(repr(files).encode()).hexdigest()
+
+
+def pending_partitions(raw_dir, consumed):
+    # {dt: signature} of the raw partitions not consumed yet with the same files
+    pending = {}
+    if not os.path.isdir(raw_dir):
+        return pending
+    for name in sorted(os.listdir(raw_dir)):
+        if not name.startswith("dt="):
+            continue
+        dt = name.split("=", 1)[1]
+        signature = partition_signature(os.path.join(raw_dir, name))
+        if consumed.get(dt) != signature:
+            pending[dt] = signature
+    return pending
+
+
+def ingest_ohlc(con, raw_dir, ohlc_dir, output_dir, consumed):
+    # Writes ohlc_<dt>.parquet into `output_dir` for every pending raw partition: the latest row of each
+    # (symbol, dt), minus the keys the older (non per-date) files of `ohlc_dir` already hold.
+    # `consumed` ({dt: signature}) is updated in place, returns the number of rows written.
+    pending = pending_partitions(raw_dir, consumed)
+    if not pending:
+        return 0
+
+    raw_files = ", ".join(f"'{os.path.join(raw_dir, f'dt={dt}', '*.parquet')}'" for dt in pending)
+    dates = ", ".join(f"DATE '{dt}'" for dt in pending)
+    # the per-date files are replaced by this run, only the older files hold keys that have to be skipped
+    legacy_files = [str(p) for p in sorted(Path(ohlc_dir).glob("*.parquet")) if not p.name.startswith(OHLC_FILE_PREFIX)] if os.path.isdir(ohlc_dir) else []
+    anti_join = ""
+    if legacy_files:
+        legacy_list = ", ".join(f"'{f}'" for f in legacy_files)
+        anti_join = f"ANTI JOIN (SELECT DISTINCT {OHLC_KEY} FROM read_parquet([{legacy_list}]) WHERE dt IN ({dates})) L USING ({OHLC_KEY})"
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE OHLC_NEW AS
+        SELECT R.* EXCLUDE (filename, file_row_number) FROM (
+            SELECT * FROM read_parquet([{raw_files}], hive_partitioning=1, filename=true, file_row_number=true)
+            QUALIFY row_number() OVER (PARTITION BY {OHLC_KEY} ORDER BY {OHLC_LATEST_ORDER}) = 1
+        ) R {anti_join}
+    """)
+
+    rows = 0
+    for dt, count in con.execute("SELECT dt::VARCHAR, count(*) FROM OHLC_NEW GROUP BY dt ORDER BY dt").fetchall():
+        con.execute(f"COPY (SELECT * FROM OHLC_NEW WHERE dt = DATE '{dt}' ORDER BY symbol) TO '{os.path.join(output_dir, f'{OHLC_FILE_PREFIX}{dt}.parquet')}' (FORMAT PARQUET)")
+        print(f"ohlc {dt}: {count} rows", flush=True)
+        rows += count
+    con.execute("DROP TABLE OHLC_NEW")
+    consumed.update(pending)
+    return rows
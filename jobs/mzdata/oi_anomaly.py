@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+
+OI_ANOMALY_STATE_DIR = os.getenv("OI_ANOMALY_STATE_DIR", "temp/oi-anomaly-state")
+OI_ANOMALY_STATE_VERSION = 2
+MANIFEST_FILE_NAME = "manifest.json"
+
+# columns every day fed to the engine has, the anomalies add the scoring columns after them
+DAY_COLUMNS = "dt, option, option_symbol, expiration, dte, delta, gamma, option_type, strike, open_interest, volume"
+OUTPUT_COLUMNS = f"{DAY_COLUMNS}, prev_open_interest, oi_change, oi_ratio, anomaly_score"
+# the table also keeps the day the change was measured from, trim() drops the anomalies measured across the window start
+ANOMALY_TABLE_COLUMNS = "dt DATE, option VARCHAR, option_symbol VARCHAR, expiration DATE, dte BIGINT, delta FLOAT, gamma FLOAT, option_type VARCHAR, strike FLOAT, open_interest INTEGER, volume INTEGER, prev_open_interest INTEGER, oi_change INTEGER, oi_ratio DOUBLE, anomaly_score DOUBLE, prev_dt DATE"
+OUTPUT_SORT_ORDER = "option_symbol, dt, expiration, option_type"
+
+
+# Scoring models: the anomaly_score expression over the scored day (columns of DAY_COLUMNS plus prev_open_interest,
+# oi_change and the contract state before today: n, mean, var of its past oi changes) and the default cutoff
+def _log_weighted(min_history):
+    return "abs(oi_change * LOG(open_interest + 1))"
+
+
+def _zscore(min_history):
+    return f"IF(n >= {min_history} AND var > 0, abs(oi_change - mean) / sqrt(var), NULL)"
+
+
+def _percentile(min_history):
+    return "percent_rank() OVER (PARTITION BY option_symbol ORDER BY abs(oi_change))"
+
+
+SCORING_MODELS = {
+    "log_weighted": (_log_weighted, 1000),
+    "zscore": (_zscore, 4),
+    "percentile": (_percentile, 0.99),
+}
+
+
+class OIAnomalyEngine:
+    # Incremental open interest anomaly detection. Per contract it keeps the last open interest and an
+    # exponentially weighted mean/variance of its daily changes, so every new day is scored from that state
+    # alone and the cost is one day's contracts. The anomalies of the days still in the window are kept too,
+    # with the release every day was scored from, so a day whose release was replaced can be found and rescored.
+    def __init__(self, con, model="log_weighted", threshold=None, alpha=0.2, min_history=5, state_dir=OI_ANOMALY_STATE_DIR):
+        if model not in SCORING_MODELS:
+            raise ValueError(f"Unknown scoring model: {model}, expected one of {sorted(SCORING_MODELS)}")
+        score, default_threshold = SCORING_MODELS[model]
+        self.con = con
+        self.model = model
+        self.score_sql = score(min_history)
+        self.threshold = default_threshold if threshold is None else threshold
+        self.alpha = alpha
+        self.min_history = min_history
+        self.state_dir = state_dir
+        self.last_dt = None
+        self.releases = {}
+        self._load()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.state_dir, MANIFEST_FILE_NAME)
+
+    @property
+    def settings(self):
+        return {"version": OI_ANOMALY_STATE_VERSION, "model": self.model, "threshold": self.threshold, "alpha": self.alpha, "minHistory": self.min_history}
+
+    def _load(self):
+        # state written with other settings scored its anomalies differently, it is discarded
+        manifest = {}
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                manifest = json.load(file)
+        if manifest and {k: manifest.get(k) for k in self.settings} == self.settings:
+            self.last_dt = manifest["lastDate"]
+            self.releases = manifest["releases"]
+            self.con.execute(f"CREATE OR REPLACE TABLE OI_STATE AS SELECT * FROM read_parquet('{os.path.join(self.state_dir, 'state.parquet')}')")
+            self.con.execute(f"CREATE OR REPLACE TABLE OI_ANOMALIES AS SELECT * FROM read_parquet('{os.path.join(self.state_dir, 'anomalies.parquet')}')")
+            print(f"Loaded oi anomaly state up to {self.last_dt}", flush=True)
+            return
+        if manifest:
+            print("oi anomaly state was built with other settings, rebuilding it", flush=True)
+        self.reset()
+
+    def reset(self):
+        # forgets every scored day, the days are then replayed from the start of the window
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+        self.last_dt = None
+        self.releases = {}
+        self.con.execute("CREATE OR REPLACE TABLE OI_STATE (option VARCHAR, expiration DATE, last_dt DATE, last_oi INTEGER, n INTEGER, mean DOUBLE, var DOUBLE)")
+        self.con.execute(f"CREATE OR REPLACE TABLE OI_ANOMALIES ({ANOMALY_TABLE_COLUMNS})")
+
+    def stale_dates(self, window):
+        # dates of the (date, release) window up to the last scored day that were scored from another release, or
+        # not at all, the state after them is wrong and has to be rebuilt
+        return [date for date, release in window if date <= self.last_dt and self.releases.get(date) != release]
+
+    def process_day(self, dt, day_sql, release=None):
+        # `day_sql` returns DAY_COLUMNS for a single dt, only live contracts (dte >= 0) are scored and tracked
+        a = self.alpha
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE OI_SCORED AS
+            SELECT D.*, S.last_dt AS prev_dt, S.last_oi AS prev_open_interest,
+                D.open_interest - COALESCE(S.last_oi, 0) AS oi_change,
+                D.open_interest * 1.0 / NULLIF(COALESCE(S.last_oi, 1), 0) AS oi_ratio,
+                S.n, S.mean, S.var
+            FROM (SELECT {DAY_COLUMNS} FROM ({day_sql}) WHERE dte >= 0) D
+            LEFT JOIN OI_STATE S ON S.option = D.option
+        """)
+        self.con.execute(f"""
+            INSERT INTO OI_ANOMALIES
+            SELECT {OUTPUT_COLUMNS}, prev_dt FROM (
+                SELECT *, {self.score_sql} AS anomaly_score FROM OI_SCORED WHERE prev_open_interest > 0
+            ) WHERE anomaly_score > {self.threshold}
+        """)
+        anomalies = self.con.execute(f"SELECT count(*) FROM OI_ANOMALIES WHERE dt = DATE '{dt}'").fetchone()[0]
+
+        # fold today's changes into the state, contracts that expired are dropped
+        self.con.execute(f"""
+            CREATE OR REPLACE TABLE OI_STATE AS
+            SELECT option, expiration, dt AS last_dt, open_interest AS last_oi,
+                IF(prev_open_interest IS NULL, 0, COALESCE(n, 0) + 1) AS n,
+                CASE WHEN prev_open_interest IS NULL THEN 0 WHEN COALESCE(n, 0) = 0 THEN oi_change ELSE mean + {a} * (oi_change - mean) END AS mean,
+                CASE WHEN prev_open_interest IS NULL OR COALESCE(n, 0) = 0 THEN 0 ELSE (1 - {a}) * (var + {a} * (oi_change - mean) * (oi_change - mean)) END AS var
+            FROM OI_SCORED
+            UNION ALL
+            SELECT S.* FROM OI_STATE S ANTI JOIN OI_SCORED C ON C.option = S.option WHERE S.expiration >= DATE '{dt}'
+        """)
+        contracts = self.con.execute("SELECT count(*) FROM OI_SCORED").fetchone()[0]
+        self.last_dt = str(dt)
+        self.releases[self.last_dt] = release
+        print(f"{dt}: scored {contracts} contracts, {anomalies} anomalies ({self.model} > {self.threshold})", flush=True)
+
+    def trim(self, window_dates):
+        # Keeps the anomalies of the days still in the rolling window. Anomalies and contracts last seen before the
+        # first day of the window go too: replayed from the rolling file alone that day has nothing to compare to,
+        # so the first day scores nothing and the later days score the same log_weighted anomalies as a replay of
+        # the window. The zscore mean/var and the percentile ranks still see the days before the window.
+        dates = ", ".join(f"DATE '{k}'" for k in window_dates)
+        first_dt = min(window_dates)
+        self.con.execute(f"DELETE FROM OI_ANOMALIES A WHERE A.prev_dt < DATE '{first_dt}' OR NOT EXISTS (SELECT 1 FROM unnest(CAST([{dates}] AS DATE[])) W(dt) WHERE W.dt = A.dt)")
+        self.con.execute(f"DELETE FROM OI_STATE WHERE last_dt < DATE '{first_dt}'")
+        self.releases = {date: release for date, release in self.releases.items() if date in window_dates}
+
+    def save(self):
+        tmp_dir = f"{self.state_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        self.con.execute(f"COPY OI_STATE TO '{os.path.join(tmp_dir, 'state.parquet')}' (FORMAT PARQUET, COMPRESSION zstd)")
+        self.con.execute(f"COPY OI_ANOMALIES TO '{os.path.join(tmp_dir, 'anomalies.parquet')}' (FORMAT PARQUET, COMPRESSION zstd)")
+        with open(os.path.join(tmp_dir, MANIFEST_FILE_NAME), "w") as file:
+            json.dump({**self.settings, "lastDate": self.last_dt, "releases": self.releases}, file, indent=4)
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.state_dir)
+
+    def write_output(self, output_file):
+        self.con.execute(f"COPY (SELECT {OUTPUT_COLUMNS} FROM OI_ANOMALIES ORDER BY {OUTPUT_SORT_ORDER}) TO '{output_file}' (FORMAT PARQUET, COMPRESSION zstd)")
@@ -0,0 +1,70 @@
+import os
+import asyncio
+import time
+
+FETCH_RATE_LIMIT = float(os.getenv("FETCH_RATE_LIMIT", "10") or "10")  # requests/second to start with
+FETCH_RATE_MIN = float(os.getenv("FETCH_RATE_MIN", "0.5") or "0.5")
+FETCH_RATE_MAX = float(os.getenv("FETCH_RATE_MAX", "40") or "40")
+RATE_INCREASE = 0.1  # requests/second added after every successful request
+RATE_DECREASE = 0.5  # factor applied to the rate when the cdn throttles us
+DECREASE_COOLDOWN = 2.0  # seconds, a burst of 429s from requests already in flight only counts once
+
+
+class AdaptiveRateLimiter:
+    # Process wide token bucket shared by every fetch worker. The rate grows additively while
+    # requests succeed and is cut multiplicatively on 429/503 (AIMD). A Retry-After pauses
+    # every worker, not only the one that received it.
+    def __init__(self, rate=FETCH_RATE_LIMIT, min_rate=FETCH_RATE_MIN, max_rate=FETCH_RATE_MAX):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.throttles = 0
+        self.rate_decreases = 0
+        self.paused_seconds = 0.0
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        burst = max(1.0, self.rate)  # allow up to one second worth of requests in a burst
+        self._tokens = min(burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        # waits for a Retry-After pause to pass and for a token, the lock keeps the workers in line
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def on_throttle(self, retry_after=None):
+        # returns True when the workers are paused, the caller then waits in acquire() instead of sleeping itself
+        now = time.monotonic()
+        self.throttles += 1
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+            self._last_decrease = now
+            self.rate_decreases += 1
+        if retry_after:
+            paused_until = now + retry_after
+            if paused_until > self._paused_until:
+                self.paused_seconds += paused_until - max(now, self._paused_until)
+                self._paused_until = paused_until
+        return now < self._paused_until
+
+    def summary(self):
+        return (f"Rate limiter: {self.rate:.2f} requests/s, {self.throttles} throttled response(s), "
+                f"{self.rate_decreases} rate decrease(s), paused {self.paused_seconds:.0f}s for Retry-After.")
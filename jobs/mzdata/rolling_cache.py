@@ -0,0 +1,84 @@
+import os
+import json
+import shutil
+
+ROLLING_CACHE_DIR = os.getenv("ROLLING_CACHE_DIR", "temp/rolling-cache")
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+class RollingCache:
+    # Per-day cache of already normalised options/stocks partitions for the rolling window.
+    # Only days that are not cached yet (or whose release assets changed) get ingested, days
+    # that fell out of the window are deleted.
+    # A cache written with another `version` (a different normalised layout) is discarded.
+    def __init__(self, cache_dir=ROLLING_CACHE_DIR, version=1):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.days = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                manifest = json.load(file)
+            if manifest.get("version") == version:
+                self.days = manifest["days"]
+            else:
+                print(f"Rolling cache version {manifest.get('version')} does not match {version}, rebuilding it")
+                self.clear()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_FILE_NAME)
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.days = {}
+
+    def _is_cached(self, date, options_url, stocks_url):
+        day = self.days.get(date)
+        return (day is not None and day["optionsAssetUrl"] == options_url and day["stocksAssetUrl"] == stocks_url
+                and os.path.isfile(day["options"]) and os.path.isfile(day["stocks"]))
+
+    def pending(self, entries):
+        # entries of the window that sync would ingest
+        return [entry for entry in entries if not self._is_cached(entry[0], entry[2], entry[3])]
+
+    def sync(self, entries, ingest_day):
+        # entries: (date, name, optionsAssetUrl, stocksAssetUrl) of the rolling window
+        # ingest_day(date, optionsAssetUrl, stocksAssetUrl, options_file, stocks_file) writes one normalised day
+        # returns the dates that were ingested by this call
+        window = {date for date, _, _, _ in entries}
+        for date in sorted(set(self.days) - window):
+            print(f"Dropping {date} from the rolling cache, it is out of the window")
+            self._remove(date)
+
+        ingested = []
+        for date, name, options_url, stocks_url in self.pending(entries):
+            print(f"Ingesting {date} ({name}) into the rolling cache")
+            options_file = os.path.join(self.cache_dir, f"options-{date}.parquet")
+            stocks_file = os.path.join(self.cache_dir, f"stocks-{date}.parquet")
+            ingest_day(date, options_url, stocks_url, options_file, stocks_file)
+            self.days[date] = {"name": name, "optionsAssetUrl": options_url, "stocksAssetUrl": stocks_url, "options": options_file, "stocks": stocks_file}
+            self.save()  # a failure later on keeps the days ingested so far
+            ingested.append(date)
+        print(f"Rolling cache: {len(ingested)} day(s) ingested, {len(window) - len(ingested)} day(s) reused")
+        return ingested
+
+    def _remove(self, date):
+        day = self.days.pop(date)
+        for path in (day["options"], day["stocks"]):
+            if os.path.isfile(path):
+                os.remove(path)
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": self.version, "days": self.days}, file, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def options_files(self):
+        return [self.days[date]["options"] for date in sorted(self.days)]
+
+    def stocks_files(self):
+        return [self.days[date]["stocks"] for date in sorted(self.days)]
@@ -0,0 +1,163 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Declared schemas of the raw daily options_data.parquet / stock_data.parquet files. The fetchers
+# and the finalize step conform everything to these, so the column types never depend on what
+# pandas or the json reader happened to infer for a batch.
+PARQUET_COMPRESSION = "zstd"
+
+_symbol = pa.dictionary(pa.int32(), pa.string())
+_tick = pa.dictionary(pa.int8(), pa.string())
+
+OPTIONS_SCHEMA = pa.schema([
+    ("option", pa.string()),  # close to unique per row, parquet dictionary encodes it within each row group anyway
+    ("bid", pa.float32()),
+    ("bid_size", pa.int32()),
+    ("ask", pa.float32()),
+    ("ask_size", pa.int32()),
+    ("iv", pa.float32()),
+    ("open_interest", pa.int32()),
+    ("volume", pa.int32()),
+    ("delta", pa.float32()),
+    ("gamma", pa.float32()),
+    ("vega", pa.float32()),
+    ("theta", pa.float32()),
+    ("rho", pa.float32()),
+    ("theo", pa.float32()),
+    ("change", pa.float32()),
+    ("open", pa.float32()),
+    ("high", pa.float32()),
+    ("low", pa.float32()),
+    ("tick", _tick),
+    ("last_trade_price", pa.float32()),
+    ("last_trade_time", pa.timestamp("ms")),
+    ("percent_change", pa.float32()),
+    ("prev_day_close", pa.float32()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("symbol", _symbol),
+])
+
+STOCK_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("symbol", _symbol),
+    ("security_type", _tick),
+    ("current_price", pa.float32()),
+    ("price_change", pa.float32()),
+    ("price_change_percent", pa.float32()),
+    ("bid", pa.float32()),
+    ("ask", pa.float32()),
+    ("bid_size", pa.int32()),
+    ("ask_size", pa.int32()),
+    ("open", pa.float32()),
+    ("high", pa.float32()),
+    ("low", pa.float32()),
+    ("close", pa.float32()),
+    ("prev_day_close", pa.float32()),
+    ("volume", pa.int64()),
+    ("iv30", pa.float32()),
+    ("iv30_change", pa.float32()),
+    ("iv30_change_percent", pa.float32()),
+    ("last_trade_time", pa.timestamp("ms")),
+    ("tick", _tick),
+    ("seqno", pa.int64()),
+])
+
+
+def _json_type(type_):
+    # how a column is decoded from the cdn json before it is conformed to the declared type
+    if pa.types.is_floating(type_) or pa.types.is_integer(type_):
+        return pa.float64()
+    return pa.string()
+
+
+def json_schema(schema, exclude=()):
+    return pa.schema([(field.name, _json_type(field.type)) for field in schema if field.name not in exclude])
+
+
+# the per-contract fields, timestamp and symbol come from the payload envelope
+RAW_OPTION_FIELDS_SCHEMA = json_schema(OPTIONS_SCHEMA, exclude=("timestamp", "symbol"))
+RAW_STOCK_SCHEMA = json_schema(STOCK_SCHEMA)
+
+# Shape of the whole cdn payload, lets the arrow json reader decode data.options straight into typed columns
+PAYLOAD_SCHEMA = pa.schema([
+    ("timestamp", pa.string()),
+    ("symbol", pa.string()),
+    ("data", pa.struct(list(json_schema(STOCK_SCHEMA, exclude=("timestamp",))) + [("options", pa.list_(pa.struct(RAW_OPTION_FIELDS_SCHEMA)))])),
+])
+
+_timestamp_formats = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"]
+
+
+class SchemaReport:
+    # Tallies what conform_table had to change to make incoming data fit a declared schema
+    def __init__(self, name):
+        self.name = name
+        self.missing = {}  # field -> rows filled with nulls because the column was absent
+        self.dropped = {}  # field -> rows of a column that is not part of the schema
+        self.coerced = {}  # field -> values changed by a lossy cast to the declared type
+        self.nulled = {}  # field -> values that could not be converted at all
+
+    @staticmethod
+    def add(counts, field, rows):
+        if rows:
+            counts[field] = counts.get(field, 0) + rows
+
+    def is_clean(self):
+        return not (self.missing or self.dropped or self.coerced or self.nulled)
+
+    def summary(self):
+        if self.is_clean():
+            return f"Schema report for {self.name}: all data matched the declared schema."
+        lines = [f"Schema report for {self.name}:"]
+        for label, counts in (("missing (filled with nulls)", self.missing), ("dropped", self.dropped),
+                              ("coerced with loss", self.coerced), ("unparseable (set to null)", self.nulled)):
+            if counts:
+                lines.append(f"  {label}: " + ", ".join(f"{field}={rows}" for field, rows in sorted(counts.items())))
+        return "\n".join(lines)
+
+
+def _cast_column(column, field, report):
+    target = field.type
+    if column.type == target:
+        return column
+    if pa.types.is_timestamp(target) and target.tz and not pa.types.is_timestamp(column.type):
+        # naive strings are utc, parse them to a naive timestamp first and attach the zone after
+        return _cast_column(column, pa.field(field.name, pa.timestamp(target.unit)), report).cast(target)
+    try:
+        return column.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+    if pa.types.is_timestamp(target) and pa.types.is_string(column.type):
+        parsed = [pc.strptime(column, format=fmt, unit=target.unit, error_is_null=True) for fmt in _timestamp_formats]
+        result = pc.coalesce(*parsed)
+    else:
+        try:
+            result = column.cast(target, safe=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            result = pa.nulls(len(column), target)
+        else:
+            try:
+                changed = pc.sum(pc.not_equal(result.cast(column.type), column)).as_py() or 0
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                changed = len(column)
+            report.add(report.coerced, field.name, changed)
+            return result
+    report.add(report.nulled, field.name, result.null_count - column.null_count)
+    return result
+
+
+def conform_table(table, schema, report=None):
+    # Lines a table up with a declared schema: missing columns become nulls, extra ones are
+    # dropped and types are cast, so files written with different inferred dtypes can be merged.
+    report = report or SchemaReport("table")
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(_cast_column(table.column(field.name), field, report))
+        else:
+            report.add(report.missing, field.name, len(table))
+            columns.append(pa.nulls(len(table), field.type))
+    for name in table.column_names:
+        if schema.get_field_index(name) == -1:
+            report.add(report.dropped, name, len(table))
+    return pa.Table.from_arrays(columns, schema=schema)
@@ -0,0 +1,2 @@
+# The jobs as functions of a JobContext (mzdata.context). The scripts under jobs/ run a single one of them,
+# python -m mzdata (mzdata.cli) chains several in one process.
@@ -0,0 +1,82 @@
+import os
+import json
+
+from mzdata.occ import load_exception_symbols, create_exception_symbols_table, occ_normalise_sql
+from mzdata.oi_anomaly import OIAnomalyEngine, DAY_COLUMNS
+from mzdata.asset_cache import AssetCache
+from mzdata.stages.releases import ROLLING_DAYS, ROLLING_SUMMARY_FILE_NAME, rolling_window
+
+OI_ANOMALY_MODEL = os.getenv("OI_ANOMALY_MODEL", "log_weighted")     # log_weighted, zscore or percentile
+OI_ANOMALY_THRESHOLD = float(os.getenv("OI_ANOMALY_THRESHOLD")) if os.getenv("OI_ANOMALY_THRESHOLD") else None    # default cutoff of the model when empty
+ANOMALY_FILE_NAME = "options_cboe_oi_anomaly.parquet"
+
+
+def score_anomalies(ctx, rolling_days=ROLLING_DAYS, model=OI_ANOMALY_MODEL, threshold=OI_ANOMALY_THRESHOLD):
+    # Scores the open interest anomalies of the rolling window into temp/options_cboe_oi_anomaly.parquet and
+    # links it from data/cboe-options-rolling.json. Without a saved state the rolling file is replayed day by
+    # day, otherwise only the days after the state are read from their daily options file. A day whose release was
+    # replaced since it was scored invalidates the state after it, the rolling file is replayed then too.
+    con, run = ctx.con, ctx.run
+    summary_file = ctx.data_path(ROLLING_SUMMARY_FILE_NAME)
+    with open(summary_file, 'r') as file:
+        data = json.load(file)
+    assetUrl = data['assetUrl']
+    print(assetUrl)
+
+    # (date, name, optionsAssetUrl) of the days in the rolling window, the same days the rolling file holds
+    window = [(date, name, optionsAssetUrl) for date, name, optionsAssetUrl, _ in rolling_window(ctx, rolling_days)]
+    window_dates = [date for date, _, _ in window]
+    output_file = ctx.temp_path(ANOMALY_FILE_NAME)
+
+    engine = OIAnomalyEngine(con, model=model, threshold=threshold)
+    if engine.last_dt is not None:
+        stale_dates = engine.stale_dates([(date, name) for date, name, _ in window])
+        if stale_dates:
+            print(f"Releases of {', '.join(stale_dates)} changed since they were scored, rebuilding the oi anomaly state")
+            engine.reset()
+    asset_cache = AssetCache.load()
+    if engine.last_dt is None:
+        # no state yet, it is built by replaying every day of the rolling file
+        print(f"Building the oi anomaly state from {assetUrl}")
+        with run.stage("prefetch") as stage:
+            sources = ctx.resolve([assetUrl], asset_cache)
+            stage.add(bytes_read=asset_cache.bytes_fetched + asset_cache.bytes_cached)
+        with run.stage("score days") as stage:
+            con.sql(f"CREATE OR REPLACE TABLE ROLLING AS SELECT {DAY_COLUMNS} FROM {sources[assetUrl]}")
+            stage.add(rows_in=con.sql("SELECT count(*) FROM ROLLING").fetchone()[0])
+            for date, name, _ in window:
+                engine.process_day(date, f"SELECT * FROM ROLLING WHERE dt = DATE '{date}'", name)
+            con.sql("DROP TABLE ROLLING")
+        run.set(mode="bootstrap", scoredDays=len(window))
+    else:
+        exception_table = create_exception_symbols_table(con, load_exception_symbols(ctx.exception_symbols_file))
+        engine.trim(window_dates)    # the new days are not scored against days that left the window
+        new_days = [(date, name, optionsAssetUrl) for date, name, optionsAssetUrl in window if date > engine.last_dt]
+        with run.stage("prefetch") as stage:
+            sources = ctx.resolve([optionsAssetUrl for _, _, optionsAssetUrl in new_days], asset_cache)
+            stage.add(bytes_read=asset_cache.bytes_fetched + asset_cache.bytes_cached)
+        with run.stage("score days"):
+            for date, name, optionsAssetUrl in new_days:
+                engine.process_day(date, f"""
+                    SELECT DATE '{date}' AS dt, option, option_symbol, expiration, DATE_DIFF('day', DATE '{date}', expiration) AS dte,
+                        delta, gamma, option_type, strike, open_interest, volume
+                    FROM {occ_normalise_sql(sources[optionsAssetUrl], exception_table)}
+                """, name)
+        run.set(mode="incremental", scoredDays=len(new_days))
+
+    print(asset_cache.summary())
+    with run.stage("write output") as stage:
+        engine.trim(window_dates)
+        engine.save()
+        engine.write_output(output_file)
+        stage.add(rows_out=con.sql("SELECT count(*) FROM OI_ANOMALIES").fetchone()[0])
+        stage.wrote_file(output_file)
+
+    file_size_mb = os.path.getsize(output_file) / (1024 * 1024)
+    print(f"File size after compression: {file_size_mb:.2f} MB")
+
+    data['openInterestAnomalyUrl'] = ctx.release_url(ANOMALY_FILE_NAME)
+    with open(summary_file, "w") as file:
+        json.dump(data, file, indent=4)
+    print(f"Updated summary file: {summary_file}")
+    return output_file
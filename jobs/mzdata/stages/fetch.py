@@ -0,0 +1,75 @@
+import os
+import json
+
+import requests
+
+from mzdata.cboe_fetch import fetch_symbols
+from mzdata.chains import ChainWriter
+from mzdata.checkpoint import BatchManifest, CheckpointedChainWriter, current_trading_date, OPTIONS_DATA_DIR_NAME, BATCH_DIR_PREFIX
+from mzdata.fetch_cache import FetchCache
+from mzdata.stages.releases import OPTIONS_FILE_NAME, STOCK_FILE_NAME, DAY_OPTIONS_TABLE, DAY_STOCKS_TABLE
+
+WATCHLIST_URL = os.getenv("WATCHLIST_URL", "https://mztrading.netlify.app/api/watchlist")
+
+
+def load_exception_symbols(ctx):
+    # Symbols that need to be prefixed with "_" in the cboe urls (SPX, VIX, ...)
+    with open(ctx.exception_symbols_file, "r") as file:
+        exception_symbols = json.load(file)
+    print(f"Loaded {len(exception_symbols)} exception symbols: {exception_symbols}", flush=True)
+    return exception_symbols
+
+
+def fetch_watchlist(ctx, url=WATCHLIST_URL):
+    with ctx.run.histogram("watchlist").time() as timing:
+        response = requests.get(url)
+        timing["status"] = response.status_code
+    response.raise_for_status()
+    watchlist = response.json()  # Expected format: { items: [{ symbol: str, name: str }] }
+    symbols = [item["symbol"] for item in watchlist["items"]]
+    print(f"Found {len(symbols)} symbols: {symbols}", flush=True)
+    return symbols
+
+
+def fetch_day(ctx, symbols):
+    # Fetches all the symbols concurrently into temp/options_data.parquet and temp/stock_data.parquet, every
+    # chain is streamed to the files as it arrives
+    options_file = ctx.temp_path(OPTIONS_FILE_NAME)
+    stock_file = ctx.temp_path(STOCK_FILE_NAME)
+    with ctx.run.stage("fetch") as stage, ChainWriter(stock_file, options_file) as writer:
+        stats = fetch_symbols(symbols, load_exception_symbols(ctx), writer.on_data)
+    stage.add(rows_in=len(symbols), rows_out=stats.success)
+    stage.wrote_file(stock_file)
+    stage.wrote_file(options_file)
+    ctx.run.set(symbolsSucceeded=stats.success, symbolsFailed=stats.failed, staleRevisits=stats.stale_revisits)
+    ctx.publish_file(OPTIONS_FILE_NAME, options_file, DAY_OPTIONS_TABLE)
+    ctx.publish_file(STOCK_FILE_NAME, stock_file, DAY_STOCKS_TABLE)
+
+    print(f"Saved stock data to {stock_file}", flush=True)
+    print(f"Saved options data to {options_file}", flush=True)
+    return stats
+
+
+def fetch_batch(ctx, symbols, batch_id):
+    # Fetches one batch of the matrix into part files under temp/options-data/batch-<id>. The manifest lists
+    # the symbols already saved in part files, a rerun of the same trading date only fetches the rest
+    base_path = ctx.temp_path(OPTIONS_DATA_DIR_NAME, f"{BATCH_DIR_PREFIX}{batch_id}")
+    os.makedirs(base_path, exist_ok=True)
+    manifest = BatchManifest.load(base_path, current_trading_date())
+    exception_symbols = load_exception_symbols(ctx)
+
+    completed_symbols = manifest.completed_symbols
+    pending_symbols = [symbol for symbol in symbols if symbol not in completed_symbols]
+    if completed_symbols:
+        print(f"Resuming batch for trading date {manifest.trading_date}: {len(symbols) - len(pending_symbols)} symbols already fetched, {len(pending_symbols)} remaining", flush=True)
+
+    cache = FetchCache.load()
+    with ctx.run.stage("fetch") as stage, CheckpointedChainWriter(manifest) as writer:
+        stats = fetch_symbols(pending_symbols, exception_symbols, writer.on_data, cache=cache)
+    stage.add(rows_in=len(pending_symbols), rows_out=stats.success)
+    ctx.run.set(symbolsSucceeded=stats.success, symbolsFailed=stats.failed, staleRevisits=stats.stale_revisits,
+                symbolsResumed=len(symbols) - len(pending_symbols), fetchCacheHits=cache.hits, fetchCacheMisses=cache.misses)
+
+    print(f"Saved {len(manifest.completed_symbols)} symbols in {len(manifest.parts)} part files, manifest: {manifest.path}", flush=True)
+    return stats
+
@@ -0,0 +1,57 @@
+import os
+import json
+
+from mzdata.checkpoint import read_manifests
+from mzdata.schema import OPTIONS_SCHEMA, STOCK_SCHEMA
+from mzdata.merge import merge_parquet
+from mzdata.stages.releases import OPTIONS_FILE_NAME, STOCK_FILE_NAME, DAY_OPTIONS_TABLE, DAY_STOCKS_TABLE
+
+
+def finalize_batches(ctx):
+    # Merges the part files of every batch under temp/ into temp/options_data.parquet and temp/stock_data.parquet.
+    # Every batch writes a manifest listing the symbols that made it and the part files holding them.
+    options_file = ctx.temp_path(OPTIONS_FILE_NAME)
+    stock_file = ctx.temp_path(STOCK_FILE_NAME)
+    manifests = read_manifests(ctx.temp_dir)
+    if not manifests:
+        raise FileNotFoundError(f"No batch manifests found in {ctx.temp_dir}")
+
+    options_files = []
+    stock_files = []
+    fetched_symbols = []
+    for batch_dir, manifest in manifests:
+        for part in manifest["parts"]:
+            options_files.append(batch_dir / part["options"])
+            stock_files.append(batch_dir / part["stocks"])
+            fetched_symbols.extend(part["symbols"])
+        print(f"Batch {batch_dir} ({manifest['tradingDate']}): {sum(len(part['symbols']) for part in manifest['parts'])} symbols in {len(manifest['parts'])} parts")
+
+    if not options_files:
+        raise FileNotFoundError(f"No options data files found in {ctx.temp_dir}")
+
+    print(f"Found {len(fetched_symbols)} symbols in {len(options_files)} part files across {len(manifests)} batches")
+
+    all_symbols_file = ctx.temp_path("symbol-batches", "temp", "all-symbols.json")
+    if os.path.exists(all_symbols_file):
+        with open(all_symbols_file, "r") as file:
+            missing_symbols = sorted(set(json.load(file)) - set(fetched_symbols))
+        print(f"Missing {len(missing_symbols)} symbol(s): {missing_symbols}")
+
+    # Stream the row groups of every part into a single file, memory stays flat however many batches there are
+    with ctx.run.stage("merge options") as stage:
+        options_rows = merge_parquet(options_files, options_file, OPTIONS_SCHEMA)
+        stage.add(rows_out=options_rows, bytes_read=sum(os.path.getsize(path) for path in options_files))
+        stage.wrote_file(options_file)
+    with ctx.run.stage("merge stocks") as stage:
+        stock_rows = merge_parquet(stock_files, stock_file, STOCK_SCHEMA)
+        stage.add(rows_out=stock_rows, bytes_read=sum(os.path.getsize(path) for path in stock_files))
+        stage.wrote_file(stock_file)
+    ctx.run.set(batches=len(manifests), symbols=len(fetched_symbols))
+    ctx.publish_file(OPTIONS_FILE_NAME, options_file, DAY_OPTIONS_TABLE)
+    ctx.publish_file(STOCK_FILE_NAME, stock_file, DAY_STOCKS_TABLE)
+    print(f"Combined options data rows: {options_rows}")
+    print(f"Combined stock data rows: {stock_rows}")
+
+    print(f"Saved stock data to {stock_file}", flush=True)
+    print(f"Saved options data to {options_file}", flush=True)
+    return options_rows, stock_rows
@@ -0,0 +1,57 @@
+import os
+import re
+import json
+from datetime import datetime
+
+ROLLING_DAYS = int(os.getenv("ROLLING_DAYS", "30") or "30")
+OPTIONS_FILE_NAME = "options_data.parquet"
+STOCK_FILE_NAME = "stock_data.parquet"
+SUMMARY_FILE_NAME = "cboe-options-summary.json"
+ROLLING_SUMMARY_FILE_NAME = "cboe-options-rolling.json"
+DAY_OPTIONS_TABLE = "DAY_OPTIONS"    # the day in the pipeline database, see JobContext.publish_file
+DAY_STOCKS_TABLE = "DAY_STOCKS"
+
+
+# The release list every stage agrees on: data/cboe-options-summary.json holds one entry per daily release,
+# the rolling window is made of its last ROLLING_DAYS entries.
+
+def add_summary_entry(ctx):
+    # Adds the release of this run to data/cboe-options-summary.json, the list the rolling window is built from
+    summary_file = ctx.data_path(SUMMARY_FILE_NAME)
+    if os.path.exists(summary_file):
+        with open(summary_file, "r") as file:
+            summary_data = json.load(file)
+    else:
+        summary_data = []
+
+    summary_data.append({"name": ctx.release_name, "optionsAssetUrl": ctx.release_url(OPTIONS_FILE_NAME), "stocksAssetUrl": ctx.release_url(STOCK_FILE_NAME)})
+    with open(summary_file, "w") as file:
+        json.dump(summary_data, file, indent=4)
+
+    print(f"Updated summary file: {summary_file}", flush=True)
+
+
+def rolling_window(ctx, rolling_days=ROLLING_DAYS):
+    # (date, name, optionsAssetUrl, stocksAssetUrl) of the last `rolling_days` days of data/cboe-options-summary.json.
+    # Two releases can parse to the same date (a rerun under another tag), the one listed last wins so every
+    # date is in the window once and the rolling cache keeps the same release for it
+    with open(ctx.data_path(SUMMARY_FILE_NAME), "r") as file:
+        data = json.load(file)
+    options_data = [(item['optionsAssetUrl'], item['stocksAssetUrl'], item['name']) for item in data if 'optionsAssetUrl' in item and 'stocksAssetUrl' in item and 'name' in item]
+
+    releases = {}
+    for optionsAssetUrl, stocksAssetUrl, name in options_data:
+        match = re.search(r'\d{4}-\d{2}-\d{2}', name)
+        if not match:
+            raise ValueError(f"Unable to parse date from name: {name}")
+        date = str(datetime.strptime(match.group(), '%Y-%m-%d').date())
+        if date in releases:
+            print(f"Release {name} replaces {releases[date][1]} for {date}")
+            del releases[date]    # re-inserted below, at the position of the later release
+        releases[date] = (date, name, optionsAssetUrl, stocksAssetUrl)
+
+    entries = list(releases.values())[-rolling_days:]
+    for date, name, optionsAssetUrl, stocksAssetUrl in entries:
+        print(f"Name: {name}, OPTIONS_URL: {optionsAssetUrl}, STOCKS_URL: {stocksAssetUrl}")
+        print(f"Parsed Date: {date}")
+    return entries
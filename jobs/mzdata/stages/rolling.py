@@ -0,0 +1,259 @@
+import os
+import json
+import shutil
+
+from mzdata.rolling_cache import RollingCache
+from mzdata.asset_cache import AssetCache
+from mzdata.occ import load_exception_symbols, create_exception_symbols_table, occ_normalise_sql
+from mzdata.symbol_index import write_symbol_aligned
+from mzdata.strikes_index import merge_strikes, export_strikes_json, indexed_max_dt
+from mzdata.stages.releases import ROLLING_DAYS, ROLLING_SUMMARY_FILE_NAME, rolling_window
+
+ROLLING_INCREMENTAL = os.getenv("ROLLING_INCREMENTAL", "1") == "1"    # 0 rebuilds the rolling cache from scratch
+ROLLING_CACHE_VERSION = 2    # bump whenever the normalised OPDATA/STOCKSDATA layout changes
+ROLLING_ROW_GROUP_SIZE = int(os.getenv("ROLLING_ROW_GROUP_SIZE", "100000"))
+STRIKES_PRUNE_EXPIRED = os.getenv("STRIKES_PRUNE_EXPIRED", "0") == "1"    # drops the expirations before the last rolling day from the strikes index
+STRIKES_JSON_EXPORT = os.getenv("STRIKES_JSON_EXPORT", "1") == "1"    # keeps writing the legacy json file for the deno side (when the index changed)
+ROLLING_SHARD_MODE = os.getenv("ROLLING_SHARD_MODE", "")    # "hash" or "symbol" also writes the window as shards, empty disables it
+ROLLING_SHARD_BUCKETS = int(os.getenv("ROLLING_SHARD_BUCKETS", "64"))    # hash mode only, a release takes at most 1000 assets
+ROLLING_SORT_ORDER = "option_symbol, dt, expiration, option_type, strike"    # keeps each ticker's rows together, compresses best
+
+OPDATA_COLUMNS = "dt DATE, symbol string, option string, option_symbol string, expiration DATE, option_type string, strike float, open_interest int, volume int, delta float, gamma float, iv float"
+STOCKSDATA_COLUMNS = "dt DATE, symbol string, current_price float, price_change float, price_change_percent float, open float, high float, low float, close float, prev_day_close float"
+ROLLING_OPTIONS_COLUMNS = "dt, option, option_symbol, expiration, DATE_DIFF('day', dt, expiration) AS dte"
+ROLLING_FILE_NAME = "options_cboe_rolling_30.parquet"    #let see if 30 days we can handle, since deno has a limit of memory. 10 days worth is 30MB, so 30 days should be 90MB.
+ROLLING_IV_FILE_NAME = "options_cboe_rolling_iv_30.parquet"
+ROLLING_STOCKS_FILE_NAME = "stocks_cboe_rolling_30.parquet"
+EXPOSURE_FILE_NAME = "options_cboe_exposure_30.parquet"
+GREEKS_REPORT_FILE_NAME = "all_symbols_summary_report.csv"
+SYMBOL_INDEX_FILE_NAME = "cboe-options-rolling-index.json"
+STRIKES_JSON_FILE_NAME = "options-expirations-strikes.json"
+STRIKES_INDEX_FILE_NAME = "options-expirations-strikes.parquet"
+
+
+def write_shards(ctx, mode, buckets=ROLLING_SHARD_BUCKETS):
+    # Writes the rolling window again as small shards, one per ticker or per hash bucket of tickers, so a consumer
+    # only has to download the shard of the tickers it serves. OPDATA is read once into a partitioned directory,
+    # the partitioned write does not keep the row order so every shard is then sorted into its release file.
+    # The hash bucket is the first 32 bits of md5(option_symbol) modulo `buckets`, duckdb's hash() may change
+    # between versions, still a consumer is meant to look its ticker up in the returned manifest.
+    if mode == "symbol":
+        shard_key = "option_symbol"
+    elif mode == "hash":
+        shard_key = f"CAST('0x' || substr(md5(option_symbol), 1, 8) AS UBIGINT) % {buckets}"
+    else:
+        raise ValueError(f"Unknown ROLLING_SHARD_MODE: {mode}")
+
+    shard_dir = ctx.temp_path("rolling-shards")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    ctx.con.sql(f"""COPY (select {ROLLING_OPTIONS_COLUMNS}, delta, gamma, option_type, strike, open_interest, volume, iv, {shard_key} AS shard from OPDATA) to '{shard_dir}' (FORMAT PARQUET, PARTITION_BY (shard), COMPRESSION zstd)""")
+
+    shards = []
+    rows = ctx.con.sql(f"""
+        SELECT shard, list(DISTINCT option_symbol ORDER BY option_symbol), count(*), list(DISTINCT filename)
+        FROM read_parquet('{shard_dir}/*/*.parquet', hive_partitioning = true, hive_types_autocast = false, filename = true)
+        GROUP BY 1 ORDER BY 1
+    """).fetchall()
+    for shard, symbols, row_count, part_files in rows:
+        file_name = f"options_cboe_rolling_{shard}.parquet" if mode == "symbol" else f"options_cboe_rolling_shard_{int(shard):03d}.parquet"
+        shard_file = ctx.temp_path(file_name)
+        ctx.con.sql(f"""COPY (select * EXCLUDE (shard) from read_parquet({part_files}, hive_partitioning = true) ORDER BY {ROLLING_SORT_ORDER}) to '{shard_file}' (FORMAT PARQUET, COMPRESSION zstd, ROW_GROUP_SIZE {ROLLING_ROW_GROUP_SIZE})""")
+        shards.append({
+            "url": ctx.release_url(file_name),
+            "size": os.path.getsize(shard_file),
+            "rows": row_count,
+            "symbols": symbols,
+        })
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    print(f"Wrote {len(shards)} {mode} shards, {sum(k['size'] for k in shards) / (1024 * 1024):.2f} MB")
+    return {"mode": mode, "buckets": buckets if mode == "hash" else None, "hash": "md5" if mode == "hash" else None, "files": shards}
+
+
+def consolidate_rolling(ctx, rolling_days=ROLLING_DAYS, incremental=ROLLING_INCREMENTAL, shard_mode=ROLLING_SHARD_MODE,
+                        strikes_prune_expired=STRIKES_PRUNE_EXPIRED, strikes_json_export=STRIKES_JSON_EXPORT):
+    # Builds the rolling window of the last `rolling_days` releases into the OPDATA/STOCKSDATA tables of ctx.con
+    # and writes the rolling outputs, the greeks report, the exposure cube and the strikes index from them.
+    # The tables are left in place, the rolling file is published as a query over OPDATA for the stages that follow.
+    con, run = ctx.con, ctx.run
+    print(f"Rolling days: {rolling_days}")
+    exception_table = create_exception_symbols_table(con, load_exception_symbols(ctx.exception_symbols_file))
+    rolling_entries = rolling_window(ctx, rolling_days)
+
+    con.sql(f"""CREATE OR REPLACE TABLE OPDATA ({OPDATA_COLUMNS})""")
+    con.sql(f"""CREATE OR REPLACE TABLE STOCKSDATA ({STOCKSDATA_COLUMNS})""")
+
+    # Normalises one day of options/stocks data and writes it to the rolling cache files.
+    # The option strings are parsed and the exception symbols mapped in the same pass (see mzdata.occ)
+    def ingest_day(date, optionsAssetUrl, stocksAssetUrl, options_file, stocks_file):
+        con.sql(f"""COPY (
+            SELECT '{date}'::DATE AS dt, symbol, option, option_symbol, expiration, option_type, strike, open_interest, volume, delta, gamma, iv
+            FROM {occ_normalise_sql(sources[optionsAssetUrl], exception_table)}
+          ) TO '{options_file}' (FORMAT PARQUET, COMPRESSION zstd)""")
+        con.sql(f"""COPY (SELECT '{date}'::DATE AS dt, replace(symbol,'^', '') symbol, current_price, price_change, price_change_percent, open, high, low, close, prev_day_close FROM {sources[stocksAssetUrl]}) TO '{stocks_file}' (FORMAT PARQUET, COMPRESSION zstd)""")
+
+    # Only the days missing from the local cache are downloaded and normalised, the rest is reused as is
+    rolling_cache = RollingCache(version=ROLLING_CACHE_VERSION)
+    if not incremental:
+        rolling_cache.clear()
+    # The release assets of those days are downloaded in parallel first (the ones published by an earlier
+    # stage of this process are read in place), the sql only reads local data
+    asset_cache = AssetCache.load()
+    with run.stage("prefetch") as stage:
+        sources = ctx.resolve([url for _, _, optionsAssetUrl, stocksAssetUrl in rolling_cache.pending(rolling_entries) for url in (optionsAssetUrl, stocksAssetUrl)], asset_cache)
+        stage.add(bytes_read=asset_cache.bytes_fetched)
+    print(asset_cache.summary())
+    with run.stage("ingest") as stage:
+        ingested_dates = rolling_cache.sync(rolling_entries, ingest_day)
+        stage.add(rows_in=len(ingested_dates))
+    run.set(rollingDays=len(rolling_entries), ingestedDays=len(ingested_dates), assetsFetched=asset_cache.fetched, assetsCached=asset_cache.cached)
+
+    # OPDATA is filled already sorted, the outputs below are copied out of it in that order
+    with run.stage("load window") as stage:
+        con.sql(f"""INSERT INTO OPDATA SELECT * FROM read_parquet({rolling_cache.options_files()}) ORDER BY {ROLLING_SORT_ORDER}""")
+        con.sql(f"""INSERT INTO STOCKSDATA SELECT * FROM read_parquet({rolling_cache.stocks_files()})""")
+        stage.add(rows_out=con.sql("SELECT count(*) FROM OPDATA").fetchone()[0], bytes_read=sum(os.path.getsize(f) for f in rolling_cache.options_files() + rolling_cache.stocks_files()))
+
+    output_file = ctx.temp_path(ROLLING_FILE_NAME)
+    output_iv_file = ctx.temp_path(ROLLING_IV_FILE_NAME)
+    stocks_output_file = ctx.temp_path(ROLLING_STOCKS_FILE_NAME)
+
+    # Main Options: everything but iv, IV: everything but delta, gamma, open_interest and volume
+    # Row groups never straddle two tickers, the sidecar index maps every option_symbol to its row groups and
+    # their byte ranges so a consumer can range-request a single ticker instead of downloading the whole file
+    rolling_query = f"select {ROLLING_OPTIONS_COLUMNS}, delta, gamma, option_type, strike, open_interest, volume from OPDATA"
+    with run.stage("rolling outputs") as stage:
+        symbol_index = {"name": ctx.release_name, "key": "option_symbol", "files": {
+            ROLLING_FILE_NAME: write_symbol_aligned(con, rolling_query, output_file, row_group_size=ROLLING_ROW_GROUP_SIZE),
+            ROLLING_IV_FILE_NAME: write_symbol_aligned(con, f"select {ROLLING_OPTIONS_COLUMNS}, option_type, strike, iv from OPDATA", output_iv_file, row_group_size=ROLLING_ROW_GROUP_SIZE),
+        }}
+        con.sql(f"""COPY (select dt, symbol, current_price, price_change, price_change_percent, open, high, low, close, prev_day_close from STOCKSDATA) to '{stocks_output_file}' (FORMAT PARQUET)""")
+        stage.add(rows_out=sum(k[2] for k in symbol_index["files"][ROLLING_FILE_NAME]["rowGroups"]))
+        for path in (output_file, output_iv_file, stocks_output_file):
+            stage.wrote_file(path)
+    ctx.publish(ROLLING_FILE_NAME, f"({rolling_query})")
+
+    shards_manifest = None
+    if shard_mode:
+        with run.stage("shards") as stage:
+            shards_manifest = write_shards(ctx, shard_mode)
+            stage.add(rows_out=sum(k["rows"] for k in shards_manifest["files"]), bytes_written=sum(k["size"] for k in shards_manifest["files"]))
+
+    print(f"Printing stats for Options Data file")
+    file_size_mb = os.path.getsize(output_file) / (1024 * 1024)
+    file_size_iv_mb = os.path.getsize(output_iv_file) / (1024 * 1024)
+    print(f"File size after compression. Main Options: {file_size_mb:.2f} MB, IV: {file_size_iv_mb:.2f} MB")
+
+    symbols_summary_df = con.sql("SELECT distinct symbol, cast(dt as string) as dt FROM STOCKSDATA").to_df()
+    symbols_summary = symbols_summary_df.to_json(orient='records')
+
+    summary_report_file = ctx.temp_path(GREEKS_REPORT_FILE_NAME)
+    with run.stage("greeks report") as stage:
+        con.sql(f"""
+                  COPY
+                    (SELECT
+                        CAST(O.dt as STRING) as dt,
+                        P.symbol,
+                        round(CAST(P.close as double), 2) as price,
+                        round(SUM(IF(option_type = 'C', open_interest * delta, 0))) as call_delta,
+                        round(SUM(IF(option_type = 'P', open_interest * abs(delta), 0))) as put_delta,
+                        round(SUM(IF(option_type = 'C', open_interest * gamma, 0))) as call_gamma,
+                        round(SUM(IF(option_type = 'P', open_interest * gamma, 0))) as put_gamma,
+                        round(SUM(IF(option_type = 'C', open_interest, 0))) as call_oi,
+                        round(SUM(IF(option_type = 'P', open_interest, 0))) as put_oi,
+                        round(SUM(IF(option_type = 'C', volume, 0))) as call_volume,
+                        round(SUM(IF(option_type = 'P', volume, 0))) as put_volume,
+                        call_gamma-put_gamma as net_gamma,
+                        IF(call_delta = 0 OR put_delta = 0, 0, round(call_delta/put_delta, 2)) as call_put_dex_ratio,
+                        IF(call_oi=0 OR put_oi = 0, 0, round(call_oi/put_oi, 2)) as call_put_oi_ratio,
+                        IF(call_volume = 0 or put_volume = 0, 0, round(call_volume/put_volume, 2)) as call_put_volume_ratio
+                    FROM OPDATA O
+                    JOIN STOCKSDATA P ON O.dt = P.dt AND O.option_symbol = P.symbol
+                    GROUP BY O.dt, P.symbol, P.close
+                    ORDER BY 1)
+                  TO '{summary_report_file}' (HEADER, DELIMITER ',')
+        """)
+        stage.wrote_file(summary_report_file)
+
+    # Exposure cube: call/put DEX, GEX, OI and volume per dt, symbol, expiration and strike plus the roll-ups by
+    # expiration, by strike and per symbol (level column), so the dashboard charts are point lookups.
+    # DEX/GEX are share based (open_interest * delta|gamma), multiply by price or 100 as the charts need.
+    exposure_output_file = ctx.temp_path(EXPOSURE_FILE_NAME)
+    with run.stage("exposure cube") as stage:
+        con.sql(f"""
+                  COPY
+                    (SELECT
+                        O.dt,
+                        P.symbol,
+                        CASE GROUPING_ID(O.expiration, O.strike) WHEN 0 THEN 'expiration_strike' WHEN 1 THEN 'expiration' WHEN 2 THEN 'strike' ELSE 'symbol' END AS level,
+                        O.expiration,
+                        O.strike,
+                        CAST(P.close as double) as price,
+                        SUM(IF(option_type = 'C', open_interest * delta, 0)) as call_dex,
+                        SUM(IF(option_type = 'P', open_interest * abs(delta), 0)) as put_dex,
+                        SUM(IF(option_type = 'C', open_interest * gamma, 0)) as call_gex,
+                        SUM(IF(option_type = 'P', open_interest * gamma, 0)) as put_gex,
+                        call_gex - put_gex as net_gex,
+                        CAST(SUM(IF(option_type = 'C', open_interest, 0)) AS BIGINT) as call_oi,
+                        CAST(SUM(IF(option_type = 'P', open_interest, 0)) AS BIGINT) as put_oi,
+                        CAST(SUM(IF(option_type = 'C', volume, 0)) AS BIGINT) as call_volume,
+                        CAST(SUM(IF(option_type = 'P', volume, 0)) AS BIGINT) as put_volume
+                    FROM OPDATA O
+                    JOIN STOCKSDATA P ON O.dt = P.dt AND O.option_symbol = P.symbol
+                    GROUP BY GROUPING SETS (
+                        (O.dt, P.symbol, P.close, O.expiration, O.strike),
+                        (O.dt, P.symbol, P.close, O.expiration),
+                        (O.dt, P.symbol, P.close, O.strike),
+                        (O.dt, P.symbol, P.close)
+                    )
+                    ORDER BY P.symbol, O.dt, level, O.expiration, O.strike)
+                  TO '{exposure_output_file}' (FORMAT PARQUET, COMPRESSION zstd, ROW_GROUP_SIZE {ROLLING_ROW_GROUP_SIZE})
+        """)
+        stage.wrote_file(exposure_output_file)
+    print(f"Exposure cube size: {os.path.getsize(exposure_output_file) / (1024 * 1024):.2f} MB")
+
+    summary_file = ctx.data_path(ROLLING_SUMMARY_FILE_NAME)
+    with open(summary_file, "w") as file:
+        json.dump({
+            "name": ctx.release_name,
+            "assetUrl": ctx.release_url(ROLLING_FILE_NAME),
+            "assetIVUrl": ctx.release_url(ROLLING_IV_FILE_NAME),
+            "stockUrl": ctx.release_url(ROLLING_STOCKS_FILE_NAME),
+            "greeksReportCsv": ctx.release_url(GREEKS_REPORT_FILE_NAME),
+            "exposureCubeUrl": ctx.release_url(EXPOSURE_FILE_NAME),
+            "symbolsSummary": json.loads(symbols_summary),
+            **({"shards": shards_manifest} if shards_manifest else {})
+        }, file, indent=4)
+    print(f"Updated summary file: {summary_file}")
+
+    symbol_index_file = ctx.data_path(SYMBOL_INDEX_FILE_NAME)
+    with open(symbol_index_file, "w") as file:
+        json.dump(symbol_index, file, separators=(",", ":"))    # compact, it holds an entry per ticker and row group
+    print(f"Updated symbol index file: {symbol_index_file}")
+
+    # Merge the expirations and strikes index: the days after the last one the index holds plus the days this run
+    # ingested again, the whole window when the index is new. Going by the index rather than by the days ingested
+    # keeps the days a failed run cached (but never merged) from being skipped for good.
+    strikes_index_file = ctx.data_path(STRIKES_INDEX_FILE_NAME)
+    strikes_json_file = ctx.data_path(STRIKES_JSON_FILE_NAME)
+    indexed_dt = indexed_max_dt(strikes_index_file)
+    if indexed_dt is None:
+        new_strikes_filter = ""
+    else:
+        new_strikes_filter = f"WHERE dt > DATE '{indexed_dt}'" + "".join(f" OR dt = DATE '{k}'" for k in ingested_dates)
+
+    with run.stage("strikes index") as stage:
+        added, pruned = merge_strikes(
+            con,
+            f"SELECT option_symbol AS symbol, expiration, strike FROM OPDATA {new_strikes_filter}",
+            index_path=strikes_index_file,
+            legacy_json_path=strikes_json_file,
+            prune_before=rolling_entries[-1][0] if strikes_prune_expired else None,
+            max_dt=con.sql("SELECT max(dt) FROM OPDATA").fetchone()[0],
+        )
+        run.set(strikesAdded=added, strikesPruned=pruned)
+
+    # the legacy json is a full rewrite of the index, only done when the index changed
+    if strikes_json_export and (added or pruned or not os.path.isfile(strikes_json_file)):
+        export_strikes_json(con, strikes_json_file, index_path=strikes_index_file)
+        print(f"Updated expirations and strikes data file: {strikes_json_file}")
+    return rolling_entries
@@ -0,0 +1,133 @@
+import os
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from mzdata.occ import occ_normalise_sql
+from mzdata.ohlc import ingest_ohlc
+from mzdata.instrumentation import current_run
+
+MAX_DATES_LIMIT = int(os.environ.get("MAX_DATES_LIMIT", "5"))
+BACKFILL = os.environ.get("BACKFILL", "0") == "1"    # ingest every pending date instead of the first MAX_DATES_LIMIT
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0") or "0") or min(4, os.cpu_count() or 1)
+CONFIG_FILE_NAME = "config.json"
+FIRST_DATE = "2024-01-01"
+
+
+def consolidate_w2(con, data_dir, temp_dir, max_dates=MAX_DATES_LIMIT, backfill=BACKFILL, workers=INGEST_WORKERS, run=None):
+    # Appends the dt= partitions of data_dir/w2 newer than the last processed date to temp_dir/w2-output
+    # (partitioned by symbol) and the new raw ohlc snapshots to temp_dir/ohlc. The checkpoint (config.json)
+    # is written to temp_dir after every committed date. Returns the updated config.
+    run = run or current_run()
+    config_file = os.path.join(data_dir, CONFIG_FILE_NAME)
+    if os.path.isfile(config_file):
+        with open(config_file) as f:
+            configData = json.load(f)
+        lastDateProcessed = configData["lastDate"]
+        print(f"""Last date processed: {lastDateProcessed}""")
+    else:
+        lastDateProcessed = FIRST_DATE    ## probably running for the first time.
+        configData = {
+            "lastDate" : lastDateProcessed
+        }
+
+    parquet_src_dir = os.path.join(data_dir, "w2")
+    if not os.path.isdir(parquet_src_dir):
+        raise FileNotFoundError(f"Directory does not exist: {parquet_src_dir}")
+
+    consolidated_data_dir = os.path.join(temp_dir, "w2-output")
+    consolidated_flat_data_dir = os.path.join(temp_dir, "w2-output-flat")
+    staging_root = os.path.join(temp_dir, "w2-staging")
+    ohlc_output_dir = os.path.join(temp_dir, "ohlc")
+    shutil.rmtree(consolidated_data_dir, ignore_errors=True)    # lets start fresh
+    shutil.rmtree(staging_root, ignore_errors=True)    # leftovers of a run that crashed
+    shutil.rmtree(consolidated_flat_data_dir, ignore_errors=True)    # lets start fresh
+    shutil.rmtree(ohlc_output_dir, ignore_errors=True)    # lets start fresh
+    for path in (consolidated_data_dir, consolidated_flat_data_dir, staging_root, ohlc_output_dir):
+        os.makedirs(path, exist_ok=True)
+
+    dt_dirs = []
+    for name in os.listdir(parquet_src_dir):
+        if name.startswith("dt="):
+            dt_str = name.split("=")[1]
+            if dt_str > lastDateProcessed:
+                print(f"""{dt_str} is greater than {lastDateProcessed}""")
+                dt_dirs.append(dt_str)
+    dt_dirs.sort()  # ensure sorting the directory
+    print(dt_dirs)
+
+    def save_config():
+        # written after every committed date, so the checkpoint always matches what w2-output holds
+        output_config_file = os.path.join(temp_dir, CONFIG_FILE_NAME)
+        with open(f"{output_config_file}.tmp", "w") as file:
+            json.dump(configData, file, indent=4)
+        os.replace(f"{output_config_file}.tmp", output_config_file)
+
+    def stage_date(dt):
+        # one date into its own staging directory, partitioned by symbol. Each worker has its own cursor,
+        # duckdb runs the copies side by side on the shared thread pool.
+        dt_dir = f"dt={dt}"
+        src = os.path.join(parquet_src_dir, dt_dir, "*.parquet")
+        staging_dir = os.path.join(staging_root, dt_dir)
+        print(f"scanning {src}", flush=True)
+        with con.cursor() as cursor:
+            cursor.execute(f"""
+        COPY (
+                SELECT dt, symbol, option, option_symbol, option_type, strike, expiration,
+                    open_interest, volume, delta, gamma, vega, theta, rho, theo, open, high, iv, bid, ask
+                FROM {occ_normalise_sql(f"read_parquet('{src}')")}
+            ) TO '{staging_dir}'
+            (FORMAT PARQUET, PARTITION_BY (symbol), FILENAME_PATTERN 'data_{{i}}');
+        """)
+            rows = cursor.fetchone()[0]
+        return staging_dir, rows
+
+    def publish_date(dt, staging_dir):
+        # moves the staged files into w2-output, named after the date so a date published twice replaces its files
+        files = 0
+        for partition in os.listdir(staging_dir):
+            os.makedirs(os.path.join(consolidated_data_dir, partition), exist_ok=True)
+            for name in os.listdir(os.path.join(staging_dir, partition)):
+                os.replace(os.path.join(staging_dir, partition, name), os.path.join(consolidated_data_dir, partition, f"{dt}_{name}"))
+                files += 1
+        shutil.rmtree(staging_dir)
+        configData["lastDate"] = dt
+        save_config()
+        print(f"Committed {dt}: {files} files", flush=True)
+
+    pending_dates = dt_dirs if backfill or max_dates <= 0 else dt_dirs[:max_dates]
+    print(f"Ingesting {len(pending_dates)} dates with {workers} workers", flush=True)
+
+    # dates are staged in parallel but committed strictly in date order, a failure keeps every date before it
+    with run.stage("options") as stage, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(dt, pool.submit(stage_date, dt)) for dt in pending_dates]
+        try:
+            for dt, future in futures:
+                staging_dir, rows = future.result()
+                publish_date(dt, staging_dir)
+                stage.add(rows_out=rows)
+        except BaseException:
+            for _, future in futures:
+                future.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            shutil.rmtree(staging_root, ignore_errors=True)
+
+    print("Processing done, dumping the config file.")
+    save_config()
+
+    print(f"Processing daily ohlc data")
+    ohlc_partitions = configData.setdefault("ohlcPartitions", {})    # raw dt partitions already consumed, by file signature
+    with run.stage("ohlc") as stage:
+        ohlc_rows = ingest_ohlc(con, os.path.join(data_dir, "ohlc-raw"), os.path.join(data_dir, "ohlc"), ohlc_output_dir, ohlc_partitions)
+        stage.add(rows_out=ohlc_rows)
+    save_config()
+
+    if ohlc_rows == 0:
+        shutil.rmtree(ohlc_output_dir, ignore_errors=True)
+        print(f"No new data found for ohlc data")
+    else:
+        print(f"Processing done for ohlc data, {ohlc_rows} rows")
+    run.set(datesCommitted=len([dt for dt in pending_dates if dt <= configData["lastDate"]]), datesPending=len(dt_dirs), ohlcRows=ohlc_rows)
+    return configData
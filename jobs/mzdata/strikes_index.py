@@ -0,0 +1,109 @@
+import os
+import json
+from collections import defaultdict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from mzdata.symbol_index import write_symbol_aligned
+
+STRIKES_INDEX_FILE = "data/options-expirations-strikes.parquet"
+STRIKES_ROW_GROUP_SIZE = 100_000
+STRIKES_COLUMNS = "symbol, expiration, strike"
+MAX_DT_KEY = b"max_dt"    # file metadata, the last rolling day merged into the index
+
+
+# Columnar index of every (symbol, expiration, strike) seen so far, one row per triple sorted by symbol,
+# expiration and strike. Row groups hold whole symbols so a lookup only reads the row groups of that symbol.
+# The file metadata records the last day merged, the next run merges the days after it.
+
+def _load_legacy_json(con, json_path):
+    # one time import of the old {symbol: {expiration: "[strikes]"}} json file
+    with open(json_path, "r") as file:
+        data = json.load(file)
+    symbols, expirations, strikes = [], [], []
+    for symbol, expiration_map in data.items():
+        for expiration, strikes_json in expiration_map.items():
+            for strike in json.loads(strikes_json):
+                symbols.append(symbol)
+                expirations.append(expiration)
+                strikes.append(strike)
+    table = pa.table({"symbol": symbols, "expiration": expirations, "strike": pa.array(strikes, pa.float32())})
+    con.register("LEGACY_STRIKES_ARROW", table)
+    con.execute("CREATE OR REPLACE TEMP TABLE LEGACY_STRIKES AS SELECT symbol, CAST(expiration AS DATE) AS expiration, strike FROM LEGACY_STRIKES_ARROW")
+    con.unregister("LEGACY_STRIKES_ARROW")
+    print(f"Imported {len(table)} strikes from {json_path}", flush=True)
+    return "LEGACY_STRIKES"
+
+
+def indexed_max_dt(index_path=STRIKES_INDEX_FILE):
+    # the last day merged into the index, None when there is no index or it was written before this was recorded
+    if not os.path.isfile(index_path):
+        return None
+    value = (pq.read_schema(index_path).metadata or {}).get(MAX_DT_KEY)
+    return value.decode() if value else None
+
+
+def merge_strikes(con, new_strikes_sql, index_path=STRIKES_INDEX_FILE, legacy_json_path=None, prune_before=None, max_dt=None):
+    # Adds the distinct triples of `new_strikes_sql` (a query returning symbol, expiration, strike) that are not
+    # indexed yet, and drops the expirations before `prune_before` when given. The file is only rewritten
+    # (to a temp file, then swapped in) when something changed, `max_dt` is recorded as the last day merged.
+    if os.path.isfile(index_path):
+        existing = f"read_parquet('{index_path}')"
+    elif legacy_json_path and os.path.isfile(legacy_json_path):
+        existing = _load_legacy_json(con, legacy_json_path)
+    else:
+        existing = None
+
+    except_existing = f"EXCEPT SELECT {STRIKES_COLUMNS} FROM {existing}" if existing else ""
+    con.execute(f"CREATE OR REPLACE TEMP TABLE NEW_STRIKES AS SELECT DISTINCT {STRIKES_COLUMNS} FROM ({new_strikes_sql}) {except_existing}")
+    added = con.execute("SELECT count(*) FROM NEW_STRIKES").fetchone()[0]
+    prune_filter = f"WHERE expiration >= DATE '{prune_before}'" if prune_before else ""
+    pruned = con.execute(f"SELECT count(*) FROM {existing} WHERE expiration < DATE '{prune_before}'").fetchone()[0] if existing and prune_before else 0
+
+    if added == 0 and pruned == 0 and os.path.isfile(index_path):
+        print(f"Strikes index {index_path} is up to date", flush=True)
+        return 0, 0
+
+    sources = f"SELECT {STRIKES_COLUMNS} FROM {existing} UNION ALL SELECT {STRIKES_COLUMNS} FROM NEW_STRIKES" if existing else f"SELECT {STRIKES_COLUMNS} FROM NEW_STRIKES"
+    tmp_path = f"{index_path}.tmp"
+    metadata = {MAX_DT_KEY: str(max_dt).encode()} if max_dt else None
+    index = write_symbol_aligned(con, f"SELECT * FROM ({sources}) {prune_filter} ORDER BY {STRIKES_COLUMNS}", tmp_path, key="symbol", row_group_size=STRIKES_ROW_GROUP_SIZE, metadata=metadata)
+    os.replace(tmp_path, index_path)
+    print(f"Strikes index {index_path}: {added} strikes added, {pruned} pruned, {sum(k[2] for k in index['rowGroups'])} in total", flush=True)
+    return added, pruned
+
+
+def lookup_strikes(symbol, index_path=STRIKES_INDEX_FILE):
+    # {expiration (yyyy-mm-dd): [strikes]} of one symbol, reading only the row groups whose stats can hold it
+    file = pq.ParquetFile(index_path)
+    symbol_column = file.schema_arrow.get_field_index("symbol")
+    row_groups = []
+    for i in range(file.metadata.num_row_groups):
+        stats = file.metadata.row_group(i).column(symbol_column).statistics
+        if stats is None or not stats.has_min_max or stats.min <= symbol <= stats.max:
+            row_groups.append(i)
+    result = defaultdict(list)
+    if not row_groups:
+        return result
+    table = file.read_row_groups(row_groups, columns=["symbol", "expiration", "strike"])
+    table = table.filter(pc.equal(table.column("symbol"), symbol))
+    for expiration, strike in zip(table.column("expiration").to_pylist(), table.column("strike").to_pylist()):
+        result[expiration.isoformat()].append(strike)
+    return result
+
+
+def export_strikes_json(con, json_path, index_path=STRIKES_INDEX_FILE):
+    # writes the index in the old json layout for the consumers that still import it
+    rows = con.execute(f"""
+        SELECT symbol, expiration::VARCHAR, list(strike ORDER BY strike)
+        FROM read_parquet('{index_path}')
+        GROUP BY symbol, expiration
+        ORDER BY symbol, expiration
+    """).fetchall()
+    data = defaultdict(dict)
+    for symbol, expiration, strikes in rows:
+        data[symbol][expiration] = json.dumps(strikes)
+    with open(json_path, "w") as file:
+        json.dump(data, file, indent=2)
@@ -0,0 +1,120 @@
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from mzdata.schema import PARQUET_COMPRESSION
+
+SYMBOL_ROW_GROUP_SIZE = 100_000    # target rows per row group, a row group only ever holds whole symbols
+READ_BATCH_SIZE = 100_000
+
+
+def _reader(con, query):
+    result = con.execute(query)
+    # to_arrow_reader replaced fetch_record_batch in newer duckdb releases
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(READ_BATCH_SIZE)
+    return result.fetch_record_batch(READ_BATCH_SIZE)
+
+
+def _runs(batch, key):
+    # (symbol, offset, length) of every run of equal keys in a batch sorted by key
+    values = batch.column(key)
+    if len(values) == 0:
+        return []
+    changes = pc.indices_nonzero(pc.not_equal(values.slice(1), values.slice(0, len(values) - 1))).to_pylist()
+    starts = [0] + [i + 1 for i in changes]
+    ends = starts[1:] + [len(values)]
+    return [(values[start].as_py(), start, end - start) for start, end in zip(starts, ends)]
+
+
+class SymbolAlignedWriter:
+    # Writes rows sorted by `key` so that row groups start and end on symbol boundaries: small symbols are
+    # packed together up to `row_group_size` rows, a symbol bigger than that gets row groups of its own.
+    # Every row group keeps its min/max statistics, `index()` maps each symbol to its row groups and bytes.
+    def __init__(self, path, schema, key="option_symbol", row_group_size=SYMBOL_ROW_GROUP_SIZE):
+        self.path = path
+        self.key = key
+        self.row_group_size = row_group_size
+        self.row_group_symbols = []    # symbols held by each row group written so far
+        self._writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION, write_statistics=True)
+        self._packed, self._packed_rows, self._packed_symbols = [], 0, []
+        self._current, self._current_rows, self._current_symbol, self._current_split = [], 0, None, False
+
+    def _write_row_group(self, slices, symbols):
+        table = pa.Table.from_batches(slices).combine_chunks()
+        self._writer.write_table(table, row_group_size=len(table))
+        self.row_group_symbols.append(symbols)
+
+    def _flush_packed(self):
+        if self._packed_rows:
+            self._write_row_group(self._packed, self._packed_symbols)
+            self._packed, self._packed_rows, self._packed_symbols = [], 0, []
+
+    def _finish_symbol(self):
+        if self._current_split:
+            # the tail of a big symbol stays on its own, the next row group starts with the next symbol
+            if self._current_rows:
+                self._write_row_group(self._current, [self._current_symbol])
+        elif self._current_rows:
+            if self._packed_rows + self._current_rows > self.row_group_size:
+                self._flush_packed()
+            self._packed.extend(self._current)
+            self._packed_rows += self._current_rows
+            self._packed_symbols.append(self._current_symbol)
+            if self._packed_rows >= self.row_group_size:
+                self._flush_packed()
+        self._current, self._current_rows, self._current_split = [], 0, False
+
+    def _split_current(self):
+        # a symbol alone fills a row group: whatever was packed before it goes out first
+        self._flush_packed()
+        table = pa.Table.from_batches(self._current).combine_chunks()
+        while len(table) >= self.row_group_size:
+            self._write_row_group(table.slice(0, self.row_group_size).to_batches(), [self._current_symbol])
+            table = table.slice(self.row_group_size)
+        self._current, self._current_rows, self._current_split = table.to_batches(), len(table), True
+
+    def write_batch(self, batch):
+        for symbol, offset, length in _runs(batch, self.key):
+            if symbol != self._current_symbol:
+                self._finish_symbol()
+                self._current_symbol = symbol
+            self._current.append(batch.slice(offset, length))
+            self._current_rows += length
+            if self._current_rows >= self.row_group_size:
+                self._split_current()
+
+    def close(self):
+        self._finish_symbol()
+        self._flush_packed()
+        self._writer.close()
+
+    def index(self):
+        # {"size", "rowGroups": [[byte offset, byte length, rows], ...], "symbols": {symbol: [first, last row group]}}
+        metadata = pq.ParquetFile(self.path).metadata
+        row_groups = []
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            columns = [row_group.column(c) for c in range(row_group.num_columns)]
+            start = min(column.dictionary_page_offset if column.has_dictionary_page else column.data_page_offset for column in columns)
+            length = sum(column.total_compressed_size for column in columns)
+            row_groups.append([start, length, row_group.num_rows])
+        symbols = {}
+        for i, row_group_symbols in enumerate(self.row_group_symbols):
+            for symbol in row_group_symbols:
+                symbols.setdefault(symbol, [i, i])[1] = i
+        return {"size": os.path.getsize(self.path), "rowGroups": row_groups, "symbols": symbols}
+
+
+def write_symbol_aligned(con, query, path, key="option_symbol", row_group_size=SYMBOL_ROW_GROUP_SIZE, metadata=None):
+    # Streams the (key sorted) result of `query` into `path` and returns its symbol index, `metadata` goes to the
+    # key/value metadata of the file
+    reader = _reader(con, query)
+    schema = reader.schema.with_metadata({**(reader.schema.metadata or {}), **metadata}) if metadata else reader.schema
+    writer = SymbolAlignedWriter(path, schema, key, row_group_size)
+    for batch in reader:
+        writer.write_batch(batch)
+    writer.close()
+    return writer.index()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the jobs import mzdata from jobs/ (PYTHONPATH=jobs), the benchmark helpers are in jobs/benchmarks
+JOBS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (JOBS_DIR, os.path.join(JOBS_DIR, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,90 @@
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from mzdata.asset_cache import AssetCache
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    # serves tmp_path/release over http, the handler sends Content-Length and Last-Modified like a plain file server
+    release_dir = tmp_path / "release"
+    release_dir.mkdir()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(release_dir)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield release_dir, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_an_unchanged_asset_is_served_from_the_cache(tmp_path, server):
+    release_dir, base_url = server
+    (release_dir / "options_data.parquet").write_bytes(b"day one")
+    cache = AssetCache.load(str(tmp_path / "cache"))
+    url = f"{base_url}/options_data.parquet"
+
+    path = cache.prefetch([url])[url]
+    assert path.endswith(".parquet") and open(path, "rb").read() == b"day one"
+
+    again = AssetCache.load(str(tmp_path / "cache"))
+    assert again.prefetch([url])[url] == path
+    assert (again.fetched, again.cached) == (0, 1)
+
+
+def test_a_reuploaded_asset_under_the_same_url_is_fetched_again(tmp_path, server):
+    release_dir, base_url = server
+    asset = release_dir / "options_data.parquet"
+    asset.write_bytes(b"first upload")
+    cache = AssetCache.load(str(tmp_path / "cache"))
+    url = f"{base_url}/options_data.parquet"
+    first = cache.prefetch([url])[url]
+
+    asset.write_bytes(b"second, longer upload")
+    second = cache.prefetch([url])[url]
+    assert second != first
+    assert open(second, "rb").read() == b"second, longer upload"
+    assert cache.fetched == 2
+
+
+def test_local_paths_are_returned_as_is(tmp_path):
+    cache = AssetCache.load(str(tmp_path / "cache"))
+    assert cache.prefetch(["temp/options_data.parquet"]) == {"temp/options_data.parquet": "temp/options_data.parquet"}
+
+
+def test_load_drops_unfinished_downloads_and_missing_files(tmp_path, server):
+    release_dir, base_url = server
+    (release_dir / "a.parquet").write_bytes(b"a")
+    cache_dir = tmp_path / "cache"
+    cache = AssetCache.load(str(cache_dir))
+    path = cache.prefetch([f"{base_url}/a.parquet"])[f"{base_url}/a.parquet"]
+
+    (cache_dir / "deadbeef.parquet.tmp").write_bytes(b"half")
+    os.remove(path)
+    reloaded = AssetCache.load(str(cache_dir))
+    assert reloaded.entries == {}
+    assert sorted(os.listdir(cache_dir)) == ["index.json"]
+
+
+def test_least_recently_used_assets_are_evicted_over_the_cap(tmp_path, server):
+    release_dir, base_url = server
+    urls = []
+    for name in ("a", "b", "c"):
+        (release_dir / f"{name}.parquet").write_bytes(b"x" * 100)
+        urls.append(f"{base_url}/{name}.parquet")
+    cache = AssetCache.load(str(tmp_path / "cache"), max_bytes=250)
+
+    paths = {}
+    for url in urls:
+        paths.update(cache.prefetch([url]))
+    # a is the oldest and not in use by the last prefetch
+    assert not os.path.exists(paths[urls[0]])
+    assert os.path.exists(paths[urls[1]]) and os.path.exists(paths[urls[2]])
+    assert cache.evicted == 1
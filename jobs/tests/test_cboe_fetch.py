@@ -0,0 +1,54 @@
+import pytest
+
+from mzdata import cboe_fetch
+from mzdata.cboe_fetch import fetch_symbols
+from stub_server import StubServer
+from synthetic import bench_symbols, load_exception_symbols
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    stub = StubServer(str(tmp_path / "releases"), bench_symbols(4), expirations=2, strikes=3).start()
+    monkeypatch.setattr(cboe_fetch, "CDN_BASE_URL", f"{stub.base_url}/cdn")
+    monkeypatch.setattr(cboe_fetch, "QUOTE_BASE_URL", f"{stub.base_url}/quote")
+    yield stub
+    stub.stop()
+
+
+def fetch(symbols):
+    received = {}
+    stats = fetch_symbols(symbols, load_exception_symbols(), lambda symbol, payload: received.setdefault(symbol, payload), concurrency=2)
+    return stats, received
+
+
+def test_every_symbol_is_fetched_from_its_cdn_url(stub):
+    symbols = [symbol for symbol, _, _, _ in bench_symbols(4)]
+    stats, received = fetch(symbols)
+    assert (stats.success, stats.failed) == (4, 0)
+    assert sorted(received) == sorted(symbols)
+    # the index symbols are served under _SPX and keep that name in the payload
+    assert {received[symbol].symbol for symbol in symbols} == {payload_symbol for _, payload_symbol, _, _ in bench_symbols(4)}
+    assert stub.requests == 4
+
+
+def test_a_429_with_retry_after_pauses_the_fetch_and_is_retried(stub):
+    symbols = [symbol for symbol, _, _, _ in bench_symbols(4)]
+    stub.throttle(bench_symbols(4)[-1][1], retry_after=1)
+
+    stats, received = fetch(symbols)
+    assert (stats.success, stats.failed) == (4, 0)
+    assert sorted(received) == sorted(symbols)
+    assert stub.requests == 5
+    limiter = stats.rate_limiter
+    assert (limiter.throttles, limiter.rate_decreases) == (1, 1)
+    assert limiter.paused_seconds == pytest.approx(1, abs=0.2)
+
+
+def test_a_symbol_throttled_on_every_retry_fails_alone(stub, monkeypatch):
+    monkeypatch.setattr(cboe_fetch, "retries", 2)
+    symbols = [symbol for symbol, _, _, _ in bench_symbols(4)]
+    stub.throttle(bench_symbols(4)[-1][1], times=2, retry_after=1)
+
+    stats, received = fetch(symbols)
+    assert (stats.success, stats.failed) == (3, 1)
+    assert bench_symbols(4)[-1][0] not in received
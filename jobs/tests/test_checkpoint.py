@@ -0,0 +1,99 @@
+import json
+
+import duckdb
+import pyarrow.parquet as pq
+
+from mzdata.chains import parse_payload
+from mzdata.checkpoint import BatchManifest, CheckpointedChainWriter, read_manifests, PARTS_DIR_NAME
+from mzdata.oi_anomaly import OIAnomalyEngine
+
+TRADING_DATE = "2026-01-05"
+
+
+def payload(symbol, strikes=3):
+    # a cdn payload with the fields the writers keep, the missing ones end up null
+    options = [
+        {"option": f"{symbol}260116{option_type}{strike * 1000:08d}", "open_interest": 100 + strike, "volume": 10,
+         "delta": 0.5, "gamma": 0.01, "iv": 0.2, "bid": 1.0, "ask": 1.1}
+        for strike in range(100, 100 + strikes) for option_type in ("C", "P")
+    ]
+    data = {"symbol": symbol, "current_price": 100.0, "close": 100.0, "open": 99.0, "high": 101.0, "low": 98.0, "options": options}
+    return parse_payload(json.dumps({"timestamp": "2026-01-05 20:00:00", "symbol": symbol, "data": data}).encode())
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = BatchManifest(str(tmp_path), TRADING_DATE)
+    manifest.add_part("parts/options-00000.parquet", "parts/stocks-00000.parquet", ["SPY", "QQQ"], 24)
+
+    with open(manifest.path) as file:
+        assert json.load(file) == {"tradingDate": TRADING_DATE, "parts": manifest.parts}
+    (tmp_path / PARTS_DIR_NAME).mkdir()
+    (tmp_path / "parts/options-00000.parquet").touch()
+    (tmp_path / "parts/stocks-00000.parquet").touch()
+
+    resumed = BatchManifest.load(str(tmp_path), TRADING_DATE)
+    assert resumed.parts == manifest.parts
+    assert resumed.completed_symbols == {"SPY", "QQQ"}
+
+
+def test_manifest_of_another_trading_date_is_ignored(tmp_path):
+    BatchManifest(str(tmp_path), TRADING_DATE).add_part("parts/options-00000.parquet", "parts/stocks-00000.parquet", ["SPY"], 12)
+    (tmp_path / PARTS_DIR_NAME).mkdir()
+    (tmp_path / "parts/options-00000.parquet").touch()
+    (tmp_path / "parts/stocks-00000.parquet").touch()
+
+    manifest = BatchManifest.load(str(tmp_path), "2026-01-06")
+    assert manifest.parts == []
+    assert manifest.completed_symbols == set()
+    assert list((tmp_path / PARTS_DIR_NAME).iterdir()) == []    # the parts of the old date are orphans now
+
+
+def test_orphan_parts_are_removed_on_load(tmp_path):
+    BatchManifest(str(tmp_path), TRADING_DATE).add_part("parts/options-00000.parquet", "parts/stocks-00000.parquet", ["SPY"], 12)
+    parts_dir = tmp_path / PARTS_DIR_NAME
+    parts_dir.mkdir()
+    for name in ("options-00000.parquet", "stocks-00000.parquet", "options-00001.parquet", "stocks-00001.parquet"):
+        (parts_dir / name).touch()
+
+    BatchManifest.load(str(tmp_path), TRADING_DATE)
+    assert sorted(k.name for k in parts_dir.iterdir()) == ["options-00000.parquet", "stocks-00000.parquet"]
+
+
+def test_resume_after_a_crash_keeps_the_checkpointed_parts(tmp_path):
+    symbols = ["SPY", "QQQ", "IWM", "DIA", "XLF"]
+    batch_dir = tmp_path / "options-data" / "batch-0"
+    manifest = BatchManifest.load(str(batch_dir), TRADING_DATE)
+    writer = CheckpointedChainWriter(manifest, checkpoint_symbols=2)
+    for symbol in symbols[:3]:
+        writer.on_data(symbol, payload(symbol))
+    # the job dies here: SPY and QQQ are checkpointed, IWM sits in an open part that is never closed
+    assert (batch_dir / "parts/options-00001.parquet").exists()
+
+    resumed = BatchManifest.load(str(batch_dir), TRADING_DATE)
+    assert resumed.completed_symbols == {"SPY", "QQQ"}
+    assert not (batch_dir / "parts/options-00001.parquet").exists()
+
+    pending = [symbol for symbol in symbols if symbol not in resumed.completed_symbols]
+    with CheckpointedChainWriter(resumed, checkpoint_symbols=2) as writer:
+        for symbol in pending:
+            writer.on_data(symbol, payload(symbol))
+
+    [(manifest_dir, data)] = read_manifests(str(tmp_path))
+    assert manifest_dir == batch_dir
+    assert [part["options"] for part in data["parts"]] == [f"parts/options-{i:05d}.parquet" for i in range(3)]
+    assert sorted(symbol for part in data["parts"] for symbol in part["symbols"]) == sorted(symbols)
+    for part in data["parts"]:
+        table = pq.read_table(batch_dir / part["options"])
+        assert len(table) == part["rows"]
+        assert sorted(set(table.column("symbol").to_pylist())) == sorted(part["symbols"])
+
+
+def test_read_manifests_finds_the_batch_directories_only(tmp_path):
+    # this run's batch, a downloaded batch artifact and an oi anomaly state restored under the same temp dir
+    for batch_dir in (tmp_path / "options-data" / "batch-0", tmp_path / "cboe-data-batch-1" / "temp" / "options-data" / "batch-1"):
+        batch_dir.mkdir(parents=True)
+        BatchManifest(str(batch_dir), TRADING_DATE).add_part("parts/options-00000.parquet", "parts/stocks-00000.parquet", ["SPY"], 12)
+    OIAnomalyEngine(duckdb.connect(), state_dir=str(tmp_path / "oi-anomaly-state")).save()
+
+    assert [path.relative_to(tmp_path).as_posix() for path, _ in read_manifests(str(tmp_path))] == [
+        "cboe-data-batch-1/temp/options-data/batch-1", "options-data/batch-0"]
@@ -0,0 +1,104 @@
+import os
+import time
+
+import duckdb
+import pytest
+
+from mzdata import compaction
+from mzdata.compaction import compact_store, compact_partition, recover, LOCK_FILE_NAME, TMP_SUFFIX, OLD_SUFFIX
+
+
+def append(con, partition_dir, name, rows, mtime=None):
+    # rows of (dt, option, open_interest), written the way an appended run leaves them
+    os.makedirs(partition_dir, exist_ok=True)
+    path = os.path.join(partition_dir, name)
+    values = ", ".join(f"(DATE '{dt}', '{option}', DATE '2026-06-19', 100.0, 'C', {oi})" for dt, option, oi in rows)
+    con.execute(f"COPY (SELECT * FROM (VALUES {values}) t(dt, option, expiration, strike, option_type, open_interest)) TO '{path}' (FORMAT PARQUET)")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def rows(con, partition_dir):
+    return con.execute(f"SELECT strftime(dt, '%Y-%m-%d'), option, open_interest FROM read_parquet('{partition_dir}/*.parquet') ORDER BY ALL").fetchall()
+
+
+def test_a_reappended_day_keeps_the_rows_of_the_newest_file(tmp_path):
+    con = duckdb.connect()
+    partition = tmp_path / "symbol=SPY"
+    now = time.time()
+    append(con, partition, "run-1.parquet", [("2026-01-05", "SPY_A", 1), ("2026-01-06", "SPY_A", 2)], now - 60)
+    # the 2026-01-06 run again, with corrected open interest
+    append(con, partition, "run-2.parquet", [("2026-01-06", "SPY_A", 20), ("2026-01-06", "SPY_B", 30)], now)
+
+    totals = compact_store(con, str(tmp_path), target_mb=128)
+    assert (totals["compacted"], totals["filesBefore"], totals["filesAfter"]) == (1, 2, 1)
+    assert rows(con, partition) == [("2026-01-05", "SPY_A", 1), ("2026-01-06", "SPY_A", 20), ("2026-01-06", "SPY_B", 30)]
+
+
+def test_a_compacted_partition_is_left_alone(tmp_path):
+    con = duckdb.connect()
+    append(con, tmp_path / "symbol=SPY", "run-1.parquet", [("2026-01-05", "SPY_A", 1)])
+    compact_store(con, str(tmp_path), target_mb=128)
+    assert compact_store(con, str(tmp_path), target_mb=128)["compacted"] == 0
+
+
+def test_recover_repairs_the_swaps_a_crash_left(tmp_path):
+    con = duckdb.connect()
+    # crashed between the renames: only the old partition is there
+    append(con, tmp_path / f"symbol=SPY{OLD_SUFFIX}", "run-1.parquet", [("2026-01-05", "SPY_A", 1)])
+    # crashed after the swap: the old partition was not deleted yet
+    append(con, tmp_path / "symbol=QQQ", "data_0.parquet", [("2026-01-05", "QQQ_A", 2)])
+    append(con, tmp_path / f"symbol=QQQ{OLD_SUFFIX}", "run-1.parquet", [("2026-01-05", "QQQ_A", 3)])
+    # crashed while writing
+    append(con, tmp_path / f"symbol=IWM{TMP_SUFFIX}", "data_0.parquet", [("2026-01-05", "IWM_A", 4)])
+
+    recover(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["symbol=QQQ", "symbol=SPY"]
+    assert rows(con, tmp_path / "symbol=SPY") == [("2026-01-05", "SPY_A", 1)]
+    assert rows(con, tmp_path / "symbol=QQQ") == [("2026-01-05", "QQQ_A", 2)]
+
+
+def test_a_failed_swap_puts_the_live_partition_back(tmp_path, monkeypatch):
+    con = duckdb.connect()
+    partition = tmp_path / "symbol=SPY"
+    append(con, partition, "run-1.parquet", [("2026-01-05", "SPY_A", 1)])
+    append(con, partition, "run-2.parquet", [("2026-01-06", "SPY_A", 2)])
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(src).endswith(TMP_SUFFIX):
+            raise OSError("disk full")
+        replace(src, dst)
+
+    monkeypatch.setattr(compaction.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        compact_partition(con, str(partition), 128 * 1024 * 1024)
+    assert sorted(os.listdir(partition)) == ["run-1.parquet", "run-2.parquet"]
+    assert not (tmp_path / f"symbol=SPY{OLD_SUFFIX}").exists()
+
+
+def test_a_held_lock_skips_the_run(tmp_path):
+    con = duckdb.connect()
+    partition = tmp_path / "symbol=SPY"
+    append(con, partition, "run-1.parquet", [("2026-01-05", "SPY_A", 1)])
+    append(con, partition, "run-2.parquet", [("2026-01-06", "SPY_A", 2)])
+    (tmp_path / LOCK_FILE_NAME).write_text("1234")
+
+    assert compact_store(con, str(tmp_path), target_mb=128) is None
+    assert sorted(os.listdir(partition)) == ["run-1.parquet", "run-2.parquet"]
+    assert (tmp_path / LOCK_FILE_NAME).exists()    # it is the other run's lock
+
+
+def test_a_stale_lock_is_taken_over(tmp_path):
+    con = duckdb.connect()
+    partition = tmp_path / "symbol=SPY"
+    append(con, partition, "run-1.parquet", [("2026-01-05", "SPY_A", 1)])
+    append(con, partition, "run-2.parquet", [("2026-01-06", "SPY_A", 2)])
+    lock_path = tmp_path / LOCK_FILE_NAME
+    lock_path.write_text("1234")
+    stale = time.time() - (compaction.COMPACT_LOCK_TTL_HOURS + 1) * 3600
+    os.utime(lock_path, (stale, stale))
+
+    assert compact_store(con, str(tmp_path), target_mb=128)["compacted"] == 1
+    assert not lock_path.exists()
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from mzdata.cboe_fetch import _fetch_payload
+from mzdata.chains import parse_payload
+from mzdata.fetch_cache import FetchCache, PEEK_BYTES, peek_timestamp
+from mzdata.rate_limit import AdaptiveRateLimiter
+from stub_server import StubServer
+from synthetic import bench_symbols, synthetic_payload
+
+
+@pytest.fixture
+def stub(tmp_path):
+    stub = StubServer(str(tmp_path / "releases"), bench_symbols(2), expirations=2, strikes=3).start()
+    yield stub
+    stub.stop()
+
+
+def fetch(stub, cache, symbol="SPX"):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await _fetch_payload(session, AdaptiveRateLimiter(rate=1000), cache, f"{stub.base_url}/cdn/{symbol}.json", symbol)
+    return asyncio.run(run())
+
+
+def test_peek_timestamp_reads_the_head_of_the_payload():
+    raw = synthetic_payload("SPY", 1, 1, 100.0, timestamp="2026-01-05 20:00:00")
+    assert peek_timestamp(raw) == "2026-01-05 20:00:00"
+    # past the peeked bytes the payload is parsed like a changed one
+    late = json.dumps({"data": {"padding": "x" * PEEK_BYTES}, "timestamp": "2026-01-05 20:00:00"}).encode()
+    assert peek_timestamp(late) is None
+
+
+def test_symbols_that_differ_only_in_punctuation_get_their_own_files(tmp_path):
+    cache = FetchCache(str(tmp_path))
+    for symbol, price in (("^SPX", 100.0), ("_SPX", 200.0)):
+        cache.put(symbol, parse_payload(synthetic_payload(symbol, 1, 2, price)))
+    assert cache.entries["^SPX"]["file"] != cache.entries["_SPX"]["file"]
+    cache.save()
+
+    reloaded = FetchCache.load(str(tmp_path))
+    assert [reloaded.get(symbol).stock.column("current_price")[0].as_py() for symbol in ("^SPX", "_SPX")] == [100.0, 200.0]
+
+
+def test_an_unchanged_etag_is_served_from_the_cache(tmp_path, stub):
+    cache = FetchCache(str(tmp_path))
+    first = fetch(stub, cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.conditional_headers("SPX")["If-None-Match"]
+
+    again = fetch(stub, cache)
+    assert (cache.hits, cache.not_modified, cache.misses) == (1, 1, 1)
+    assert again.options.equals(first.options)
+
+
+def test_an_unchanged_timestamp_is_served_from_the_cache(tmp_path, stub):
+    cache = FetchCache(str(tmp_path))
+    fetch(stub, cache)
+    cache.entries["SPX"]["etag"] = None    # a cdn response without ETag: the full body comes back every time
+
+    fetch(stub, cache)
+    assert (cache.hits, cache.not_modified, cache.misses) == (1, 0, 1)
+
+
+def test_a_new_timestamp_is_parsed_again(tmp_path, stub):
+    cache = FetchCache(str(tmp_path))
+    fetch(stub, cache)
+    cache.entries["SPX"].update(etag=None, timestamp="2026-01-02 20:00:00")
+
+    payload = fetch(stub, cache)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert cache.entries["SPX"]["timestamp"] == payload.timestamp != "2026-01-02 20:00:00"
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+JOBS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_job(tmp_path, body):
+    # runs a job script that starts a run report, returns (process exit status, report)
+    script = tmp_path / "job.py"
+    script.write_text(f"import sys\nfrom mzdata.instrumentation import start_run\nrun = start_run('test', {str(tmp_path)!r})\n{body}\n")
+    process = subprocess.run([sys.executable, str(script)], env={**os.environ, "PYTHONPATH": JOBS_DIR}, capture_output=True, text=True)
+    with open(tmp_path / "run-report-test.json") as file:
+        return process.returncode, json.load(file)
+
+
+@pytest.mark.parametrize("body, exit_code, status", [
+    ("pass", 0, "succeeded"),
+    ("exit(0)", 0, "succeeded"),
+    ("sys.exit()", 0, "succeeded"),
+    ("exit(1)", 1, "failed"),
+    ("sys.exit(3)", 3, "failed"),
+    ("sys.exit('no symbols to fetch')", 1, "failed"),
+    ("raise ValueError('boom')", 1, "failed"),
+])
+def test_the_report_records_how_the_job_ended(tmp_path, body, exit_code, status):
+    returncode, report = run_job(tmp_path, body)
+    assert returncode == exit_code
+    assert (report["status"], report["exitCode"]) == (status, exit_code)
@@ -0,0 +1,50 @@
+import json
+from datetime import date
+
+import duckdb
+import pytest
+
+from mzdata.occ import create_exception_symbols_table, load_exception_symbols, occ_normalise_sql
+
+ROWS = [
+    # (payload symbol, option)
+    ("AAPL", "AAPL250117C00150000"),
+    ("SPY", "SPY   250117P00002500"),    # the padded root of the 21 character osi form
+    ("_SPX", "SPXW251219P05800000"),
+    ("_SPX", "SPX251219C05800000"),
+    ("BRK.B", "BRKB250620C00480000"),
+]
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE OPTIONS (symbol VARCHAR, option VARCHAR)")
+    con.executemany("INSERT INTO OPTIONS VALUES (?, ?)", ROWS)
+    return con
+
+
+def normalise(con, exception_table=None):
+    return con.execute(f"SELECT symbol, option_symbol, expiration, option_type, strike FROM {occ_normalise_sql('OPTIONS', exception_table)} ORDER BY option").fetchall()
+
+
+def test_the_suffix_is_sliced_positionally(con):
+    assert normalise(con) == [
+        ("AAPL", "AAPL", date(2025, 1, 17), "C", 150.0),
+        ("BRK.B", "BRKB", date(2025, 6, 20), "C", 480.0),
+        ("SPX", "SPX", date(2025, 12, 19), "C", 5800.0),
+        ("SPX", "SPXW", date(2025, 12, 19), "P", 5800.0),
+        ("SPY", "SPY", date(2025, 1, 17), "P", 2.5),
+    ]
+
+
+def test_exception_symbols_keep_the_symbol_as_option_symbol(con, tmp_path):
+    exception_file = tmp_path / "cboe-exception-symbols.json"
+    exception_file.write_text(json.dumps(["VIX", "SPX"]))
+    exception_symbols = load_exception_symbols(str(exception_file))
+    assert "BRK.B" in exception_symbols
+
+    table = create_exception_symbols_table(con, exception_symbols)
+    # SPXW and SPX both roll up to SPX, BRKB to BRK.B, the other roots are left as they are
+    assert [(symbol, option_symbol) for symbol, option_symbol, _, _, _ in normalise(con, table)] == [
+        ("AAPL", "AAPL"), ("BRK.B", "BRK.B"), ("SPX", "SPX"), ("SPX", "SPX"), ("SPY", "SPY")]
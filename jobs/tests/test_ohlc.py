@@ -0,0 +1,47 @@
+import os
+
+import duckdb
+
+from mzdata.ohlc import ingest_ohlc, pending_partitions, partition_signature
+
+
+def write_raw(con, raw_dir, dt, name, rows, mtime_ns=None):
+    # rows of (symbol, close), one raw ohlc snapshot file of the dt=<dt> partition
+    partition = os.path.join(raw_dir, f"dt={dt}")
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, name)
+    values = ", ".join(f"('{symbol}', {close})" for symbol, close in rows)
+    con.execute(f"COPY (SELECT * FROM (VALUES {values}) t(symbol, close)) TO '{path}' (FORMAT PARQUET)")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def test_a_partition_rewritten_at_the_same_size_is_pending_again(tmp_path):
+    con = duckdb.connect()
+    raw_dir = str(tmp_path / "ohlc-raw")
+    path = write_raw(con, raw_dir, "2026-01-05", "part-0.parquet", [("SPY", 101.5)], mtime_ns=1_700_000_000_000_000_000)
+    consumed = {"2026-01-05": partition_signature(os.path.dirname(path))}
+    assert pending_partitions(raw_dir, consumed) == {}
+
+    size = os.path.getsize(path)
+    write_raw(con, raw_dir, "2026-01-05", "part-0.parquet", [("SPY", 102.5)], mtime_ns=1_700_000_100_000_000_000)
+    assert os.path.getsize(path) == size
+    assert list(pending_partitions(raw_dir, consumed)) == ["2026-01-05"]
+
+
+def test_ingest_keeps_the_last_row_of_a_key_and_skips_consumed_partitions(tmp_path):
+    con = duckdb.connect()
+    raw_dir, ohlc_dir, output_dir = (str(tmp_path / name) for name in ("ohlc-raw", "ohlc", "out"))
+    os.makedirs(output_dir)
+    write_raw(con, raw_dir, "2026-01-05", "part-0.parquet", [("SPY", 100.0), ("QQQ", 200.0)])
+    write_raw(con, raw_dir, "2026-01-05", "part-1.parquet", [("SPY", 101.0), ("SPY", 102.0)])
+    write_raw(con, raw_dir, "2026-01-06", "part-0.parquet", [("SPY", 103.0)])
+
+    consumed = {}
+    assert ingest_ohlc(con, raw_dir, ohlc_dir, output_dir, consumed) == 3
+    assert sorted(consumed) == ["2026-01-05", "2026-01-06"]
+    assert con.execute(f"SELECT strftime(dt, '%Y-%m-%d'), symbol, close FROM read_parquet('{output_dir}/*.parquet') ORDER BY ALL").fetchall() == [
+        ("2026-01-05", "QQQ", 200.0), ("2026-01-05", "SPY", 102.0), ("2026-01-06", "SPY", 103.0)]
+
+    assert ingest_ohlc(con, raw_dir, ohlc_dir, output_dir, consumed) == 0
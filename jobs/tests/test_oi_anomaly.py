@@ -0,0 +1,202 @@
+import math
+import random
+from datetime import date, timedelta
+
+import duckdb
+import pyarrow as pa
+import pytest
+
+from mzdata.oi_anomaly import OIAnomalyEngine, OUTPUT_COLUMNS, OUTPUT_SORT_ORDER
+
+DATES = [str(date(2026, 1, 5) + timedelta(days=i)) for i in range(6)]
+EXPIRATION = date(2026, 6, 19)
+
+
+def day_sql(dt):
+    return f"SELECT * FROM DAYS WHERE dt = DATE '{dt}'"
+
+
+def load_days(con, rows):
+    # rows of (dt, option_symbol, strike, open_interest), one call contract per (symbol, strike)
+    con.register("days_arrow", pa.table({
+        "dt": pa.array([date.fromisoformat(dt) for dt, _, _, _ in rows], pa.date32()),
+        "option": [f"{symbol}260619C{int(strike * 1000):08d}" for _, symbol, strike, _ in rows],
+        "option_symbol": [symbol for _, symbol, _, _ in rows],
+        "expiration": pa.array([EXPIRATION] * len(rows), pa.date32()),
+        "dte": [(EXPIRATION - date.fromisoformat(dt)).days for dt, _, _, _ in rows],
+        "delta": pa.array([0.5] * len(rows), pa.float32()),
+        "gamma": pa.array([0.01] * len(rows), pa.float32()),
+        "option_type": ["C"] * len(rows),
+        "strike": pa.array([strike for _, _, strike, _ in rows], pa.float32()),
+        "open_interest": pa.array([oi for _, _, _, oi in rows], pa.int32()),
+        "volume": pa.array([10] * len(rows), pa.int32()),
+    }))
+    con.execute("CREATE OR REPLACE TABLE DAYS AS SELECT * FROM days_arrow")
+    con.unregister("days_arrow")
+
+
+def random_days(seed=7):
+    # a few contracts with jumpy open interest, some of them skip days so their last change is days old
+    rng = random.Random(seed)
+    rows = []
+    for symbol in ("SPY", "QQQ"):
+        for strike in (100.0, 105.0, 110.0, 115.0):
+            oi = rng.randint(100, 1000)
+            for dt in DATES:
+                oi = max(0, oi + rng.randint(-150, 150))
+                if rng.random() < 0.25:
+                    continue
+                rows.append((dt, symbol, strike, oi))
+    return rows
+
+
+def engine(con, tmp_path, **kwargs):
+    return OIAnomalyEngine(con, state_dir=str(tmp_path / "state"), **kwargs)
+
+
+def anomalies(con):
+    return con.execute(f"SELECT {OUTPUT_COLUMNS} FROM OI_ANOMALIES ORDER BY {OUTPUT_SORT_ORDER}").fetchall()
+
+
+def test_state_keeps_an_exponentially_weighted_mean_and_variance_of_the_changes(tmp_path):
+    con = duckdb.connect()
+    ois = [100, 130, 90, 160, 150, 220]
+    load_days(con, [(dt, "SPY", 100.0, oi) for dt, oi in zip(DATES, ois)])
+    oi_engine = engine(con, tmp_path, alpha=0.2)
+    for dt in DATES:
+        oi_engine.process_day(dt, day_sql(dt))
+
+    # the first change seeds the mean, every later one moves it by alpha
+    changes = [b - a for a, b in zip(ois, ois[1:])]
+    mean, var = changes[0], 0.0
+    for change in changes[1:]:
+        var = (1 - 0.2) * (var + 0.2 * (change - mean) ** 2)
+        mean = mean + 0.2 * (change - mean)
+    n, state_mean, state_var, last_oi = con.execute("SELECT n, mean, var, last_oi FROM OI_STATE").fetchone()
+    assert (n, last_oi) == (len(changes), ois[-1])
+    assert state_mean == pytest.approx(mean)
+    assert state_var == pytest.approx(var)
+
+
+def test_log_weighted_scores_the_change_by_the_size_of_the_open_interest(tmp_path):
+    con = duckdb.connect()
+    load_days(con, [(DATES[0], "SPY", 100.0, 100), (DATES[1], "SPY", 100.0, 300), (DATES[0], "SPY", 105.0, 100), (DATES[1], "SPY", 105.0, 110)])
+    oi_engine = engine(con, tmp_path, threshold=100)
+    for dt in DATES[:2]:
+        oi_engine.process_day(dt, day_sql(dt))
+
+    [(strike, score, prev_oi, change)] = con.execute("SELECT strike, anomaly_score, prev_open_interest, oi_change FROM OI_ANOMALIES").fetchall()
+    assert (strike, prev_oi, change) == (100.0, 100, 200)
+    assert score == pytest.approx(200 * math.log10(301))    # the 105 strike scores 10 * log10(111), under the threshold
+
+
+def test_zscore_needs_min_history_before_it_scores(tmp_path):
+    con = duckdb.connect()
+    ois = [100, 110, 125, 135, 150, 400]
+    load_days(con, [(dt, "SPY", 100.0, oi) for dt, oi in zip(DATES, ois)])
+    oi_engine = engine(con, tmp_path, model="zscore", threshold=0, alpha=0.5, min_history=4)
+    for dt in DATES:
+        oi_engine.process_day(dt, day_sql(dt))
+
+    # the changes before the jump are the history, the jump is the only day with four of them
+    assert con.execute("SELECT strftime(dt, '%Y-%m-%d'), oi_change FROM OI_ANOMALIES").fetchall() == [(DATES[-1], 250)]
+
+
+def test_percentile_ranks_the_changes_within_a_ticker(tmp_path):
+    con = duckdb.connect()
+    rows = []
+    for strike, (before, after) in zip((100.0, 105.0, 110.0, 115.0), ((100, 101), (100, 105), (100, 120), (100, 500))):
+        rows += [(DATES[0], "SPY", strike, before), (DATES[1], "SPY", strike, after)]
+    rows += [(DATES[0], "QQQ", 100.0, 100), (DATES[1], "QQQ", 100.0, 101)]
+    load_days(con, rows)
+    oi_engine = engine(con, tmp_path, model="percentile", threshold=0.5)
+    for dt in DATES[:2]:
+        oi_engine.process_day(dt, day_sql(dt))
+
+    # SPY ranks 0, 1/3, 2/3, 1, the lone QQQ contract ranks 0
+    assert con.execute("SELECT option_symbol, strike, anomaly_score FROM OI_ANOMALIES ORDER BY strike").fetchall() == [
+        ("SPY", 110.0, pytest.approx(2 / 3)), ("SPY", 115.0, 1.0)]
+
+
+def test_unknown_model_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        engine(duckdb.connect(), tmp_path, model="median")
+
+
+def test_trim_drops_the_days_and_the_changes_from_before_the_window(tmp_path):
+    con = duckdb.connect()
+    # 105 is not seen after the first day, 110 skips the second day so its third day change is from the first
+    load_days(con, [(dt, "SPY", strike, oi) for dt, strike, oi in [
+        (DATES[0], 100.0, 100), (DATES[1], 100.0, 400), (DATES[2], 100.0, 900),
+        (DATES[0], 105.0, 100),
+        (DATES[0], 110.0, 100), (DATES[2], 110.0, 600),
+    ]])
+    oi_engine = engine(con, tmp_path, threshold=10)
+    for dt in DATES[:3]:
+        oi_engine.process_day(dt, day_sql(dt), f"release-{dt}")
+    assert len(anomalies(con)) == 3
+
+    oi_engine.trim(DATES[1:3])
+    # day 2 of 100 is measured from day 1, which left the window, so is day 3 of 110
+    assert con.execute("SELECT strftime(dt, '%Y-%m-%d'), strike FROM OI_ANOMALIES").fetchall() == [(DATES[2], 100.0)]
+    assert sorted(k[0] for k in con.execute("SELECT option FROM OI_STATE").fetchall()) == ["SPY260619C00100000", "SPY260619C00110000"]
+    assert oi_engine.releases == {dt: f"release-{dt}" for dt in DATES[1:3]}
+
+
+def test_state_round_trip_and_settings_change(tmp_path):
+    con = duckdb.connect()
+    load_days(con, random_days())
+    oi_engine = engine(con, tmp_path, threshold=50)
+    for dt in DATES[:3]:
+        oi_engine.process_day(dt, day_sql(dt), f"release-{dt}")
+    oi_engine.save()
+    state = con.execute("SELECT * FROM OI_STATE ORDER BY option").fetchall()
+    scored = anomalies(con)
+
+    other = duckdb.connect()
+    loaded = engine(other, tmp_path, threshold=50)
+    assert loaded.last_dt == DATES[2]
+    assert loaded.releases == {dt: f"release-{dt}" for dt in DATES[:3]}
+    assert other.execute("SELECT * FROM OI_STATE ORDER BY option").fetchall() == state
+    assert anomalies(other) == scored
+
+    # another threshold would have kept other anomalies, the state is dropped
+    rebuilt = engine(duckdb.connect(), tmp_path, threshold=60)
+    assert rebuilt.last_dt is None and rebuilt.releases == {}
+    assert not (tmp_path / "state").exists()
+
+
+def test_stale_dates_are_the_scored_days_of_another_release(tmp_path):
+    con = duckdb.connect()
+    load_days(con, random_days())
+    oi_engine = engine(con, tmp_path)
+    for dt in DATES[:3]:
+        oi_engine.process_day(dt, day_sql(dt), f"release-{dt}")
+
+    window = [(dt, f"release-{dt}") for dt in DATES[:4]]
+    assert oi_engine.stale_dates(window) == []    # the fourth day is new, not stale
+    window[1] = (DATES[1], f"release-{DATES[1]}-rerun")
+    assert oi_engine.stale_dates(window) == [DATES[1]]
+    assert oi_engine.stale_dates(window[:1] + window[2:]) == []
+
+
+def test_incremental_runs_score_the_same_anomalies_as_a_replay_of_the_window(tmp_path):
+    con = duckdb.connect()
+    load_days(con, random_days())
+    window = DATES[2:]
+
+    # the day by day runs: every run scores its day, then keeps a window of four days
+    for i, dt in enumerate(DATES):
+        daily = engine(con, tmp_path / "daily", threshold=50)
+        daily.trim(DATES[max(0, i - 3):i + 1])
+        daily.process_day(dt, day_sql(dt))
+        daily.trim(DATES[max(0, i - 3):i + 1])
+        daily.save()
+    incremental = anomalies(con)
+
+    replay = engine(con, tmp_path / "replay", threshold=50)
+    for dt in window:
+        replay.process_day(dt, day_sql(dt))
+    replay.trim(window)
+    assert anomalies(con) == incremental
+    assert incremental and {row[0] for row in incremental} <= {date.fromisoformat(dt) for dt in window[1:]}
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from mzdata import cboe_fetch
+from mzdata.cboe_fetch import _request, _retry_after_seconds
+from mzdata.rate_limit import AdaptiveRateLimiter, RATE_INCREASE, RATE_DECREASE
+
+
+def test_rate_grows_additively_up_to_the_max():
+    limiter = AdaptiveRateLimiter(rate=10, max_rate=10.25)
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(10 + RATE_INCREASE)
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 10.25
+
+
+def test_throttle_cuts_the_rate_once_per_burst_down_to_the_min():
+    limiter = AdaptiveRateLimiter(rate=8, min_rate=1)
+    limiter.on_throttle()
+    limiter.on_throttle()    # a 429 of a request already in flight, inside the cooldown
+    assert limiter.rate == 8 * RATE_DECREASE
+    assert (limiter.throttles, limiter.rate_decreases) == (2, 1)
+
+    for _ in range(5):
+        limiter._last_decrease = 0.0    # past the cooldown
+        limiter.on_throttle()
+    assert limiter.rate == 1
+
+
+def test_retry_after_pauses_every_worker():
+    limiter = AdaptiveRateLimiter(rate=100)
+    assert limiter.on_throttle() is False
+    assert limiter.on_throttle(0.2) is True
+    assert limiter.on_throttle() is True    # a throttle without Retry-After while the pause is on
+
+    async def acquire_all():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(limiter.acquire() for _ in range(3)))
+        return loop.time() - started
+
+    assert asyncio.run(acquire_all()) >= 0.15
+    assert limiter.paused_seconds == pytest.approx(0.2, abs=0.05)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("5", 5),
+    ("0", None),
+    ("-3", None),
+    ("soon", None),
+    ("Wed, 99 Foo 2015 07:28:00", None),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", None),    # already passed
+])
+def test_retry_after_seconds(value, expected):
+    assert _retry_after_seconds(value) == expected
+
+
+def test_retry_after_http_date():
+    value = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=120), usegmt=True)
+    assert 110 <= _retry_after_seconds(value) <= 120
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None, body=b"{}"):
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self.body
+
+    def raise_for_status(self):
+        assert self.status < 400
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, headers=None):
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # a clock that only moves when _request or the limiter sleeps, the sleeps are recorded instead of waited
+    now = [1000.0]
+    calls = []
+
+    async def sleep(seconds):
+        calls.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr("mzdata.rate_limit.time.monotonic", lambda: now[0])
+    monkeypatch.setattr(cboe_fetch.asyncio, "sleep", sleep)
+    return calls
+
+
+@pytest.mark.parametrize("retry_after", ["0", "not a date"])
+def test_unusable_retry_after_falls_back_to_the_backoff(sleeps, retry_after):
+    limiter = AdaptiveRateLimiter(rate=100)
+    session = FakeSession([FakeResponse(429, {"Retry-After": retry_after}), FakeResponse(200, body=b"ok")])
+    body, _ = asyncio.run(_request(session, limiter, f"{cboe_fetch.CDN_BASE_URL}/SPY.json", "SPY"))
+    assert body == b"ok"
+    assert sleeps == [10]
+    assert limiter.paused_seconds == 0
+
+
+def test_retry_after_waits_in_the_limiter_not_in_the_worker(sleeps):
+    limiter = AdaptiveRateLimiter(rate=100)
+    session = FakeSession([FakeResponse(503, {"Retry-After": "3"}), FakeResponse(200, body=b"ok")])
+    body, _ = asyncio.run(_request(session, limiter, f"{cboe_fetch.CDN_BASE_URL}/SPY.json", "SPY"))
+    assert body == b"ok"
+    assert sleeps == [3]    # the pause inside acquire(), no backoff on top of it
+    assert limiter.paused_seconds == 3
@@ -0,0 +1,62 @@
+import asyncio
+
+from mzdata.cboe_fetch import RevisitScheduler
+
+
+async def drain(scheduler):
+    # fetches every symbol left as fresh, in the order the scheduler hands them out
+    order = []
+    while True:
+        symbol = await scheduler.next()
+        if symbol is None:
+            return order
+        order.append(symbol)
+        await scheduler.done()
+
+
+def test_a_stale_symbol_is_rechecked_after_the_fresh_ones():
+    async def scenario():
+        scheduler = RevisitScheduler(["SPY", "QQQ", "IWM"], recheck_seconds=0.05)
+        symbol = await scheduler.next()
+        assert await scheduler.revisit(symbol)    # SPY is stale, it waits while the others are fetched
+        return await drain(scheduler)
+
+    assert asyncio.run(scenario()) == ["QQQ", "IWM", "SPY"]
+
+
+def test_revisits_come_back_in_the_order_they_are_due():
+    async def scenario():
+        scheduler = RevisitScheduler(["SPY", "QQQ"], recheck_seconds=0.05)
+        first, second = await scheduler.next(), await scheduler.next()
+        await scheduler.revisit(second)
+        await asyncio.sleep(0.02)
+        await scheduler.revisit(first)
+        return await drain(scheduler)
+
+    assert asyncio.run(scenario()) == ["QQQ", "SPY"]
+
+
+def test_a_waiting_revisit_does_not_end_the_fetch():
+    async def scenario():
+        scheduler = RevisitScheduler(["SPY"], recheck_seconds=0.05)
+        await scheduler.next()
+        await scheduler.revisit("SPY")
+        # nothing is ready or in flight, next() waits for the revisit instead of returning None
+        symbol = await asyncio.wait_for(scheduler.next(), 1)
+        await scheduler.done()
+        return symbol, await scheduler.next()
+
+    assert asyncio.run(scenario()) == ("SPY", None)
+
+
+def test_revisits_stop_after_max_revisits():
+    async def scenario():
+        scheduler = RevisitScheduler(["SPY"], recheck_seconds=0.01, max_revisits=2)
+        scheduled = []
+        while True:
+            symbol = await scheduler.next()
+            if symbol is None:
+                return scheduled
+            scheduled.append(await scheduler.revisit(symbol))
+
+    assert asyncio.run(scenario()) == [True, True, False]
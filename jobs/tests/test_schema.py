@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from mzdata.schema import OPTIONS_SCHEMA, SchemaReport, conform_table
+
+SCHEMA = pa.schema([("option", pa.string()), ("open_interest", pa.int32()), ("iv", pa.float32()), ("timestamp", pa.timestamp("ms", tz="UTC"))])
+
+
+def test_a_table_of_the_declared_types_is_clean():
+    table = pa.table({"option": ["SPY260116C00100000"], "open_interest": pa.array([10], pa.int32()), "iv": pa.array([0.2], pa.float32()),
+                      "timestamp": pa.array([datetime(2026, 1, 5, 20, tzinfo=timezone.utc)], pa.timestamp("ms", tz="UTC"))})
+    report = SchemaReport("options")
+    assert conform_table(table, SCHEMA, report).equals(table)
+    assert report.is_clean()
+    assert report.summary() == "Schema report for options: all data matched the declared schema."
+
+
+def test_missing_extra_and_lossy_columns_are_reported():
+    # json decoded columns: numbers are doubles, one of them a fraction where the schema wants an integer
+    table = pa.table({"option": ["A", "B", "C"], "open_interest": [10.0, 11.5, None], "iv": [0.25, 0.5, 1.0], "vendor_flag": ["x", "y", "z"]})
+    report = SchemaReport("options")
+    conformed = conform_table(table, SCHEMA, report)
+
+    assert conformed.schema == SCHEMA
+    assert conformed.column("open_interest").to_pylist() == [10, 11, None]
+    assert conformed.column("timestamp").null_count == 3
+    assert (report.coerced, report.missing, report.dropped, report.nulled) == ({"open_interest": 1}, {"timestamp": 3}, {"vendor_flag": 3}, {})
+    assert report.summary().splitlines() == [
+        "Schema report for options:",
+        "  missing (filled with nulls): timestamp=3",
+        "  dropped: vendor_flag=3",
+        "  coerced with loss: open_interest=1",
+    ]
+
+
+def test_timestamps_are_parsed_as_utc_and_unparseable_ones_are_nulled():
+    table = pa.table({"option": ["A", "B", "C"], "timestamp": ["2026-01-05 20:00:00", "2026-01-05T21:00:00", "yesterday"]})
+    report = SchemaReport("options")
+    conformed = conform_table(table, OPTIONS_SCHEMA, report)
+
+    assert conformed.column("timestamp").to_pylist() == [datetime(2026, 1, 5, 20, tzinfo=timezone.utc), datetime(2026, 1, 5, 21, tzinfo=timezone.utc), None]
+    assert report.nulled == {"timestamp": 1}
+    assert conformed.schema.field("symbol").type == OPTIONS_SCHEMA.field("symbol").type
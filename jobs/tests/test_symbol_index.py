@@ -0,0 +1,50 @@
+import duckdb
+import pyarrow.parquet as pq
+
+from mzdata.symbol_index import write_symbol_aligned
+
+# rows per symbol, BIG alone fills more than two row groups of 10 rows
+SYMBOL_ROWS = {"AAA": 3, "BBB": 4, "BIG": 23, "CCC": 5, "DDD": 9, "EEE": 1}
+
+
+def write(tmp_path, row_group_size=10):
+    con = duckdb.connect()
+    rows = ", ".join(f"('{symbol}', {i})" for symbol, count in SYMBOL_ROWS.items() for i in range(count))
+    path = str(tmp_path / "rolling.parquet")
+    index = write_symbol_aligned(con, f"SELECT * FROM (VALUES {rows}) t(option_symbol, n) ORDER BY option_symbol, n", path, row_group_size=row_group_size)
+    return path, index
+
+
+def row_group_symbols(path):
+    file = pq.ParquetFile(path)
+    return [file.read_row_group(i, columns=["option_symbol"]).column(0).to_pylist() for i in range(file.num_row_groups)]
+
+
+def test_row_groups_never_straddle_two_symbols_unless_packed_whole(tmp_path):
+    path, _ = write(tmp_path)
+    groups = row_group_symbols(path)
+    assert sum(len(group) for group in groups) == sum(SYMBOL_ROWS.values())
+    for group in groups:
+        symbols = set(group)
+        if len(symbols) > 1:
+            # packed small symbols: every one of them is complete in this row group
+            assert all(group.count(symbol) == SYMBOL_ROWS[symbol] for symbol in symbols)
+            assert len(group) <= 10
+    # the big symbol gets row groups of its own, full ones first
+    assert [len(group) for group in groups if set(group) == {"BIG"}] == [10, 10, 3]
+
+
+def test_sidecar_index_points_at_the_row_groups_and_bytes_of_each_symbol(tmp_path):
+    path, index = write(tmp_path)
+    groups = row_group_symbols(path)
+    metadata = pq.ParquetFile(path).metadata
+
+    assert set(index["symbols"]) == set(SYMBOL_ROWS)
+    for symbol, (first, last) in index["symbols"].items():
+        assert sum(group.count(symbol) for group in groups[first:last + 1]) == SYMBOL_ROWS[symbol]
+        assert all(symbol not in group for i, group in enumerate(groups) if i < first or i > last)
+
+    assert [rows for _, _, rows in index["rowGroups"]] == [len(group) for group in groups]
+    ranges = [(start, start + length) for start, length, _ in index["rowGroups"]]
+    assert all(a_end <= b_start for (_, a_end), (b_start, _) in zip(ranges, ranges[1:]))
+    assert ranges[-1][1] <= index["size"] - metadata.serialized_size
@@ -0,0 +1,25 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from synthetic import GREEK_RANGES, bench_symbols, check_greeks, write_daily_files
+
+
+def test_generated_greeks_are_in_range(tmp_path):
+    options_file = str(tmp_path / "options_data.parquet")
+    write_daily_files(duckdb.connect(), "2026-01-05", bench_symbols(5), options_file, str(tmp_path / "stock_data.parquet"), expirations=3, strikes=8)
+
+    options = pq.read_table(options_file, columns=list(GREEK_RANGES))
+    for column, (low, high) in GREEK_RANGES.items():
+        values = pc.min_max(options.column(column))
+        assert low <= values["min"].as_py() and values["max"].as_py() <= high, column
+    assert pc.min_max(options.column("theta"))["min"].as_py() < 0    # a negated unsigned hash wrapped to about 1.8e17
+
+
+def test_a_greek_out_of_range_is_rejected():
+    options = pa.table({column: [low, high] for column, (low, high) in GREEK_RANGES.items()})
+    check_greeks(options)
+    with pytest.raises(ValueError, match="theta"):
+        check_greeks(options.set_column(list(GREEK_RANGES).index("theta"), "theta", pa.array([-1.0, 1.8446744e17])))
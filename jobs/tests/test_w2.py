@@ -0,0 +1,53 @@
+import json
+import os
+
+import duckdb
+import pytest
+
+from mzdata.stages.w2 import consolidate_w2, CONFIG_FILE_NAME
+from synthetic import bench_symbols, write_daily_files
+
+DATES = ["2026-01-05", "2026-01-06", "2026-01-07"]
+
+
+@pytest.fixture
+def w2_store(tmp_path):
+    # data_dir/w2/dt=<date>/part-0.parquet of a few synthetic symbols, the way the w2 store holds the release files
+    con = duckdb.connect()
+    data_dir = tmp_path / "data"
+    for dt in DATES:
+        options_file = str(tmp_path / f"options-{dt}.parquet")
+        write_daily_files(con, dt, bench_symbols(3), options_file, str(tmp_path / f"stocks-{dt}.parquet"), expirations=2, strikes=4)
+        partition = data_dir / "w2" / f"dt={dt}"
+        partition.mkdir(parents=True)
+        con.execute(f"COPY (SELECT DATE '{dt}' AS dt, * FROM read_parquet('{options_file}')) TO '{partition / 'part-0.parquet'}' (FORMAT PARQUET)")
+    return data_dir, tmp_path / "out"
+
+
+def last_date(temp_dir):
+    with open(temp_dir / CONFIG_FILE_NAME) as file:
+        return json.load(file)["lastDate"]
+
+
+def published_dates(temp_dir):
+    return sorted({name.split("_", 1)[0] for _, _, names in os.walk(temp_dir / "w2-output") for name in names})
+
+
+def test_every_pending_date_is_committed_in_order(w2_store):
+    data_dir, temp_dir = w2_store
+    config = consolidate_w2(duckdb.connect(), str(data_dir), str(temp_dir), backfill=True, workers=2)
+    assert config["lastDate"] == last_date(temp_dir) == DATES[-1]
+    assert published_dates(temp_dir) == DATES
+    assert not (temp_dir / "w2-staging").exists()
+
+
+def test_a_failed_date_keeps_the_checkpoint_at_the_last_committed_date(w2_store):
+    data_dir, temp_dir = w2_store
+    (data_dir / "w2" / f"dt={DATES[1]}" / "part-0.parquet").write_bytes(b"not a parquet file")
+
+    with pytest.raises(duckdb.Error):
+        consolidate_w2(duckdb.connect(), str(data_dir), str(temp_dir), backfill=True, workers=2)
+    # the third date may have been staged already, it is not committed after the failed one
+    assert last_date(temp_dir) == DATES[0]
+    assert published_dates(temp_dir) == DATES[:1]
+    assert not (temp_dir / "w2-staging").exists()